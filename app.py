@@ -1,10 +1,16 @@
 # app.py
+import json
+import matplotlib.pyplot as plt
+import pandas as pd
 import streamlit as st
 from engine.scenarios import SCENARIOS
-from engine.main_engine import run_scenario
-from engine.build_context import build_context
+from engine.main_engine import run_scenario, run_reverse_stress, run_what_if
+from engine.context_pool import ContextPool
+from engine.result_cache import ScenarioResultCache
+from engine.instrumentation import PROFILER
+from models.greeks import risk_ladder
 from market_data.option_chain import OptionChainLoader
-from instruments.option import EuropeanOption
+from instruments.option import AmericanOption, EuropeanOption
 from instruments.portfolio import OptionPortfolio
 
 # ----------------------------
@@ -16,17 +22,28 @@ st.set_page_config(
 )
 
 st.title("📊 Portfolio Stress Testing & PnL Attribution")
-st.caption("SPY Equity Options | Scenario-Based Stress Engine")
+st.caption("Equity Options | Scenario-Based Stress Engine")
 
 # ----------------------------
 # Load context (spot, surface, pricer, etc.)
 # ----------------------------
 @st.cache_resource
-def load_context():
-    return build_context()
+def load_context_pool():
+    # Contexts per underlying, refreshed in the background every 15 minutes
+    return ContextPool(refresh_interval=15 * 60)
 
-context = load_context()
+@st.cache_resource
+def load_result_cache():
+    # Disk-backed, so repeat scenarios are shared across sessions and restarts
+    return ScenarioResultCache()
+
+ticker = st.sidebar.text_input("Underlying", value="SPY").strip().upper() or "SPY"
+context = load_context_pool().get(ticker)
 loader = context["chain_loader"]
+st.sidebar.caption(
+    f"Surface v{context['surface'].version}"
+    f" ({len(context.get('changed_expiries', []))} expiries updated at last refresh)"
+)
 
 # ----------------------------
 # Sidebar: Scenario Selection
@@ -42,41 +59,62 @@ st.sidebar.header("📦 Portfolio Builder")
 
 # Option inputs
 option_type = st.sidebar.selectbox("Option Type", ["Call", "Put"])
+exercise = st.sidebar.selectbox("Exercise", ["European", "American"])
 strike = st.sidebar.number_input("Strike", value=100.0)
 quantity = st.sidebar.number_input("Quantity", value=1, step=1)
 maturity_days = st.sidebar.number_input("Days to Maturity", value=30)
 
+def new_portfolio(portfolio=None):
+    """
+    Attach a portfolio to the cached context so edits update its
+    value, Greeks and scenario PnL incrementally.
+    """
+    portfolio = portfolio if portfolio is not None else OptionPortfolio()
+    portfolio.attach(context, SCENARIOS)
+    st.session_state.context_id = id(context)
+    return portfolio
+
 # Initialize session state for portfolio
 if "portfolio" not in st.session_state:
-    st.session_state.portfolio = OptionPortfolio()
+    st.session_state.portfolio = new_portfolio()
+
+# Re-attach when the underlying changes or the pool refreshed the context
+if st.session_state.get("context_id") != id(context):
+    st.session_state.portfolio.attach(context, SCENARIOS)
+    st.session_state.context_id = id(context)
+
+def candidate_option():
+    option_cls = AmericanOption if exercise == "American" else EuropeanOption
+    return option_cls(
+        strike=strike,
+        maturity=maturity_days / 365.0,
+        option_type=option_type,
+        quantity=quantity
+    )
 
 # Add a manual option
 if st.sidebar.button("Add Option"):
-    maturity = maturity_days / 365.0
-    st.session_state.portfolio.add(
-        EuropeanOption(
-            strike=strike,
-            maturity=maturity,
-            option_type=option_type,
-            quantity=quantity
-        )
-    )
+    st.session_state.portfolio.add(candidate_option())
+
+# Pre-trade check of the same option, without adding it
+if st.sidebar.button("What-If (Pre-Trade)"):
+    st.session_state.what_if = run_what_if(context, st.session_state.portfolio, candidate_option())
 
 # Load preset ATM straddle
 if st.sidebar.button("Load ATM Straddle (Preset)"):
     expiry = loader.get_expirations()[10]
     spot = context["surface"].spot
     maturity = maturity_days / 365.0  # use dashboard-selected maturity
-    st.session_state.portfolio = loader.build_portfolio(
+    st.session_state.portfolio = new_portfolio(loader.build_portfolio(
         expiry=expiry,
         spot=spot,
         base_size=10,
         maturity=maturity
-    )
+    ))
 
 # Clear portfolio
 if st.sidebar.button("Clear Portfolio"):
-    st.session_state.portfolio = OptionPortfolio()
+    st.session_state.portfolio = new_portfolio()
 
 # ----------------------------
 # Show portfolio holdings
@@ -88,6 +126,7 @@ else:
     st.table([
         {
             "Type": opt.option_type,
+            "Exercise": opt.exercise.capitalize(),
             "Strike": opt.strike,
             "Maturity (yrs)": round(opt.maturity, 3),
             "Quantity": opt.quantity,
@@ -95,16 +134,69 @@ else:
         for opt in st.session_state.portfolio
     ])
 
+    # ----------------------------
+    # Book Aggregates (maintained incrementally)
+    # ----------------------------
+    agg = st.session_state.portfolio.aggregates
+    agg_cols = st.columns(5)
+    agg_cols[0].metric("Book Value", f"{agg['value']:,.2f}")
+    agg_cols[1].metric("Delta", f"{agg['delta']:,.2f}")
+    agg_cols[2].metric("Gamma", f"{agg['gamma']:,.4f}")
+    agg_cols[3].metric("Vega", f"{agg['vega']:,.2f}")
+    agg_cols[4].metric("Theta (1d)", f"{agg['theta']:,.2f}")
+
+    st.table({
+        "Scenario": list(agg["scenario_pnl"].keys()),
+        "PnL": [f"{v:,.2f}" for v in agg["scenario_pnl"].values()]
+    })
+
+    # ----------------------------
+    # Risk Ladder (spot x horizon, one batched pass per rerun)
+    # ----------------------------
+    st.subheader("🪜 Risk Ladder")
+    ladder = risk_ladder(
+        st.session_state.portfolio, context["surface"], context["rate"], pricer=context["pricer"]
+    )
+    ladder_greek = st.selectbox("Greek", list(ladder.greeks), index=2)
+    st.line_chart(ladder.greek(ladder_greek))
+
+if "what_if" in st.session_state:
+    st.subheader("🧮 Pre-Trade What-If")
+    what_if = st.session_state.what_if
+    rows = ["value", "delta", "gamma", "vega", "theta"]
+    st.table({
+        "Metric": rows + list(what_if["marginal"]["scenario_pnl"]),
+        **{
+            label: [f"{what_if[key][r]:,.2f}" for r in rows]
+                   + [f"{v:,.2f}" for v in what_if[key]["scenario_pnl"].values()]
+            for label, key in (("Pre-Trade", "pre_trade"), ("Marginal", "marginal"), ("Post-Trade", "post_trade"))
+        }
+    })
+
 # ----------------------------
 # Run Scenario Button
 # ----------------------------
+higher_order = st.sidebar.checkbox("Higher-Order Explain (Vanna/Volga/Charm)", value=False)
+profile_runs = st.sidebar.checkbox("Profile Runs", value=False)
+
 if st.sidebar.button("Run Scenario"):
+    if profile_runs:
+        PROFILER.enable()
+        PROFILER.reset()
+
     result = run_scenario(
         context=context,
         scenario=SCENARIOS[scenario_name],
-        portfolio=st.session_state.portfolio
+        portfolio=st.session_state.portfolio,
+        higher_order=higher_order,
+        cache=load_result_cache()
     )
 
+    if profile_runs:
+        PROFILER.disable()
+        st.session_state.last_profile = PROFILER.summary()
+        st.session_state.last_trace = PROFILER.chrome_trace()
+
     # ----------------------------
     # Headline Metrics
     # ----------------------------
@@ -142,9 +234,85 @@ if st.sidebar.button("Run Scenario"):
     if not diag["greeks_trustworthy"]:
         st.warning("⚠ Greeks outside validity regime — PnL explain may be unreliable.")
 
+    # ----------------------------
+    # Static Arbitrage (base vs the stressed surface priced above)
+    # ----------------------------
+    from diagnostics.arbitrage import StaticArbitrageScanner
+    from stress.scenario_engine import build_stressed_market
+    scanner = StaticArbitrageScanner(context["surface"], context["rate"])
+    _, stressed_surface = build_stressed_market(
+        context["surface"],
+        SCENARIOS[scenario_name].get("spot_shift", 0.0),
+        SCENARIOS[scenario_name].get("vol_shocks", [])
+    )
+    arb = pd.DataFrame([scanner.scan(), scanner.scan(stressed_surface)], index=["Base", scenario_name])
+    st.subheader("Surface Arbitrage Checks")
+    st.dataframe(arb)
+    if not arb.loc[scenario_name, "arbitrage_free"]:
+        st.warning("⚠ Stressed surface has static arbitrage — prices there rely on the 1e-4 floor or extrapolation.")
+
     # ----------------------------
     # Stress & Attribution Plots
     # ----------------------------
     st.subheader("Stress & Attribution Visuals")
     fig = result["plots"]  # your 2x2 matplotlib/seaborn figure
     st.pyplot(fig)
+    plt.close(fig)
+
+# ----------------------------
+# Profiling Breakdown (last profiled run)
+# ----------------------------
+if profile_runs and "last_profile" in st.session_state:
+    profile = st.session_state.last_profile
+    with st.expander("⏱ Profiling: Last Run", expanded=True):
+        st.table([
+            {
+                "Stage": name,
+                "Calls": stats["count"],
+                "Total (ms)": f"{stats['total_ms']:,.2f}",
+                "Mean (ms)": f"{stats['mean_ms']:,.3f}",
+                "Max (ms)": f"{stats['max_ms']:,.3f}",
+            }
+            for name, stats in sorted(profile["spans"].items(), key=lambda kv: -kv[1]["total_ms"])
+        ])
+        st.table({
+            "Counter": list(profile["counters"].keys()),
+            "Calls": list(profile["counters"].values())
+        })
+
+        dl1, dl2 = st.columns(2)
+        dl1.download_button("Download JSON", json.dumps(profile, indent=2), file_name="profile.json")
+        dl2.download_button("Download Chrome Trace", json.dumps(st.session_state.last_trace), file_name="trace.json")
+
+# ----------------------------
+# Reverse Stress (Worst-Case Search)
+# ----------------------------
+st.sidebar.header("🔎 Reverse Stress")
+loss_threshold = st.sidebar.number_input("Loss Threshold", value=0.0, min_value=0.0, step=1000.0)
+
+if st.sidebar.button("Find Worst Case"):
+    if len(st.session_state.portfolio) == 0:
+        st.info("Portfolio is empty.")
+    else:
+        reverse = run_reverse_stress(
+            context=context,
+            portfolio=st.session_state.portfolio,
+            loss_threshold=loss_threshold if loss_threshold > 0 else None,
+            cache=load_result_cache()
+        )
+
+        st.subheader("Reverse Stress: Worst Case")
+        st.caption(reverse["scenario"]["description"])
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Base Value", f"{reverse['base_value']:,.2f}")
+        col2.metric("Stressed Value", f"{reverse['stressed_value']:,.2f}")
+        col3.metric("Worst PnL", f"{reverse['pnl']:,.2f}", delta=f"{reverse['pnl']:,.2f}")
+
+        if reverse["breach"]:
+            st.warning(
+                f"⚠ Loss threshold breached. Mildest breach on the worst-case path: "
+                f"{reverse['breach_scenario']['description']} (PnL {reverse['breach_pnl']:,.2f})"
+            )
+        elif reverse["breach"] is False:
+            st.success("No scenario within bounds breaches the loss threshold.")
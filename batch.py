@@ -0,0 +1,285 @@
+#Batch stress runs: portfolio files x scenario library against a saved market snapshot
+
+import argparse
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from engine.main_engine import run_scenario
+from instruments.portfolio import load_portfolio
+from market_data.snapshot import load_snapshot
+
+_WORKER = {}   # per-process state: context, books, cache
+
+
+# =============================
+# Inputs
+# =============================
+
+def book_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def book_paths(paths):
+    """
+    {book name: path} for portfolio files. Books are named by file stem,
+    so two files with the same stem would silently merge; reject them.
+    """
+    books = {}
+    for path in paths:
+        name = book_name(path)
+        if name in books:
+            raise ValueError(f"Duplicate book name '{name}': {books[name]} and {path}")
+        books[name] = path
+    return books
+
+
+def load_scenarios(path):
+    """
+    Scenario library from JSON: {name: spec} like engine.scenarios.SCENARIOS,
+    or a list of specs with a "name" field. 'builtin' loads SCENARIOS.
+    """
+    if path == "builtin":
+        from engine.scenarios import SCENARIOS
+        return dict(SCENARIOS)
+
+    with open(path) as f:
+        library = json.load(f)
+    if isinstance(library, list):
+        library = {spec["name"]: spec for spec in library}
+    return library
+
+
+def _init_worker(snapshot_path, portfolio_paths, cache_dir):
+    _WORKER["context"] = load_snapshot(snapshot_path)
+    _WORKER["books"] = {name: load_portfolio(p) for name, p in book_paths(portfolio_paths).items()}
+    _WORKER["cache"] = None
+    if cache_dir:
+        from engine.result_cache import ScenarioResultCache
+        _WORKER["cache"] = ScenarioResultCache(cache_dir)
+
+
+# =============================
+# Work
+# =============================
+
+def _column(name):
+    return name.lower().replace(" ", "_")
+
+
+def result_row(book, scenario_name, context, result):
+    """
+    Flat, JSON-serializable record for one (book, scenario).
+    """
+    row = {
+        "ticker": context.get("ticker"),
+        "as_of": context.get("as_of"),
+        "book": book,
+        "scenario": scenario_name,
+        "base_value": float(result["base_value"]),
+        "stressed_value": float(result["stressed_value"]),
+        "pnl": float(result["pnl"]),
+        "shocked_spot": float(result["shocked_spot"]),
+    }
+    for component, value in result["pnl_breakdown"].items():
+        row[_column(component)] = float(value)
+    for check, value in result["diagnostics"].items():
+        row[check] = value.item() if isinstance(value, np.generic) else value
+    return row
+
+
+def _run_task(task_id, book, scenario_name, scenario, higher_order):
+    context = _WORKER["context"]
+    result = run_scenario(
+        context,
+        dict(scenario, name=scenario_name),
+        _WORKER["books"][book],
+        higher_order=higher_order,
+        cache=_WORKER["cache"],
+        plot=False
+    )
+    return {"task": task_id, **result_row(book, scenario_name, context, result)}
+
+
+# =============================
+# Output sinks
+# =============================
+
+class JsonlSink:
+    """
+    One JSON line per result, flushed as soon as it is written.
+    '-' writes to stdout. An existing file is overwritten unless append.
+    """
+
+    def __init__(self, path, append=False):
+        self.f = sys.stdout if path == "-" else open(path, "a" if append else "w")
+
+    def write(self, row):
+        self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class ParquetSink:
+    """
+    Parquet dataset directory; every batch_rows results land as a new
+    part file (written to a temp name and renamed), so readers can scan
+    the directory while the batch is still running. Part files from
+    earlier runs are removed unless append.
+    """
+
+    def __init__(self, path, batch_rows=100, append=False):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.prefix = f"part-{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.parts = 0
+        self.rows = []
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            for name in os.listdir(path):
+                if name.startswith("part-") and name.endswith(".parquet"):
+                    os.remove(os.path.join(path, name))
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        name = f"{self.prefix}-{self.parts:05d}.parquet"
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        pd.DataFrame(self.rows).to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(self.path, name))
+        self.parts += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+
+# =============================
+# Driver
+# =============================
+
+def run_batch(snapshot_path, portfolio_paths, scenarios, sink, workers=1, higher_order=False, cache_dir=None):
+    """
+    Run every (portfolio, scenario) pair and stream rows to sink in
+    completion order. Returns the number of results written.
+    """
+    tasks = []
+    for book in book_paths(portfolio_paths):
+        for name, spec in scenarios.items():
+            tasks.append((len(tasks), book, name, spec))
+    init_args = (snapshot_path, portfolio_paths, cache_dir)
+
+    if workers <= 1:
+        _init_worker(*init_args)
+        for task in tasks:
+            sink.write(_run_task(*task, higher_order))
+        return len(tasks)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+        futures = [pool.submit(_run_task, *task, higher_order) for task in tasks]
+        for future in as_completed(futures):
+            sink.write(future.result())
+    return len(tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch stress testing against saved market snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run portfolios x scenarios offline")
+    run.add_argument("--snapshot", required=True, help="market snapshot JSON (see 'snapshot')")
+    run.add_argument("--portfolio", nargs="+", required=True, help="portfolio CSV/JSON files, one book each")
+    run.add_argument("--scenarios", default="builtin", help="scenario library JSON, or 'builtin'")
+    run.add_argument("--output", default="-", help="JSONL file ('-' for stdout) or Parquet directory (required)")
+    run.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    run.add_argument("--append", action="store_true", help="add to existing output instead of replacing it")
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run.add_argument("--higher-order", action="store_true", help="add vanna/volga/charm to the explain")
+    run.add_argument("--cache", default=None, help="scenario result cache directory")
+
+    value = commands.add_parser("value", help="value and Greeks per book, unique contracts priced once")
+    value.add_argument("--snapshot", required=True)
+    value.add_argument("--portfolio", nargs="+", required=True)
+    value.add_argument("--output", default=None, help="CSV of per-book totals (default: print)")
+
+    back = commands.add_parser("backtest", help="PnL-explain backtest over stored snapshots")
+    back.add_argument("--portfolio", required=True, help="portfolio CSV/JSON (maturities as of the first snapshot)")
+    back.add_argument("--snapshots", nargs="+", required=True, help="snapshot JSON files, one per day")
+    back.add_argument("--output", default=None, help="CSV of daily explain rows")
+    back.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    back.add_argument("--first-order", action="store_true", help="omit vanna/volga/charm")
+
+    snap = commands.add_parser("snapshot", help="save a live market snapshot (needs network)")
+    snap.add_argument("ticker")
+    snap.add_argument("output")
+    snap.add_argument("--rate", type=float, default=0.04)
+
+    args = parser.parse_args(argv)
+
+    if args.command in ("run", "value"):
+        try:
+            book_paths(args.portfolio)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.command == "run" and args.format == "parquet" and args.output == "-":
+        parser.error("--format parquet needs an --output directory")
+
+    if args.command == "snapshot":
+        from engine.build_context import build_context
+        from market_data.snapshot import snapshot_context
+        snapshot_context(build_context(args.ticker, rate=args.rate), args.output, ticker=args.ticker)
+        return
+
+    if args.command == "value":
+        from engine.multi_book import MultiBookValuer
+        books = {name: load_portfolio(p) for name, p in book_paths(args.portfolio).items()}
+        frame = MultiBookValuer(books, load_snapshot(args.snapshot)).value()
+        if args.output:
+            frame.to_csv(args.output)
+        else:
+            print(frame.to_string())
+        return
+
+    if args.command == "backtest":
+        from engine.backtest import ExplainBacktest
+        backtest = ExplainBacktest(
+            load_portfolio(args.portfolio), args.snapshots, higher_order=not args.first_order
+        )
+        frame = backtest.run(workers=args.workers)
+        if args.output:
+            frame.to_csv(args.output)
+        print(json.dumps(backtest.residual_stats(), indent=2))
+        return
+
+    if args.format == "parquet":
+        sink = ParquetSink(args.output, append=args.append)
+    else:
+        sink = JsonlSink(args.output, append=args.append)
+    try:
+        run_batch(
+            args.snapshot,
+            args.portfolio,
+            load_scenarios(args.scenarios),
+            sink,
+            workers=args.workers,
+            higher_order=args.higher_order,
+            cache_dir=args.cache
+        )
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()
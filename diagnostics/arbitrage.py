@@ -0,0 +1,196 @@
+#Static-arbitrage checks (negative vols, butterfly, calendar) for base and stressed surfaces
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+from stress.vol_stress import SurfaceStressEngine
+from stress.scenario_engine import build_stressed_market
+from engine.instrumentation import PROFILER
+
+
+def _normalized_calls(k, w):
+    """
+    Undiscounted Black call over forward, C / F, at log forward-moneyness k
+    and total variance w. No price floor, so arbitrage is not hidden.
+    """
+    sqrt_w = np.sqrt(w)
+    d1 = -k / sqrt_w + 0.5 * sqrt_w
+    return ndtr(d1) - np.exp(k) * ndtr(d1 - sqrt_w)
+
+
+class StaticArbitrageScanner:
+    """
+    Scans vol surfaces for static arbitrage on a dense grid of log
+    forward-moneyness k (columns) x maturity T (rows):
+
+    - negative_vol : vol <= 0 (or NaN) anywhere on the grid
+    - butterfly    : call prices not convex in strike at fixed T
+                     (negative butterfly price, as a fraction of the forward)
+    - calendar     : total variance vol^2 * T falling with T at fixed k
+
+    The grid is fixed at construction, so every surface is checked with
+    one vol lookup and array operations. Global parallel / skew /
+    curvature scenarios skip the lookup entirely: their grid vols are a
+    linear function of the shocks (SurfaceStressEngine.shock_loadings),
+    so a whole scenario batch is checked as one (n, T, k) array.
+    """
+
+    def __init__(self, surface, rate=0.0, n_strikes=81, n_maturities=24, k_range=None, tolerance=1e-8):
+        """
+        surface : base ImpliedVolSurface
+        n_strikes : grid points across k_range
+        k_range : (lo, hi) log-moneyness; default is the range quoted on
+                  every slice, so extrapolated wings are not flagged
+        n_maturities : grid points between the first and last slice,
+                       in addition to the slices themselves
+        tolerance : slack on the checks, as a fraction of the forward
+        """
+        self.surface = surface
+        self.rate = rate
+        self.tolerance = tolerance
+
+        slices = np.array(sorted(surface.surface.keys()))
+        if k_range is None:
+            k_range = (
+                max(float(np.min(s.x)) for s in surface.surface.values()),
+                min(float(np.max(s.x)) for s in surface.surface.values()),
+            )
+        lo, hi = k_range
+
+        self.k = np.linspace(lo, hi, n_strikes)
+        T = np.union1d(slices, np.linspace(slices.min(), slices.max(), n_maturities))
+        self.T = T[T > 0]
+
+        # Strikes at fixed forward-moneyness per maturity, (n_T, n_k)
+        self.strikes = surface.spot * np.exp(self.k[None, :] + rate * self.T[:, None])
+        self.maturities = np.broadcast_to(self.T[:, None], self.strikes.shape)
+        self._loadings = None
+
+    # ---------- GRID VOLS ---------- #
+
+    def grid_vols(self, surface=None):
+        surface = self.surface if surface is None else surface
+        return surface.get_vols(self.strikes, self.maturities)
+
+    @property
+    def loadings(self):
+        if self._loadings is None:
+            self._loadings = SurfaceStressEngine(self.surface).shock_loadings(self.strikes, self.maturities)
+        return self._loadings
+
+    # ---------- CHECKS ---------- #
+
+    @PROFILER.timed("arbitrage_scan")
+    def scan_vols(self, vols):
+        """
+        Checks on grid vols of shape (..., n_T, n_k).
+        Returns a dict of arrays with the leading shape: violation counts
+        and worst size per check, plus 'arbitrage_free'.
+        """
+        vols = np.asarray(vols, dtype=float)
+        tol = self.tolerance
+
+        # -------------------------
+        # 1. Negative vols
+        # -------------------------
+        bad_vol = ~(vols > 0)
+        safe = np.where(bad_vol, 1e-8, vols)
+        w = safe ** 2 * self.T[:, None]
+
+        # -------------------------
+        # 2. Butterfly: price of the unit-slope butterfly around each
+        #    inner strike, C/F units (non-negative iff C is convex)
+        # -------------------------
+        x = np.exp(self.k)                              # K / F
+        dx = np.diff(x)
+        c = _normalized_calls(self.k, w)
+        slope = np.diff(c, axis=-1) / dx
+        fly = np.diff(slope, axis=-1) * 0.5 * (dx[1:] + dx[:-1])
+        butterfly = np.maximum(-fly - tol, 0.0)
+
+        # -------------------------
+        # 3. Calendar: total variance non-decreasing in T
+        # -------------------------
+        calendar = np.maximum(-np.diff(w, axis=-2) - tol, 0.0)
+
+        axes = (-2, -1)
+        out = {
+            "negative_vol_count": bad_vol.sum(axis=axes),
+            "negative_vol_worst": np.maximum(-np.where(np.isnan(vols), 0.0, vols), 0.0).max(axis=axes),
+            "butterfly_count": (butterfly > 0).sum(axis=axes),
+            "butterfly_worst": butterfly.max(axis=axes),
+            "calendar_count": (calendar > 0).sum(axis=axes),
+            "calendar_worst": calendar.max(axis=axes),
+        }
+        out["arbitrage_free"] = (
+            (out["negative_vol_count"] == 0) & (out["butterfly_count"] == 0) & (out["calendar_count"] == 0)
+        )
+        return out
+
+    def scan(self, surface=None):
+        """
+        Check one surface (the base surface by default).
+        Returns a dict of scalars.
+        """
+        return {k: v.item() for k, v in self.scan_vols(self.grid_vols(surface)).items()}
+
+    def scan_factors(self, parallel=0.0, skew=0.0, curvature=0.0, chunk_size=512):
+        """
+        Check N global-shock scenarios given as factor arrays (broadcast
+        to N). Shocks act together on one surface copy, as in
+        build_stressed_market, and zero shocks give the base grid exactly.
+        Returns a dict of (N,) arrays.
+        """
+        parallel, skew, curvature = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(x, dtype=float)) for x in (parallel, skew, curvature))
+        )
+        L = self.loadings
+        base = self.grid_vols()
+        n = len(parallel)
+
+        parts = []
+        for start in range(0, n, chunk_size):
+            sl = slice(start, min(start + chunk_size, n))
+            p, s, c = (x[sl][:, None, None] for x in (parallel, skew, curvature))
+            parts.append(self.scan_vols(base + p + s * L["skew"] + c * L["curvature"]))
+
+        return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+    def scan_scenarios(self, scenarios, include_base=True):
+        """
+        Check the stressed surface of every scenario ({name: spec}).
+
+        Global shocks are checked together in one `scan_factors` pass;
+        scenarios with maturity-localized shocks are stressed with
+        build_stressed_market and scanned one by one. Either way the grid
+        vols are those of the surface run_scenario prices on. Returns a
+        DataFrame with one row per scenario (and 'Base').
+        """
+        names = list(scenarios)
+        rows = {}
+
+        global_names, factors = [], []
+        for name in names:
+            shocks = scenarios[name].get("vol_shocks", [])
+            if any(SurfaceStressEngine.is_localized(shock) for shock in shocks):
+                _, stressed = build_stressed_market(self.surface, vol_shocks=shocks)
+                rows[name] = self.scan(stressed)
+                continue
+
+            f = dict.fromkeys(("parallel", "skew", "curvature"), 0.0)
+            for shock in shocks:
+                if shock["type"] not in f:
+                    raise ValueError("Unknown shock type")
+                f[shock["type"]] += shock["value"]
+            global_names.append(name)
+            factors.append([f["parallel"], f["skew"], f["curvature"]])
+
+        if global_names:
+            result = self.scan_factors(*np.array(factors).T)
+            for i, name in enumerate(global_names):
+                rows[name] = {k: v[i].item() for k, v in result.items()}
+
+        frame = pd.DataFrame.from_dict({name: rows[name] for name in names}, orient="index")
+        if include_base:
+            frame = pd.concat([pd.DataFrame([self.scan()], index=["Base"]), frame])
+        frame.index.name = "surface"
+        return frame
@@ -0,0 +1,235 @@
+#Historical PnL-explain backtest over stored spot/surface snapshots
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from diagnostics.greek_diagnostics import GreekValidityDiagnostics
+from instruments.portfolio import position_arrays
+from market_data.snapshot import load_snapshot
+from models.greeks import bs_greeks_vec
+from engine.pricer import PortfolioPricer
+from engine.instrumentation import PROFILER
+
+COMPONENTS = ["Delta Pnl", "Gamma Pnl", "Vega Pnl", "Theta Pnl"]
+HIGHER_ORDER = ["Vanna Pnl", "Volga Pnl", "Charm Pnl"]
+
+
+def _as_context(snapshot):
+    return load_snapshot(snapshot) if isinstance(snapshot, str) else snapshot
+
+
+def _explain_block(arrays, snapshots, elapsed, rate, higher_order, american_steps):
+    """
+    Explain every consecutive pair in a block of snapshots.
+
+    All days are priced together: position state is a (days, positions)
+    grid, so pricing and Greeks are one vectorized pass for the block.
+    Returns a dict of per-pair arrays.
+    """
+    contexts = [_as_context(s) for s in snapshots]
+    K, units, is_call = arrays.strike, arrays.units, arrays.is_call
+
+    spots = np.array([c["spot"] for c in contexts])
+    T = arrays.maturity[None, :] - elapsed[:, None]          # rolled maturities
+    T_live = np.maximum(T, 0.0)
+
+    # -------------------------
+    # 1. Each day's vols on its own surface (one vectorized lookup per day)
+    # -------------------------
+    vols = np.vstack([c["surface"].get_vols(K, T_live[k]) for k, c in enumerate(contexts)])
+
+    # -------------------------
+    # 2. Full revaluation (truth)
+    # -------------------------
+    S = spots[:, None]
+    pricer = PortfolioPricer(rate, american_steps=american_steps)
+    prices = pricer.price_legs(S, K, T, vols, is_call, arrays.is_american)
+    values = prices @ units
+
+    # -------------------------
+    # 3. Greeks at the start of each pair
+    # -------------------------
+    g = bs_greeks_vec(S[:-1], K, T[:-1], rate, vols[:-1], is_call)
+    dS = np.diff(spots)
+    dt = np.diff(elapsed)
+    d_vol = np.where(T[1:] > 0, vols[1:] - vols[:-1], 0.0)
+
+    out = {
+        "Base Value": values[:-1],
+        "Base Spot": spots[:-1],
+        "Spot": spots[1:],
+        "Total Pnl": np.diff(values),
+        "Delta Pnl": (g["delta"] @ units) * dS,
+        "Gamma Pnl": 0.5 * (g["gamma"] @ units) * dS ** 2,
+        "Vega Pnl": ((g["vega"] * d_vol) @ units),
+        "Theta Pnl": (g["theta"] @ units) * dt,
+    }
+    if higher_order:
+        out["Vanna Pnl"] = ((g["vanna"] * d_vol) @ units) * dS
+        out["Volga Pnl"] = ((0.5 * g["volga"] * d_vol ** 2) @ units)
+        out["Charm Pnl"] = (g["charm"] @ units) * dS * dt
+    return out
+
+
+class ExplainBacktest:
+    """
+    Replays a history of market snapshots and explains each day-over-day
+    move of a fixed portfolio against its actual revaluation PnL.
+
+    Position maturities are measured from the first snapshot and roll down
+    by calendar time (days / 365, like the surface builder) as the
+    replay advances; expired positions settle at intrinsic.
+    """
+
+    def __init__(self, portfolio, snapshots, rate=None, higher_order=True, american_steps=100):
+        """
+        portfolio : OptionPortfolio (maturities as of the first snapshot)
+        snapshots : snapshot paths or loaded contexts (with 'as_of'), any order
+        rate : defaults to the first snapshot's rate
+        higher_order : add vanna/volga/charm terms to the explain
+        """
+        contexts = [_as_context(s) for s in snapshots]
+        order = np.argsort([c["as_of"] for c in contexts], kind="stable")
+        if len(order) < 2:
+            raise ValueError("Backtest needs at least two snapshots")
+
+        self.snapshots = [snapshots[i] for i in order]      # paths are shipped to workers
+        self.contexts = [contexts[i] for i in order]
+        self.dates = [contexts[i]["as_of"] for i in order]
+        self.portfolio = portfolio
+        self.arrays = position_arrays(portfolio)
+        self.rate = contexts[order[0]]["rate"] if rate is None else rate
+        self.higher_order = higher_order
+        self.american_steps = american_steps
+
+        start = datetime.strptime(self.dates[0], "%Y-%m-%d")
+        self.elapsed = np.array([
+            (datetime.strptime(d, "%Y-%m-%d") - start).days / 365.0 for d in self.dates
+        ])
+        self.results = None
+
+    # ---------- RUN ---------- #
+
+    @PROFILER.timed("backtest")
+    def run(self, workers=1, chunk_days=None):
+        """
+        Explain all consecutive pairs.
+
+        workers : processes; blocks of consecutive days are explained in
+                  parallel (each block overlaps the next by one snapshot)
+        chunk_days : pairs per block (default: split evenly across workers)
+
+        Returns a DataFrame indexed by date with the explain components,
+        residual and GreekValidityDiagnostics flags per day.
+        """
+        n_pairs = len(self.snapshots) - 1
+        chunk_days = chunk_days or max(1, -(-n_pairs // max(workers, 1)))
+        blocks = [(s, min(s + chunk_days, n_pairs)) for s in range(0, n_pairs, chunk_days)]
+        parallel = workers > 1 and len(blocks) > 1
+        source = self.snapshots if parallel else self.contexts
+        jobs = [
+            (self.arrays, source[s:e + 1], self.elapsed[s:e + 1],
+             self.rate, self.higher_order, self.american_steps)
+            for s, e in blocks
+        ]
+
+        if not parallel:
+            parts = [_explain_block(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_explain_block, *zip(*jobs)))
+
+        frame = pd.DataFrame({k: np.concatenate([p[k] for p in parts]) for k in parts[0]})
+        frame.index = pd.Index(self.dates[1:], name="date")
+
+        components = COMPONENTS + (HIGHER_ORDER if self.higher_order else [])
+        frame["Explained Pnl"] = frame[components].sum(axis=1)
+        frame["Residual"] = frame["Total Pnl"] - frame["Explained Pnl"]
+
+        flags = pd.DataFrame(self._diagnostics(frame), index=frame.index)
+        self.results = frame.join(flags)
+        return self.results
+
+    def _diagnostics(self, frame):
+        """
+        GreekValidityDiagnostics for each day, on the positions still live.
+        """
+        positions = list(self.portfolio)
+        by_maturity = np.argsort(self.arrays.maturity, kind="stable")
+        sorted_T = self.arrays.maturity[by_maturity]
+
+        rows = []
+        for k, (_, day) in enumerate(frame.iterrows()):
+            first_live = np.searchsorted(sorted_T, self.elapsed[k], side="right")
+            if first_live == len(sorted_T):
+                rows.append({"greeks_trustworthy": False, "live_positions": False})
+                continue
+
+            # The portfolio enters the checks only through its shortest
+            # live maturity, so pass that position rolled to today
+            shortest = positions[by_maturity[first_live]]
+            live = [replace(shortest, maturity=shortest.maturity - self.elapsed[k])]
+            row = GreekValidityDiagnostics(
+                base_spot=day["Base Spot"],
+                shocked_spot=day["Spot"],
+                base_value=day["Base Value"],
+                pnl_breakdown=day,
+                portfolio=live
+            ).run()
+            row["live_positions"] = True
+            rows.append(row)
+        return rows
+
+    # ---------- REPORTING ---------- #
+
+    def residual_stats(self, frame=None):
+        """
+        Summary of attribution quality over the backtest.
+        """
+        frame = self.results if frame is None else frame
+        if frame is None:
+            raise ValueError("Run the backtest first")
+
+        residual = frame["Residual"].to_numpy()
+        total = frame["Total Pnl"].to_numpy()
+        explained = frame["Explained Pnl"].to_numpy()
+        trusted = frame["greeks_trustworthy"].to_numpy(dtype=bool)
+
+        ss_res = float(np.sum(residual ** 2))
+        ss_tot = float(np.sum((total - total.mean()) ** 2))
+        ratio = np.abs(residual) / np.maximum(np.abs(total), 1e-6)
+
+        def summary(mask):
+            if not mask.any():
+                return None
+            r = residual[mask]
+            return {
+                "days": int(mask.sum()),
+                "mean": float(r.mean()),
+                "std": float(r.std()),
+                "mean_abs": float(np.abs(r).mean()),
+                "rmse": float(np.sqrt(np.mean(r ** 2))),
+                "max_abs": float(np.abs(r).max()),
+                "ratio_p50": float(np.median(ratio[mask])),
+                "ratio_p95": float(np.quantile(ratio[mask], 0.95)),
+            }
+
+        return {
+            "days": len(frame),
+            "r_squared": 1.0 - ss_res / ss_tot if ss_tot > 0 else float("nan"),
+            "explained_corr": float(np.corrcoef(explained, total)[0, 1]) if len(frame) > 1 else float("nan"),
+            "trustworthy_share": float(trusted.mean()),
+            "all": summary(np.ones(len(frame), dtype=bool)),
+            "trustworthy": summary(trusted),
+            "flagged": summary(~trusted),
+            # Days with every position expired have no flags (NaN); they are
+            # reported on their own rather than counted as passing
+            "no_live_positions": int((~frame["live_positions"].astype(bool)).sum()),
+            "flag_counts": {
+                flag: int((~frame[flag].dropna().astype(bool)).sum())
+                for flag in ("spot_valid", "residual_valid", "gamma_valid", "expiry_valid")
+                if flag in frame
+            },
+        }
@@ -1,8 +1,11 @@
+from datetime import datetime, timedelta
 from market_data.spot import SpotData
 from market_data.option_chain import OptionChainLoader
 from market_data.vol_surface import ImpliedVolSurface
 from engine.pricer import PortfolioPricer
+from engine.instrumentation import PROFILER
 
+@PROFILER.timed("context_build")
 def build_context(ticker="SPY", rate=0.04):
     """
     Build cached market context: spot, vol surface, pricer, interest rate.
@@ -31,3 +34,36 @@ def build_context(ticker="SPY", rate=0.04):
         "rate": rate,
         "chain_loader": chain_loader
     }
+
+
+@PROFILER.timed("context_refresh")
+def refresh_context(context, ticker="SPY"):
+    """
+    Incrementally refresh a context built by `build_context`.
+
+    Re-polls spot and the chains, then rebuilds only the smiles whose
+    quotes changed (see ImpliedVolSurface.refreshed). Returns a NEW
+    context with the next surface version; the given context is left
+    untouched so in-flight valuations keep a consistent snapshot.
+    Returns the same context if nothing changed.
+    """
+    # --- Spot (recent window only) ---
+    spot_loader = SpotData(ticker)
+    spot_loader.fetch(start_date=(datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d"))
+    spot = spot_loader.latest_spot()
+
+    # --- Chains, diffed per expiry ---
+    chain_loader = context["chain_loader"]
+    expiries = chain_loader.get_expirations()[:15]
+    option_chains = chain_loader.get_option_chain_for_surface(expiries)
+
+    surface, changed = context["surface"].refreshed(option_chains, spot=spot)
+    if surface is context["surface"]:
+        return context
+
+    return {
+        **context,
+        "spot": spot,
+        "surface": surface,
+        "changed_expiries": changed,
+    }
@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from engine.build_context import build_context, refresh_context
+
+
+def estimate_context_bytes(context):
+    """
+    Rough memory footprint of a market context, dominated by the surface.
+    interp1d keeps its own copies of the node arrays, so each smile is
+    counted roughly three times plus a fixed per-object overhead.
+    """
+    total = 4096
+    for smile in context["surface"].surface.values():
+        total += 3 * (smile.x.nbytes + smile.y.nbytes) + 2048
+    return total
+
+
+class ContextPool:
+    """
+    Pool of market contexts keyed by (ticker, as_of).
+
+    - Missing contexts are built concurrently in a thread pool; concurrent
+      requests for the same key share one build.
+    - Entries are evicted least-recently-used once the estimated memory
+      exceeds max_bytes.
+    - An optional background thread refreshes entries older than
+      refresh_interval and swaps them in; readers keep getting the old
+      context until the new one is ready. With an updater (the default
+      for the default builder) a refresh re-polls the chains and rebuilds
+      only the smiles whose quotes changed, producing a new surface
+      version instead of a full rebuild. Historical keys (as_of other
+      than today) are never refreshed.
+    - The default builder serves today's key from live chains and past
+      dates from snapshot_dir (market_data.snapshot.snapshot_path); it
+      refuses past dates when no snapshot_dir is set.
+    """
+
+    def __init__(
+        self,
+        builder=None,
+        rate=0.04,
+        max_bytes=256 * 1024 ** 2,
+        max_workers=8,
+        refresh_interval=None,
+        updater=None,
+        snapshot_dir=None
+    ):
+        """
+        builder : callable(ticker, as_of) -> context; defaults to build_context
+                  for today and snapshots from snapshot_dir for past dates
+        rate : risk-free rate passed to build_context
+        max_bytes : memory budget for cached contexts
+        max_workers : concurrent context builds
+        refresh_interval : seconds between background refreshes, None = off
+        updater : callable(ticker, as_of, context) -> context for incremental
+                  refreshes; defaults to refresh_context with the default
+                  builder, otherwise refreshes call builder
+        snapshot_dir : directory of saved snapshots for historical keys
+        """
+        self.rate = rate
+        self.snapshot_dir = snapshot_dir
+        self.builder = builder or self._default_builder
+        if updater is None and builder is None:
+            updater = lambda ticker, as_of, context: refresh_context(context, ticker)
+        self.updater = updater
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+
+        self._entries = OrderedDict()   # key -> {"context", "bytes", "built_at"}
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self._stop = threading.Event()
+        self._refresher = None
+        if refresh_interval:
+            self.start_refresh(refresh_interval)
+
+    # ---------- KEYS ---------- #
+
+    @staticmethod
+    def key(ticker, as_of=None):
+        """
+        as_of defaults to today's date, i.e. the live snapshot.
+        """
+        if as_of is None:
+            as_of = datetime.now().strftime("%Y-%m-%d")
+        return (ticker.upper(), str(as_of))
+
+    @staticmethod
+    def is_historical(key):
+        return key[1] != datetime.now().strftime("%Y-%m-%d")
+
+    def _default_builder(self, ticker, as_of):
+        if not self.is_historical((ticker, as_of)):
+            return build_context(ticker, rate=self.rate)
+        if self.snapshot_dir is None:
+            raise ValueError(
+                f"No market data for {ticker} as of {as_of}: "
+                "live chains only cover today, pass snapshot_dir or a builder"
+            )
+        from market_data.snapshot import load_snapshot, snapshot_path
+        return load_snapshot(snapshot_path(self.snapshot_dir, ticker, as_of))
+
+    # ---------- LOOKUP ---------- #
+
+    def get(self, ticker, as_of=None):
+        """
+        Return the context for (ticker, as_of), building it if needed.
+        """
+        return self._submit(self.key(ticker, as_of)).result()
+
+    def get_many(self, tickers, as_of=None):
+        """
+        Return dict[ticker] = context, building missing ones concurrently.
+        """
+        futures = {ticker: self._submit(self.key(ticker, as_of)) for ticker in tickers}
+        return {ticker: future.result() for ticker, future in futures.items()}
+
+    def peek(self, ticker, as_of=None):
+        """
+        The cached context for (ticker, as_of), or None; never builds.
+        """
+        with self._lock:
+            entry = self._entries.get(self.key(ticker, as_of))
+            return None if entry is None else entry["context"]
+
+    def prefetch(self, tickers, as_of=None):
+        """
+        Start building missing contexts without waiting for them.
+        """
+        for ticker in tickers:
+            self._submit(self.key(ticker, as_of))
+
+    def _submit(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return _done(entry["context"])
+
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._build, key)
+                self._inflight[key] = future
+            return future
+
+    def _build(self, key):
+        try:
+            context = self.builder(*key)
+            self._store(key, context)
+            return context
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # ---------- STORAGE / EVICTION ---------- #
+
+    def _store(self, key, context):
+        with self._lock:
+            self._entries[key] = {
+                "context": context,
+                "bytes": estimate_context_bytes(context),
+                "built_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+            self._entries.popitem(last=False)
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self._entries.values())
+
+    def invalidate(self, ticker, as_of=None):
+        with self._lock:
+            self._entries.pop(self.key(ticker, as_of), None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------- BACKGROUND REFRESH ---------- #
+
+    def start_refresh(self, interval):
+        """
+        Rebuild entries older than interval seconds in the background.
+        """
+        self.refresh_interval = interval
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh_stale()
+
+    def refresh_stale(self):
+        """
+        Submit background rebuilds for entries older than refresh_interval.
+        Historical snapshots do not change and are skipped.
+        Returns the refresh futures.
+        """
+        if self.refresh_interval is None:
+            return []
+
+        now = time.time()
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if now - entry["built_at"] >= self.refresh_interval
+                and key not in self._inflight and not self.is_historical(key)
+            ]
+            futures = []
+            for key in stale:
+                future = self._executor.submit(self._rebuild, key)
+                self._inflight[key] = future
+                futures.append(future)
+        return futures
+
+    def _rebuild(self, key):
+        try:
+            with self._lock:
+                entry = self._entries.get(key)
+
+            if entry is None or self.updater is None:
+                context = self.builder(*key)
+            else:
+                context = self.updater(*key, entry["context"])
+
+            with self._lock:
+                # Entry may have been evicted meanwhile; don't resurrect it
+                if key not in self._entries:
+                    return context
+            # Unchanged contexts are re-stored too, to reset their age
+            self._store(key, context)
+            return context
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def close(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=1.0)
+        self._executor.shutdown(wait=False)
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
@@ -0,0 +1,150 @@
+#Low-overhead timing spans and call counters for the pricing hot path
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Collects timing spans and call counters.
+
+    Disabled by default; when disabled `span` returns a shared no-op
+    context and `count` returns immediately, so hooks can stay in the
+    hot path. Set STRESS_PROFILE=1 to enable at import time.
+    """
+
+    def __init__(self, enabled=False, max_events=200_000):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.events = deque(maxlen=max_events)   # raw spans for trace export
+        self.reset()
+
+    # ---------- SWITCH ---------- #
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.span_stats = {}   # name -> [count, total_s, max_s]
+            self.events.clear()
+
+    # ---------- HOOKS ---------- #
+
+    def span(self, name):
+        """
+        Context manager timing a named stage.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name):
+        """
+        Decorator form of `span`.
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record(self, name, start, duration):
+        with self._lock:
+            stats = self.span_stats.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            self.events.append((name, start, duration, threading.get_ident()))
+
+    # ---------- REPORTING ---------- #
+
+    def summary(self):
+        """
+        Per-span count / total / mean / max in milliseconds plus counters.
+        """
+        with self._lock:
+            spans = {
+                name: {
+                    "count": count,
+                    "total_ms": total * 1e3,
+                    "mean_ms": total * 1e3 / count,
+                    "max_ms": longest * 1e3,
+                }
+                for name, (count, total, longest) in self.span_stats.items()
+            }
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def chrome_trace(self):
+        """
+        Spans as Chrome trace events (chrome://tracing, Perfetto).
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                }
+                for name, start, duration, tid in self.events
+            ]
+            counters = dict(self.counters)
+
+        end = max((e["ts"] + e["dur"] for e in events), default=0.0)
+        events.append({"name": "counters", "ph": "C", "ts": end, "pid": pid, "args": counters})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+PROFILER = Profiler(enabled=os.environ.get("STRESS_PROFILE", "0") == "1")
+
+span = PROFILER.span
+count = PROFILER.count
+timed = PROFILER.timed
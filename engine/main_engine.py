@@ -1,9 +1,10 @@
 from engine.pnl_explain import PnLExplain
 from stress.scenario_engine import ScenarioEngine
+from engine.instrumentation import PROFILER
 
-def run_scenario(context, scenario, portfolio):
+def _scenario_numbers(context, scenario, portfolio, higher_order):
     """
-    Run a single scenario on a given portfolio.
+    Priced outputs of a scenario (everything except plots/diagnostics).
     """
     surface = context["surface"]
     pricer = context["pricer"]
@@ -18,26 +19,70 @@ def run_scenario(context, scenario, portfolio):
     base_value = pricer.price(portfolio, spot, surface)
 
     # --- Apply scenario ---
+    dynamics = scenario.get("smile_dynamics", "sticky_strike")
     stressed_value, pnl, shocked_spot, stressed_surface = scenario_engine.apply_scenario(
         spot_shift=scenario.get("spot_shift", 0.0),
-        vol_shocks=scenario.get("vol_shocks", [])
+        vol_shocks=scenario.get("vol_shocks", []),
+        dynamics=dynamics
     )
 
     # --- PnL explain ---
     pnl_breakdown = pnl_engine.explain(
         shocked_spot=shocked_spot,
-        vol_shocks=scenario.get("vol_shocks", [])
+        vol_shocks=scenario.get("vol_shocks", []),
+        higher_order=higher_order,
+        dynamics=dynamics
     )
 
+    return {
+        "base_value": base_value,
+        "stressed_value": stressed_value,
+        "pnl": pnl,
+        "pnl_breakdown": pnl_breakdown,
+        "shocked_spot": shocked_spot,
+    }
+
+
+@PROFILER.timed("run_scenario")
+def run_scenario(context, scenario, portfolio, higher_order=False, cache=None, plot=True):
+    """
+    Run a single scenario on a given portfolio.
+    higher_order: add analytic vanna/volga/charm terms to the PnL explain
+    plot: build the dashboard figure; batch callers pass False and render
+          headlessly with plots.report instead
+    cache: optional ScenarioResultCache; priced outputs are reused when the
+           portfolio, surface and scenario are unchanged
+    """
+    surface = context["surface"]
+
+    if cache is not None:
+        key = cache.key(
+            "run_scenario", portfolio, surface, scenario,
+            pricer=context["pricer"], rate=context["rate"], higher_order=higher_order
+        )
+        numbers = cache.get_or_compute(
+            key, lambda: _scenario_numbers(context, scenario, portfolio, higher_order)
+        )
+    else:
+        numbers = _scenario_numbers(context, scenario, portfolio, higher_order)
+
+    base_value = numbers["base_value"]
+    stressed_value = numbers["stressed_value"]
+    pnl = numbers["pnl"]
+    pnl_breakdown = numbers["pnl_breakdown"]
+    shocked_spot = numbers["shocked_spot"]
+
     # --- Build plots (your existing plotting function) ---
-    from plots.plots import plot_scenario_dashboard
-    fig = plot_scenario_dashboard(
-        scenario_name=scenario.get("name", "Scenario"),
-        base_spot=surface.spot,
-        shocked_spot=shocked_spot,
-        true_pnl=pnl,
-        pnl_breakdown=pnl_breakdown
-    )
+    fig = None
+    if plot:
+        from plots.plots import plot_scenario_dashboard
+        fig = plot_scenario_dashboard(
+            scenario_name=scenario.get("name", "Scenario"),
+            base_spot=surface.spot,
+            shocked_spot=shocked_spot,
+            true_pnl=pnl,
+            pnl_breakdown=pnl_breakdown
+        )
 
     # --- Optionally run Greek diagnostics ---
     from diagnostics.greek_diagnostics import GreekValidityDiagnostics
@@ -55,6 +100,48 @@ def run_scenario(context, scenario, portfolio):
         "stressed_value": stressed_value,
         "pnl": pnl,
         "pnl_breakdown": pnl_breakdown,
+        "shocked_spot": shocked_spot,
         "plots": fig,
         "diagnostics": diagnostics
     }
+
+
+def run_reverse_stress(context, portfolio, loss_threshold=None, bounds=None, cache=None):
+    """
+    Search for the worst-case scenario on a given portfolio.
+    cache: optional ScenarioResultCache
+    """
+    from stress.reverse_stress import ReverseStressEngine
+
+    def search():
+        engine = ReverseStressEngine(
+            portfolio,
+            context["pricer"],
+            context["surface"],
+            rate=context["rate"],
+            bounds=bounds
+        )
+        return engine.search(loss_threshold=loss_threshold)
+
+    if cache is None:
+        return search()
+
+    key = cache.key(
+        "reverse_stress", portfolio, context["surface"],
+        {"loss_threshold": loss_threshold, "bounds": bounds},
+        pricer=context["pricer"], rate=context["rate"]
+    )
+    return cache.get_or_compute(key, search)
+
+
+def run_what_if(context, portfolio, trades, scenarios=None):
+    """
+    Pre-trade what-if: marginal and post-trade aggregates for candidate
+    legs under every scenario. Attaches the portfolio first if needed
+    (scenarios default to the standard SCENARIOS); later calls reuse the
+    cached per-scenario base.
+    """
+    if portfolio.aggregates is None:
+        from engine.scenarios import SCENARIOS
+        portfolio.attach(context, SCENARIOS if scenarios is None else scenarios)
+    return portfolio.what_if(trades)
@@ -0,0 +1,142 @@
+#Many books against one context: price each unique contract once, scatter to books
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from instruments.portfolio import position_arrays
+from models.greeks import bs_greeks_vec
+from engine.instrumentation import PROFILER
+
+METRICS = ("value", "delta", "gamma", "vega", "theta")
+
+
+class MultiBookValuer:
+    """
+    Values many portfolios against one market context.
+
+    Legs from all books are reduced to unique contracts
+    (strike, maturity, call/put, exercise). Vol lookups, prices and
+    Greeks are computed once per unique contract and mapped back through
+    a sparse (book x contract) exposure matrix, so cost scales with the
+    number of listed contracts rather than the number of legs.
+
+    Units follow the portfolio aggregates: Greeks per book in
+    GreeksEngine units, theta as one-day decay.
+    """
+
+    def __init__(self, books, context):
+        """
+        books : dict name -> OptionPortfolio, or a list (named 0..n-1)
+        context : market context (surface, pricer, rate)
+        """
+        if not isinstance(books, dict):
+            books = dict(enumerate(books))
+        if not books:
+            raise ValueError("At least one book is required")
+
+        self.context = context
+        self.book_names = list(books)
+
+        # -------------------------
+        # 1. All legs, tagged by book
+        # -------------------------
+        arrays = [position_arrays(p) for p in books.values()]
+        book_id = np.concatenate([np.full(len(a), b) for b, a in enumerate(arrays)])
+        strike, maturity, is_call, is_american, units = (
+            np.concatenate([getattr(a, field) for a in arrays])
+            for field in ("strike", "maturity", "is_call", "is_american", "units")
+        )
+        self.n_legs = len(strike)
+
+        # -------------------------
+        # 2. Unique contracts
+        # -------------------------
+        first, inverse = _unique_rows(strike, maturity, is_call, is_american)
+
+        self.strike = strike[first]
+        self.maturity = maturity[first]
+        self.is_call = is_call[first]
+        self.is_american = is_american[first]
+
+        # Exposure: units of each contract held by each book (duplicates summed)
+        self.exposure = sparse.csr_matrix(
+            (units, (book_id, inverse)),
+            shape=(len(self.book_names), len(first))
+        )
+
+    def __len__(self):
+        return len(self.strike)
+
+    @PROFILER.timed("multi_book")
+    def contract_metrics(self, spot=None, surface=None, dynamics="sticky_strike"):
+        """
+        (n_contracts, len(METRICS)) per-unit value and Greeks.
+        spot / surface default to the context's; a shocked spot reads the
+        smile under `dynamics`, like PortfolioPricer.price.
+        """
+        surface = self.context["surface"] if surface is None else surface
+        spot = surface.spot if spot is None else spot
+        pricer = self.context["pricer"]
+        rate = self.context["rate"]
+
+        vols = surface.get_vols(self.strike, self.maturity, spot, dynamics)
+        prices = pricer.price_legs(spot, self.strike, self.maturity, vols, self.is_call, self.is_american, rate)
+
+        g = bs_greeks_vec(spot, self.strike, self.maturity, rate, vols, self.is_call)
+        return np.column_stack([prices, g["delta"], g["gamma"], g["vega"], g["theta"] / 252])
+
+    def value(self, spot=None, surface=None, dynamics="sticky_strike"):
+        """
+        Per-book value and Greeks as a DataFrame (rows = books).
+        """
+        totals = self.exposure @ self.contract_metrics(spot, surface, dynamics)
+        return pd.DataFrame(totals, index=pd.Index(self.book_names, name="book"), columns=list(METRICS))
+
+    def scenario_pnl(self, spot_shifts, dynamics="sticky_strike"):
+        """
+        Per-book PnL for relative spot shifts (rows = books, columns = shifts).
+        Prices are evaluated once per unique contract for all shifts; under
+        sticky moneyness / delta the vols of every shift come from one lookup.
+        """
+        surface = self.context["surface"]
+        spot_shifts = np.asarray(spot_shifts, dtype=float)
+        spots = surface.spot * (1 + spot_shifts)
+
+        pricer = self.context["pricer"]
+        rate = self.context["rate"]
+
+        S = spots[:, None]
+        vols = surface.get_vols(self.strike, self.maturity, S, dynamics)
+        prices = pricer.price_legs(S, self.strike, self.maturity, vols, self.is_call, self.is_american, rate)
+
+        base = self.contract_metrics(surface.spot, surface)[:, 0]
+        pnl = self.exposure @ (prices - base).T
+        return pd.DataFrame(pnl, index=pd.Index(self.book_names, name="book"), columns=spot_shifts)
+
+
+def _unique_rows(*columns):
+    """
+    Unique rows across parallel key columns via one lexsort.
+    Returns (index of one representative per unique row, inverse map).
+    """
+    order = np.lexsort(columns[::-1])
+    if len(order) == 0:
+        return order, np.empty(0, dtype=int)
+
+    new_group = np.zeros(len(order), dtype=bool)
+    new_group[0] = True
+    for col in columns:
+        c = col[order]
+        new_group[1:] |= c[1:] != c[:-1]
+
+    group = np.cumsum(new_group) - 1
+    inverse = np.empty(len(order), dtype=int)
+    inverse[order] = group
+    return order[new_group], inverse
+
+
+def value_books(books, context, spot=None):
+    """
+    One-shot multi-book valuation (see MultiBookValuer).
+    """
+    return MultiBookValuer(books, context).value(spot)
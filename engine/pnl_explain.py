@@ -1,7 +1,9 @@
-import copy
+import numpy as np
+from instruments.portfolio import position_arrays
 from models.black_scholes import bs_price
-from models.greeks import GreeksEngine
+from models.greeks import bs_greeks_vec
 from stress.vol_stress import SurfaceStressEngine
+from engine.instrumentation import PROFILER
 
 
 class PnLExplain:
@@ -10,9 +12,14 @@ class PnLExplain:
     - Spot PnL via Delta + Gamma
     - Vol PnL via repricing (true Vega)
     - Theta via roll-down
+    - Optional analytic cross terms (vanna, volga, charm)
     - Residual captures higher-order terms
     """
 
+    # Largest relative spot move for the analytic vanna term, as in the
+    # GreekValidityDiagnostics spot check; beyond it the cross term is repriced
+    VANNA_SPOT_LIMIT = 0.03
+
     def __init__(self, portfolio, pricer, surface, r=0.0):
         self.portfolio = portfolio
         self.pricer = pricer
@@ -22,7 +29,9 @@ class PnLExplain:
         self.base_spot = surface.spot
         self.base_value = pricer.price(portfolio, self.base_spot, surface)
 
-    def explain(self, shocked_spot=None, vol_shocks=None, dt=1/252):
+    @PROFILER.timed("pnl_explain")
+    def explain(self, shocked_spot=None, vol_shocks=None, dt=1/252, higher_order=False, cache=None,
+                dynamics="sticky_strike", horizon=None):
         """
         Parameters
         ----------
@@ -32,22 +41,69 @@ class PnLExplain:
             Same structure as scenario engine
         dt : float
             Time step in years (theta)
+        higher_order : bool
+            Add analytic vanna (spot x vol) and volga lines, using each
+            position's actual vol change under the scenario. Vega Pnl stays
+            the vol repricing: volga is split out of it, not added on top.
+            Beyond VANNA_SPOT_LIMIT the vanna line is the repriced spot x vol
+            cross term instead, and "Vanna Repriced" is True
+        cache : ScenarioResultCache, optional
+            Reuse a stored breakdown for the same portfolio, surface and shocks
+        dynamics : str
+            Smile dynamics under the spot move (see ImpliedVolSurface). Vol
+            changes from the smile moving with spot are part of Vega Pnl
+        horizon : float, optional
+            Time step in years for the charm (spot x time) term. The repriced
+            truth has no time step, so charm is only added when this is given
 
         Returns
         -------
         dict : PnL explain components
         """
+        if cache is None:
+            return self._explain(shocked_spot, vol_shocks, dt, higher_order, dynamics, horizon)
+
+        key = cache.key(
+            "explain", self.portfolio, self.surface,
+            {"shocked_spot": shocked_spot, "vol_shocks": vol_shocks or [], "smile_dynamics": dynamics},
+            pricer=self.pricer, r=self.r, dt=dt, higher_order=higher_order,
+            horizon=horizon
+        )
+        return cache.get_or_compute(
+            key, lambda: self._explain(shocked_spot, vol_shocks, dt, higher_order, dynamics, horizon)
+        )
+
+    def _local_greeks(self, a, bump=0.01, theta_dt=1/252):
+        """
+        Portfolio delta, gamma and one-day theta in one vectorized pricing
+        pass: the same bumps and roll-down as GreeksEngine.delta / gamma /
+        theta, with American legs on the pricer's lattice.
+        """
+        S = self.base_spot
+        h = S * bump
+        T_roll = np.maximum(a.maturity - theta_dt, 1e-6)
+
+        spots = np.array([S - h, S, S + h, S])[:, None]
+        maturities = np.vstack([a.maturity, a.maturity, a.maturity, T_roll])
+        vols = np.vstack([self.surface.get_vols(a.strike, a.maturity)] * 3 + [self.surface.get_vols(a.strike, T_roll)])
+
+        down, mid, up, rolled = self.pricer.price_legs(
+            spots, a.strike, maturities, vols, a.is_call, a.is_american, self.r
+        ) @ a.units
+        return {
+            "delta": (up - down) / (2 * h),
+            "gamma": (up - 2 * mid + down) / h ** 2,
+            "theta": rolled - mid,
+        }
+
+    def _explain(self, shocked_spot, vol_shocks, dt, higher_order, dynamics="sticky_strike",
+                 horizon=None):
 
         # -------------------------
-        # 1. Base Greeks (LOCAL)
+        # 1. Base Greeks (LOCAL, one vectorized pass)
         # -------------------------
-        greeks_engine = GreeksEngine(
-            portfolio=self.portfolio,
-            pricer=self.pricer,
-            surface=self.surface,
-            r=self.r
-        )
-        greeks = greeks_engine.compute_all()
+        a = position_arrays(self.portfolio)
+        greeks = self._local_greeks(a)
 
         # -------------------------
         # 2. Shocked spot
@@ -66,21 +122,40 @@ class PnLExplain:
         # -------------------------
         vega_pnl = 0.0
         surface_vol = self.surface
+        smile_moves = dynamics != "sticky_strike" and dS != 0
 
         if vol_shocks:
-            stress_engine = SurfaceStressEngine(self.surface)
-            surface_vol = copy.deepcopy(self.surface)
-
-            for shock in vol_shocks:
-                surface_vol = stress_engine.apply_shock(shock)
+            # Same stressed surface as build_stressed_market
+            surface_vol = SurfaceStressEngine(self.surface).apply_shocks(vol_shocks)
 
+        if vol_shocks or smile_moves:
+            # Base spot, vols as read at the scenario spot
             value_vol = self.pricer.price(
                 self.portfolio,
                 self.base_spot,
-                surface_vol
+                surface_vol,
+                dynamics,
+                smile_spot=spot_new
             )
             vega_pnl = value_vol - self.base_value
 
+        # -------------------------
+        # 4b. Higher-order terms (ANALYTIC, one vectorized pass)
+        # -------------------------
+        if higher_order:
+            base_vols = self.surface.get_vols(a.strike, a.maturity)
+            d_vol = surface_vol.get_vols(a.strike, a.maturity, spot_new, dynamics) - base_vols
+
+            local = bs_greeks_vec(self.base_spot, a.strike, a.maturity, self.r, base_vols, a.is_call)
+
+            # The repriced vol leg already holds the volga term: report it
+            # as its own line and keep vega + volga equal to the repricing
+            volga_pnl = (0.5 * local["volga"] * d_vol ** 2) @ a.units
+            vega_pnl -= volga_pnl
+            vanna_repriced = abs(dS) / self.base_spot > self.VANNA_SPOT_LIMIT and (vol_shocks or smile_moves)
+            vanna_pnl = (local["vanna"] * d_vol) @ a.units * dS
+            charm_pnl = local["charm"] @ a.units * dS * horizon if horizon is not None else None
+
         # -------------------------
         # 5. Theta PnL
         # -------------------------
@@ -92,21 +167,39 @@ class PnLExplain:
         value_new = self.pricer.price(
             self.portfolio,
             spot_new,
-            surface_vol
+            surface_vol,
+            dynamics
         )
         total_pnl = value_new - self.base_value
 
+        if higher_order and vanna_repriced:
+            # V(S1, vol1) - V(S1, vol0) - V(S0, vol1) + V(S0, vol0)
+            value_spot = self.pricer.price(self.portfolio, spot_new, self.surface)
+            vanna_pnl = value_new - value_spot - value_vol + self.base_value
+
         # -------------------------
         # 7. Residual
         # -------------------------
         explained = delta_pnl + gamma_pnl + vega_pnl + theta_pnl
+        if higher_order:
+            explained += vanna_pnl + volga_pnl
+            if charm_pnl is not None:
+                explained += charm_pnl
         residual = total_pnl - explained
 
-        return {
+        breakdown = {
             "Total Pnl": total_pnl,
             "Delta Pnl": delta_pnl,
             "Gamma Pnl": gamma_pnl,
             "Vega Pnl": vega_pnl,
             "Theta Pnl": theta_pnl,
-            "Residual": residual
         }
+        if higher_order:
+            breakdown["Vanna Pnl"] = vanna_pnl
+            breakdown["Vanna Repriced"] = bool(vanna_repriced)
+            breakdown["Volga Pnl"] = volga_pnl
+            if charm_pnl is not None:
+                breakdown["Charm Pnl"] = charm_pnl
+        breakdown["Residual"] = residual
+
+        return breakdown
@@ -1,4 +1,7 @@
-from models.black_scholes import bs_price
+import numpy as np
+from models.black_scholes import bs_price, bs_price_vec
+from models.lattice import american_price_vec
+from engine.instrumentation import PROFILER
 
 
 class PortfolioPricer:
@@ -6,14 +9,115 @@ class PortfolioPricer:
     Prices an option portfolio given spot and vol surface
     """
 
-    def __init__(self, rate: float):
+    def __init__(self, rate: float, american_steps: int = 200, american_correction="control_variate"):
+        """
+        rate : risk-free rate
+        american_steps : lattice steps for AmericanOption positions
+        american_correction : see models.lattice.american_price_vec
+        """
         self.rate = rate
+        self.american_steps = american_steps
+        self.american_correction = american_correction
+
+    def _american_value(self, batch, spot):
+        """
+        Price all collected American positions in one batched lattice.
+        batch : list of (strike, maturity, vol, is_call, units)
+        """
+        if not batch:
+            return 0.0
+
+        strike, maturity, vol, is_call, units = (np.array(col) for col in zip(*batch))
+        prices = american_price_vec(
+            spot, strike, maturity, self.rate, vol, is_call,
+            steps=self.american_steps,
+            correction=self.american_correction
+        )
+        return float(prices @ units)
+
+    def price_legs(self, spot, strike, maturity, vol, is_call, is_american, rate=None):
+        """
+        Per-unit prices of option legs, vectorized: Black-Scholes for
+        European legs and this pricer's lattice for American legs.
+
+        Arguments broadcast like `bs_price_vec`, with legs along the last
+        axis (spot may be a scalar or a column). The array counterpart of
+        `price`, so every vectorized engine prices American legs with the
+        same lattice settings and vol floor.
+        rate : defaults to the pricer's rate
+        """
+        rate = self.rate if rate is None else rate
+        is_american = np.asarray(is_american, dtype=bool)
+        prices = bs_price_vec(spot, strike, maturity, rate, vol, is_call)
+
+        if is_american.any():
+            def legs(x):
+                x = np.asarray(x)
+                return x[..., is_american] if x.ndim and x.shape[-1] == is_american.size else x
+
+            prices[..., is_american] = american_price_vec(
+                legs(spot), legs(strike), legs(maturity), rate, legs(vol), legs(is_call),
+                steps=self.american_steps,
+                correction=self.american_correction
+            )
+        return prices
+
+    def lattice_greeks(self, spot, strike, maturity, vol, is_call, rate=None, bump=0.01, vol_bump=None, dt=None):
+        """
+        Lattice price, delta and gamma of American legs from one batched
+        call at spot * (1 - bump, 1, 1 + bump). With vol_bump, vega per
+        1.00 of vol; with dt (years), theta per year of decay on the
+        rolled maturity, as in `bs_greeks_vec`.
+
+        Returns a dict of arrays shaped like the broadcast inputs.
+        """
+        rate = self.rate if rate is None else rate
+        spot, strike, maturity, vol, is_call = np.broadcast_arrays(
+            *(np.asarray(x, dtype=float) for x in (spot, strike, maturity, vol)), np.asarray(is_call)
+        )
+        h = spot * bump
+
+        spots = [spot - h, spot, spot + h]
+        vols = [vol, vol, vol]
+        maturities = [maturity, maturity, maturity]
+        if vol_bump is not None:
+            spots.append(spot)
+            vols.append(vol + vol_bump)
+            maturities.append(maturity)
+        if dt is not None:
+            spots.append(spot)
+            vols.append(vol)
+            maturities.append(np.maximum(maturity - dt, 1e-6))
 
-    def price(self, portfolio, spot: float, vol_surface) -> float:
+        prices = american_price_vec(
+            np.stack(spots), strike, np.stack(maturities), rate, np.stack(vols), is_call,
+            steps=self.american_steps,
+            correction=self.american_correction
+        )
+        down, mid, up = prices[:3]
+        out = {"price": mid, "delta": (up - down) / (2 * h), "gamma": (up - 2 * mid + down) / h ** 2}
+        if vol_bump is not None:
+            out["vega"] = (prices[3] - mid) / vol_bump
+        if dt is not None:
+            out["theta"] = (prices[-1] - mid) / dt
+        return out
+
+    @PROFILER.timed("pricing")
+    def price(self, portfolio, spot: float, vol_surface, dynamics="sticky_strike", smile_spot=None) -> float:
+        """
+        dynamics : smile dynamics for the vol lookup (see ImpliedVolSurface)
+        smile_spot : spot the smile is read at, defaults to spot
+        """
         total_value = 0.0
+        american = []
+        smile_spot = spot if smile_spot is None else smile_spot
 
         for opt in portfolio:
-            vol = vol_surface.get_vol(opt.strike, opt.maturity)
+            vol = vol_surface.get_vol(opt.strike, opt.maturity, smile_spot, dynamics)
+
+            if opt.exercise == "american":
+                american.append((opt.strike, opt.maturity, vol, opt.option_type == "Call", opt.quantity * opt.contract_size))
+                continue
 
             price = bs_price(
                 spot=spot,
@@ -26,14 +130,16 @@ class PortfolioPricer:
 
             total_value += opt.quantity * price * opt.contract_size
 
-        return total_value
-    
+        return total_value + self._american_value(american, spot)
+
+    @PROFILER.timed("pricing")
     def price_with_rolled_maturity(pricer, portfolio, spot, vol_surface, dt):
         """
         Prices a portfolio assuming each option's maturity is reduced by dt.
         Only used for theta calculation.
         """
         total_value = 0.0
+        american = []
         for opt in portfolio:
             # Reduce time to maturity
             T_new = max(opt.maturity - dt, 1e-6)  # avoid zero/negative maturity
@@ -41,6 +147,10 @@ class PortfolioPricer:
             # Use the existing vol surface for this rolled maturity
             vol = vol_surface.get_vol(opt.strike, T_new)
 
+            if opt.exercise == "american":
+                american.append((opt.strike, T_new, vol, opt.option_type == "Call", opt.quantity * opt.contract_size))
+                continue
+
             # Price the option
             price = bs_price(
                 spot=spot,
@@ -54,5 +164,5 @@ class PortfolioPricer:
             # Account for quantity and contract size
             total_value += opt.quantity * price * opt.contract_size
 
-        return total_value
+        return total_value + pricer._american_value(american, spot)
 
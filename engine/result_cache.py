@@ -0,0 +1,196 @@
+#Content-addressed, disk-backed cache for scenario results shared across processes
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import numpy as np
+from engine.instrumentation import PROFILER
+
+# Cosmetic scenario fields that do not change results
+_SCENARIO_LABELS = ("name", "description")
+
+# Bump whenever pricing or scenario semantics change, so stored results
+# computed by older code are never served
+CACHE_VERSION = 4
+
+
+def portfolio_fingerprint(portfolio):
+    """
+    Hash of the portfolio contents, in position order.
+    """
+    h = hashlib.sha256()
+    for opt in portfolio:
+        h.update(
+            f"{opt.exercise}|{opt.option_type}|{float(opt.strike).hex()}|{float(opt.maturity).hex()}|"
+            f"{float(opt.quantity).hex()}|{float(opt.contract_size).hex()};".encode()
+        )
+    return h.hexdigest()
+
+
+def surface_fingerprint(surface):
+    """
+    Hash of the surface snapshot: spot plus every smile's nodes.
+    Any rebuild or refresh that changes a quote changes the version.
+    """
+    h = hashlib.sha256(float(surface.spot).hex().encode())
+    for T in sorted(surface.surface.keys()):
+        smile = surface.surface[T]
+        # Bare interp1d smiles (bump_parallel) carry no kind and are linear
+        kind = getattr(smile, "kind", "linear")
+        h.update(f"{float(T).hex()}|{kind}|".encode())
+        h.update(np.ascontiguousarray(smile.x, dtype=float).tobytes())
+        h.update(np.ascontiguousarray(smile.y, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def normalize_scenario(scenario):
+    """
+    Canonical form of a scenario spec: labels dropped, numbers as floats,
+    keys sorted. Shock order is kept since shocks are applied in order.
+    """
+    def canon(value):
+        if isinstance(value, dict):
+            return {k: canon(v) for k, v in sorted(value.items()) if k not in _SCENARIO_LABELS}
+        if isinstance(value, (list, tuple)):
+            return [canon(v) for v in value]
+        if isinstance(value, (int, float, np.floating, np.integer)) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    return canon(scenario or {})
+
+
+class ScenarioResultCache:
+    """
+    Disk-backed result cache keyed by a hash of
+    (kind, portfolio contents, surface snapshot, normalized scenario, params).
+
+    Backed by SQLite in WAL mode, so many processes can read and write the
+    same cache directory concurrently. Entries are evicted least-recently-
+    used once the stored size exceeds max_bytes. Keys include CACHE_VERSION,
+    and entries written under another version are dropped on open.
+    """
+
+    def __init__(self, path=".stress_cache", max_bytes=512 * 1024 ** 2, timeout=30.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        os.makedirs(path, exist_ok=True)
+        self.db_path = os.path.join(path, "cache.sqlite")
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+            row = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != str(CACHE_VERSION):
+                conn.execute("DELETE FROM entries")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(CACHE_VERSION),))
+
+    def _connect(self):
+        # One short-lived connection per call: safe across threads and forks
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    # ---------- KEYS ---------- #
+
+    @staticmethod
+    def key(kind, portfolio, surface, scenario=None, pricer=None, **params):
+        """
+        Content address for one computation.
+        kind : entry point, e.g. 'run_scenario', 'explain', 'spot_grid'
+        pricer : PortfolioPricer whose settings (rate, lattice) enter the key
+        params : anything else the result depends on (dt, higher_order, ...)
+        """
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "kind": kind,
+            "portfolio": portfolio_fingerprint(portfolio),
+            "surface": surface_fingerprint(surface),
+            "scenario": normalize_scenario(scenario),
+            "pricer": normalize_scenario(vars(pricer)) if pricer is not None else None,
+            "params": normalize_scenario(params),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    # ---------- ACCESS ---------- #
+
+    def get(self, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                PROFILER.count("cache_miss")
+                return default
+            try:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.OperationalError:
+                pass  # LRU touch is best effort under heavy write contention
+
+        PROFILER.count("cache_hit")
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time())
+            )
+        self._evict()
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached value for key, or compute(), store and return it.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def __contains__(self, key):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    # ---------- EVICTION ---------- #
+
+    def _evict(self):
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                excess = total - int(0.9 * self.max_bytes)
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+                    if excess <= 0:
+                        break
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    excess -= size
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        with self._connect() as conn:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_MISSING = object()
@@ -0,0 +1,326 @@
+#Append-only columnar store for (run, book, scenario, position, metric) result cubes
+
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+
+BOOK_LEVEL = -1   # position index for book-level metrics
+
+COLUMNS = {
+    "run": np.int32,
+    "date": "datetime64[D]",
+    "book": np.int32,
+    "scenario": np.int32,
+    "position": np.int32,
+    "metric": np.int32,
+    "value": np.float64,
+}
+
+ENCODED = ("run", "book", "scenario", "metric")
+
+
+class ResultStore:
+    """
+    Columnar result cube on local disk.
+
+    Layout:
+        root/dictionary.json            string <-> code for run/book/scenario/metric
+        root/date=YYYY-MM-DD/<segment>/ one immutable segment per flushed batch
+            _meta.json                  row count + codes present (for pruning)
+            <column>.npy | data.parquet
+
+    Segments are written to a temporary directory and renamed into place,
+    so readers never see partial data. Queries prune by date partition and
+    segment manifest first, then read only the columns they need
+    (memory-mapped for the NumPy backend).
+    """
+
+    def __init__(self, root, backend="auto"):
+        """
+        root : directory for the store (created if missing)
+        backend : 'numpy', 'parquet' or 'auto' (parquet if pyarrow is installed)
+        """
+        if backend == "auto":
+            backend = "parquet" if pq is not None else "numpy"
+        if backend == "parquet" and pq is None:
+            raise ImportError("pyarrow is required for the parquet backend")
+        if backend not in ("numpy", "parquet"):
+            raise ValueError("backend must be 'numpy', 'parquet' or 'auto'")
+
+        self.root = root
+        self.backend = backend
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- DICTIONARY ---------- #
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, "dictionary.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_dictionary(self):
+        path = os.path.join(self.root, "dictionary.json")
+        if not os.path.exists(path):
+            return {field: [] for field in ENCODED}
+        with open(path) as f:
+            return json.load(f)
+
+    def dictionary(self):
+        """
+        dict[field] = list of labels, where the code is the list index.
+        """
+        return self._read_dictionary()
+
+    def encode(self, field, labels):
+        """
+        Codes for labels, registering unseen labels. Safe across processes.
+        """
+        labels = [str(label) for label in labels]
+        with self._locked():
+            dictionary = self._read_dictionary()
+            known = {label: code for code, label in enumerate(dictionary[field])}
+            new = [label for label in dict.fromkeys(labels) if label not in known]
+
+            if new:
+                for label in new:
+                    known[label] = len(dictionary[field])
+                    dictionary[field].append(label)
+                tmp = os.path.join(self.root, f"dictionary.{uuid.uuid4().hex}.tmp")
+                with open(tmp, "w") as f:
+                    json.dump(dictionary, f)
+                os.replace(tmp, os.path.join(self.root, "dictionary.json"))
+
+        return np.array([known[label] for label in labels], dtype=np.int32)
+
+    def _lookup(self, field, labels):
+        """
+        Codes for existing labels only (unknown labels are dropped).
+        """
+        known = {label: code for code, label in enumerate(self._read_dictionary()[field])}
+        return np.array([known[str(l)] for l in labels if str(l) in known], dtype=np.int32)
+
+    # ---------- WRITE ---------- #
+
+    def writer(self, run_id=None, as_of=None, batch_rows=1_000_000):
+        """
+        Open a batched writer for one run.
+        run_id defaults to a timestamped id, as_of to today.
+        """
+        if run_id is None:
+            run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        if as_of is None:
+            as_of = datetime.now().strftime("%Y-%m-%d")
+        return RunWriter(self, run_id, str(as_of), batch_rows)
+
+    def _write_segment(self, as_of, columns):
+        partition = os.path.join(self.root, f"date={as_of}")
+        os.makedirs(partition, exist_ok=True)
+
+        name = uuid.uuid4().hex
+        tmp = os.path.join(partition, f".{name}.tmp")
+        os.makedirs(tmp)
+
+        if self.backend == "parquet":
+            table = pa.table(columns)
+            pq.write_table(table, os.path.join(tmp, "data.parquet"))
+        else:
+            for k, v in columns.items():
+                np.save(os.path.join(tmp, f"{k}.npy"), v)
+
+        meta = {
+            "rows": int(len(columns["value"])),
+            "backend": self.backend,
+            **{field: np.unique(columns[field]).tolist() for field in ENCODED},
+        }
+        with open(os.path.join(tmp, "_meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        os.rename(tmp, os.path.join(partition, name))
+
+    # ---------- QUERY ---------- #
+
+    def _segments(self, dates):
+        for partition in sorted(os.listdir(self.root)):
+            if not partition.startswith("date="):
+                continue
+            date = partition[len("date="):]
+            if dates is not None and not dates(date):
+                continue
+            part_dir = os.path.join(self.root, partition)
+            for name in sorted(os.listdir(part_dir)):
+                if not name.startswith("."):
+                    yield os.path.join(part_dir, name)
+
+    @staticmethod
+    def _date_filter(date):
+        if date is None:
+            return None
+        if isinstance(date, tuple):
+            start, end = (str(d) if d is not None else None for d in date)
+            return lambda d: (start is None or d >= start) and (end is None or d <= end)
+        if isinstance(date, (list, set)):
+            wanted = {str(d) for d in date}
+            return lambda d: d in wanted
+        return lambda d: d == str(date)
+
+    def query_arrays(self, scenario=None, book=None, metric=None, run=None, date=None, position=None):
+        """
+        Filtered columns as a dict of NumPy arrays (encoded codes).
+
+        scenario, book, metric, run : label or list of labels
+        date : 'YYYY-MM-DD', list of dates or (start, end) inclusive
+        position : int or list of ints (BOOK_LEVEL for book totals)
+        """
+        filters = {}
+        for field, labels in (("scenario", scenario), ("book", book), ("metric", metric), ("run", run)):
+            if labels is not None:
+                labels = [labels] if isinstance(labels, str) else labels
+                filters[field] = self._lookup(field, labels)
+
+        dates = self._date_filter(date)
+        parts = {k: [] for k in COLUMNS}
+
+        for segment in self._segments(dates):
+            with open(os.path.join(segment, "_meta.json")) as f:
+                meta = json.load(f)
+
+            # Segment pruning from the manifest
+            if any(not np.isin(meta[field], codes).any() for field, codes in filters.items()):
+                continue
+
+            columns = self._read_segment(segment, meta, filters)
+            mask = np.ones(len(columns["value"]), dtype=bool)
+            for field, codes in filters.items():
+                mask &= np.isin(columns[field], codes)
+            if position is not None:
+                mask &= np.isin(columns["position"], np.atleast_1d(position))
+
+            if mask.any():
+                for k in COLUMNS:
+                    parts[k].append(np.asarray(columns[k][mask]))
+
+        return {
+            k: np.concatenate(v) if v else np.array([], dtype=COLUMNS[k])
+            for k, v in parts.items()
+        }
+
+    def _read_segment(self, segment, meta, filters):
+        if meta["backend"] == "parquet":
+            # Push the code filters down to the Parquet reader
+            pushdown = [(field, "in", codes.tolist()) for field, codes in filters.items()]
+            table = pq.read_table(os.path.join(segment, "data.parquet"), filters=pushdown or None)
+            return {k: table.column(k).to_numpy() for k in COLUMNS}
+        return {k: np.load(os.path.join(segment, f"{k}.npy"), mmap_mode="r") for k in COLUMNS}
+
+    def query(self, **filters):
+        """
+        Same filters as `query_arrays`, returned as a DataFrame with
+        categorical labels (decoded without per-row Python objects).
+        """
+        arrays = self.query_arrays(**filters)
+        dictionary = self._read_dictionary()
+
+        frame = {k: arrays[k] for k in ("date", "position", "value")}
+        for field in ENCODED:
+            frame[field] = pd.Categorical.from_codes(arrays[field], categories=dictionary[field]) \
+                if dictionary[field] else pd.Categorical([])
+        return pd.DataFrame(frame)[list(COLUMNS)]
+
+
+class RunWriter:
+    """
+    Buffers result rows for one run and flushes them as segments.
+    """
+
+    def __init__(self, store, run_id, as_of, batch_rows):
+        self.store = store
+        self.run_id = run_id
+        self.as_of = as_of
+        self.batch_rows = batch_rows
+        self.run_code = store.encode("run", [run_id])[0]
+        self._codes = {}
+        self._buffer = []
+        self._rows = 0
+
+    def _code(self, field, label):
+        key = (field, label)
+        if key not in self._codes:
+            self._codes[key] = self.store.encode(field, [label])[0]
+        return self._codes[key]
+
+    def append(self, book, scenario, metric, values, positions=None):
+        """
+        Append one metric for one (book, scenario).
+
+        values : scalar (book level) or array of per-position values
+        positions : position indices, defaults to 0..n-1 (or BOOK_LEVEL
+                    for a scalar)
+        """
+        scalar = np.ndim(values) == 0
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if positions is None:
+            positions = [BOOK_LEVEL] if scalar else np.arange(len(values))
+        positions = np.asarray(positions, dtype=np.int32)
+
+        n = len(values)
+        self._buffer.append({
+            "book": np.full(n, self._code("book", book), dtype=np.int32),
+            "scenario": np.full(n, self._code("scenario", scenario), dtype=np.int32),
+            "metric": np.full(n, self._code("metric", metric), dtype=np.int32),
+            "position": positions,
+            "value": values,
+        })
+        self._rows += n
+        if self._rows >= self.batch_rows:
+            self.flush()
+
+    def append_result(self, book, scenario, result):
+        """
+        Append the scalar outputs of `run_scenario` as book-level metrics.
+        """
+        for metric in ("base_value", "stressed_value", "pnl"):
+            self.append(book, scenario, metric, result[metric], positions=[BOOK_LEVEL])
+        for component, value in result["pnl_breakdown"].items():
+            self.append(book, scenario, component, value, positions=[BOOK_LEVEL])
+
+    def flush(self):
+        if not self._buffer:
+            return
+        columns = {
+            k: np.concatenate([chunk[k] for chunk in self._buffer])
+            for k in ("book", "scenario", "metric", "position", "value")
+        }
+        n = len(columns["value"])
+        columns["run"] = np.full(n, self.run_code, dtype=np.int32)
+        columns["date"] = np.full(n, np.datetime64(self.as_of, "D"))
+
+        self.store._write_segment(self.as_of, {k: columns[k] for k in COLUMNS})
+        self._buffer = []
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -26,4 +26,37 @@ SCENARIOS = {
         "vol_shocks": [{"type": "parallel", "value": 0.15}, {"type": "skew", "value": -0.03}],
         "description": "10% downward spot move with large parallel volatility increase (+15 vol points) and skew reduction by 3 vol points",
     },
+    "Front-Month Vol Spike": {
+        "spot_shift": 0.0,
+        "vol_shocks": [{"type": "parallel", "value": 0.08, "max_maturity": 1 / 12}],
+        "description": "Event-driven +8 vol point spike on expiries within one month, longer expiries unchanged",
+    },
+    "Term-Decaying Vol Shock": {
+        "spot_shift": -0.02,
+        "vol_shocks": [{"type": "term_decay", "value": 0.10, "decay": 0.25}],
+        "description": "2% downward spot move with a +10 vol point shock decaying with maturity (3-month e-folding)",
+    },
+    "Crash Scenario (Sticky Moneyness)": {
+        "spot_shift": -0.10,
+        "vol_shocks": [{"type": "parallel", "value": 0.15}, {"type": "skew", "value": -0.03}],
+        "smile_dynamics": "sticky_moneyness",
+        "description": "Crash Scenario with the smile moving with spot, so vols are read at the new moneyness instead of per strike",
+    },
+}
+
+
+#Factor scenarios for multi-underlying books (stress.factor_stress), shocks per factor
+FACTOR_SCENARIOS = {
+    "Index Selloff": {
+        "factors": {"market": -0.05, "market_vol": 0.05},
+        "description": "5% index decline with +5 vol points on the market vol factor, passed through by beta",
+    },
+    "Index Rally + Vol Crush": {
+        "factors": {"market": 0.03, "market_vol": -0.03},
+        "description": "3% index rally with -3 vol points on the market vol factor",
+    },
+    "Market Crash": {
+        "factors": {"market": -0.10, "market_vol": 0.15, "market_skew": -0.03},
+        "description": "10% index crash, +15 vol points and skew reduction by 3 vol points, passed through by beta",
+    },
 }
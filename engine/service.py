@@ -0,0 +1,472 @@
+#Local asyncio HTTP risk service: warm contexts, micro-batched valuations, stale-while-revalidate
+
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from engine.context_pool import ContextPool
+from engine.instrumentation import PROFILER
+from engine.multi_book import MultiBookValuer
+from engine.result_cache import normalize_scenario, portfolio_fingerprint
+from instruments.portfolio import load_portfolio, portfolio_from_records
+from stress.scenario_engine import build_stressed_market
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _Job:
+    """
+    One queued valuation / scenario request.
+    """
+
+    def __init__(self, kind, context_key, portfolio, scenarios, future):
+        self.kind = kind                  # "value" or "scenarios"
+        self.context_key = context_key    # (ticker, as_of)
+        self.portfolio = portfolio
+        self.scenarios = scenarios        # {name: spec} for "scenarios" jobs
+        self.future = future
+
+
+class RiskService:
+    """
+    HTTP/1.1 JSON front end for the valuation and scenario engines.
+
+    - Market contexts stay warm in a ContextPool keyed by (ticker, as_of).
+    - Requests are queued and drained by one batcher: everything that
+      arrives within max_wait seconds (up to max_batch requests) is grouped
+      by context, and each group is priced as one MultiBookValuer pass, so
+      contracts shared between requests are priced once per scenario.
+    - Back-pressure: the queue holds at most max_pending requests; beyond
+      that new work is rejected with 503 and Retry-After instead of
+      queueing unbounded latency.
+    - Results are cached per (request, context). Within ttl they are served
+      as is; up to max_stale (or after the surface version changed) the
+      stale result is served immediately and recomputed in the background.
+      At most max_cached results are kept, least-recently-used first out.
+    - A group that fails is retried job by job, so one bad request does
+      not fail the others batched with it.
+
+    Endpoints
+        GET  /health
+        POST /value      {"ticker", "as_of"?, "portfolio"}
+        POST /scenarios  {"ticker", "as_of"?, "portfolio", "scenarios"?}
+    "portfolio" is a registered book name or a list of position records
+    (see instruments.portfolio.load_portfolio); "scenarios" is {name: spec}
+    and defaults to engine.scenarios.SCENARIOS.
+    """
+
+    def __init__(
+        self,
+        pool,
+        portfolios=None,
+        max_batch=64,
+        max_wait=0.005,
+        max_pending=256,
+        ttl=1.0,
+        max_stale=30.0,
+        max_body=8 * 1024 ** 2,
+        max_cached=4096
+    ):
+        self.pool = pool
+        self.portfolios = dict(portfolios or {})
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_body = max_body
+        self.max_cached = max_cached
+
+        self._queue = None
+        self._batcher = None
+        self._server = None
+        self._cache = OrderedDict()     # key -> {"result", "version", "at"}, LRU order
+        self._revalidating = set()
+        self.stats = {"requests": 0, "batches": 0, "batched_jobs": 0, "rejected": 0,
+                      "cache_fresh": 0, "cache_stale": 0, "errors": 0}
+
+    # ---------- LIFECYCLE ---------- #
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """
+        Start serving; returns the asyncio server. port=0 picks a free
+        port (self.port).
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._batcher = asyncio.create_task(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+
+    # ---------- HTTP ---------- #
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    await self._respond(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload, extra = await self._dispatch(method, path, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, extra, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, extra=None, close=False):
+        body = json.dumps(payload).encode()
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'close' if close else 'keep-alive'}",
+        ]
+        head += [f"{k}: {v}" for k, v in (extra or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _dispatch(self, method, path, body):
+        self.stats["requests"] += 1
+        try:
+            if path == "/health":
+                return 200, self.health(), None
+            if path not in ("/value", "/scenarios"):
+                raise ServiceError(404, f"Unknown path: {path}")
+            if method != "POST":
+                raise ServiceError(405, "Use POST")
+            try:
+                request = json.loads(body or b"{}")
+            except json.JSONDecodeError as e:
+                raise ServiceError(400, f"Invalid JSON: {e}")
+            result = await self.submit(path.strip("/"), request)
+            return 200, result, None
+        except ServiceError as e:
+            if e.status == 503:
+                return 503, {"error": str(e)}, {"Retry-After": "1"}
+            return e.status, {"error": str(e)}, None
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, {"error": f"{type(e).__name__}: {e}"}, None
+
+    def health(self):
+        return {
+            "status": "ok",
+            "pending": self._queue.qsize() if self._queue else 0,
+            "contexts": [list(k) for k in self.pool.keys()],
+            "cached_results": len(self._cache),
+            "mean_batch": self.stats["batched_jobs"] / self.stats["batches"] if self.stats["batches"] else 0.0,
+            **self.stats,
+        }
+
+    # ---------- REQUESTS ---------- #
+
+    def _portfolio(self, spec):
+        if isinstance(spec, str):
+            if spec not in self.portfolios:
+                raise ServiceError(404, f"Unknown portfolio: {spec}")
+            return self.portfolios[spec]
+        if isinstance(spec, list):
+            try:
+                return portfolio_from_records(spec)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ServiceError(400, f"Invalid portfolio: {e}")
+        raise ServiceError(400, "portfolio must be a book name or a list of positions")
+
+    async def submit(self, kind, request):
+        """
+        Answer one request from the cache or through the batcher.
+        """
+        if "ticker" not in request:
+            raise ServiceError(400, "ticker is required")
+        context_key = ContextPool.key(request["ticker"], request.get("as_of"))
+        portfolio = self._portfolio(request.get("portfolio"))
+
+        scenarios = None
+        if kind == "scenarios":
+            scenarios = request.get("scenarios")
+            if scenarios is None:
+                from engine.scenarios import SCENARIOS
+                scenarios = SCENARIOS
+            if not isinstance(scenarios, dict):
+                raise ServiceError(400, "scenarios must be {name: spec}")
+
+        key = (
+            kind, context_key, portfolio_fingerprint(portfolio),
+            json.dumps({n: normalize_scenario(s) for n, s in (scenarios or {}).items()}, sort_keys=True)
+        )
+        job = (kind, context_key, portfolio, scenarios)
+
+        # -------------------------
+        # Stale-while-revalidate
+        # -------------------------
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            age = time.monotonic() - entry["at"]
+            current = self.pool.peek(*context_key)
+            moved = current is not None and getattr(current["surface"], "version", 0) != entry["version"]
+            if age < self.ttl and not moved:
+                self.stats["cache_fresh"] += 1
+                return dict(entry["result"], cached="fresh")
+            if age < self.max_stale:
+                self.stats["cache_stale"] += 1
+                self._revalidate(key, job)
+                return dict(entry["result"], cached="stale")
+
+        result = await self._enqueue(*job)
+        self._store(key, result)
+        return dict(result, cached="miss")
+
+    def _store(self, key, result):
+        self._cache[key] = {"result": result, "version": result["surface_version"], "at": time.monotonic()}
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _revalidate(self, key, job):
+        if key in self._revalidating:
+            return
+
+        async def refresh():
+            try:
+                self._store(key, await self._enqueue(*job))
+            except ServiceError:
+                pass            # overloaded: keep serving the stale entry
+            finally:
+                self._revalidating.discard(key)
+
+        self._revalidating.add(key)
+        asyncio.create_task(refresh())
+
+    async def _enqueue(self, kind, context_key, portfolio, scenarios):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(_Job(kind, context_key, portfolio, scenarios, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise ServiceError(503, "Too many pending requests")
+        return await future
+
+    # ---------- MICRO-BATCHING ---------- #
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(jobs) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self.stats["batches"] += 1
+            self.stats["batched_jobs"] += len(jobs)
+
+            groups = {}
+            for job in jobs:
+                groups.setdefault(job.context_key, []).append(job)
+
+            for context_key, group in groups.items():
+                try:
+                    # Context builds and pricing run off the event loop
+                    results = await loop.run_in_executor(None, self._evaluate, context_key, group)
+                except Exception:
+                    results = await loop.run_in_executor(None, self._evaluate_each, context_key, group)
+                for job, result in zip(group, results):
+                    if job.future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        job.future.set_exception(result)
+                    else:
+                        job.future.set_result(result)
+
+    def _evaluate_each(self, context_key, jobs):
+        """
+        Fallback for a failed group: price jobs one by one and return a
+        result or the exception per job. A context that cannot be built
+        fails the whole group.
+        """
+        try:
+            self.pool.get(*context_key)
+        except Exception as e:
+            return [e] * len(jobs)
+
+        results = []
+        for job in jobs:
+            try:
+                results.append(self._evaluate(context_key, [job])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @PROFILER.timed("service_batch")
+    def _evaluate(self, context_key, jobs):
+        """
+        Price a group of jobs on one context in one multi-book pass:
+        base metrics once for all books, then one pass per distinct scenario.
+        """
+        context = self.pool.get(*context_key)
+        surface = context["surface"]
+        version = getattr(surface, "version", 0)
+
+        valuer = MultiBookValuer([job.portfolio for job in jobs], context)
+        base = valuer.exposure @ valuer.contract_metrics()
+
+        # Distinct scenarios across the batch, each priced once
+        stressed = {}
+        for job in jobs:
+            for spec in (job.scenarios or {}).values():
+                token = json.dumps(normalize_scenario(spec), sort_keys=True)
+                if token not in stressed:
+                    spot, surf = build_stressed_market(surface, spec.get("spot_shift", 0.0), spec.get("vol_shocks", []))
+                    dynamics = spec.get("smile_dynamics", "sticky_strike")
+                    stressed[token] = (valuer.exposure @ valuer.contract_metrics(spot, surf, dynamics)[:, 0], spot)
+
+        results = []
+        for b, job in enumerate(jobs):
+            metrics = dict(zip(("value", "delta", "gamma", "vega", "theta"), map(float, base[b])))
+            result = {"ticker": context_key[0], "as_of": context_key[1], "surface_version": version}
+            if job.kind == "value":
+                result.update(metrics)
+            else:
+                result["base_value"] = metrics["value"]
+                result["scenarios"] = {}
+                for name, spec in job.scenarios.items():
+                    values, spot = stressed[json.dumps(normalize_scenario(spec), sort_keys=True)]
+                    result["scenarios"][name] = {
+                        "pnl": float(values[b] - base[b, 0]),
+                        "stressed_value": float(values[b]),
+                        "shocked_spot": float(spot),
+                    }
+            results.append(result)
+        return results
+
+
+# =============================
+# Local client
+# =============================
+
+class ServiceClient:
+    """
+    Minimal keep-alive JSON client for RiskService (one connection).
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+        self._reader = self._writer = None
+
+    async def request(self, method, path, payload=None):
+        """
+        Returns (status, decoded JSON body).
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self._writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await self._writer.drain()
+
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await self._reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            await self.close()
+        return status, json.loads(data) if data else None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+# =============================
+# Entry point
+# =============================
+
+def _pairs(items):
+    return dict(item.split("=", 1) for item in items or [])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local risk service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--snapshot", nargs="*", help="TICKER=snapshot.json; serves snapshots instead of live data")
+    parser.add_argument("--portfolio", nargs="*", help="NAME=portfolio.csv|json books clients can refer to")
+    parser.add_argument("--rate", type=float, default=0.04)
+    parser.add_argument("--max-pending", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    snapshots = {ticker.upper(): path for ticker, path in _pairs(args.snapshot).items()}
+    if snapshots:
+        from market_data.snapshot import load_snapshot
+        pool = ContextPool(builder=lambda ticker, as_of: load_snapshot(snapshots[ticker]))
+    else:
+        pool = ContextPool(rate=args.rate)
+
+    portfolios = {name: load_portfolio(path) for name, path in _pairs(args.portfolio).items()}
+    service = RiskService(pool, portfolios, max_pending=args.max_pending)
+
+    async def serve():
+        server = await service.start(args.host, args.port)
+        print(f"Risk service on http://{args.host}:{service.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
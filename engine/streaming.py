@@ -0,0 +1,339 @@
+import asyncio
+import time
+from collections import deque
+import numpy as np
+from scipy.special import ndtr
+from instruments.portfolio import position_arrays
+
+
+# =============================
+# Tick Sources
+# =============================
+
+def parse_tick(line):
+    """
+    Parse one tick line: 'spot' or 'timestamp,spot'.
+    Returns (timestamp, spot) or None for blank/comment lines.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    fields = line.split(",")
+    if len(fields) == 1:
+        return time.time(), float(fields[0])
+    return float(fields[0]), float(fields[1])
+
+
+class FileTickSource:
+    """
+    Replays spot ticks from a local text file.
+    """
+
+    def __init__(self, path, speed=None):
+        """
+        path : file with one 'spot' or 'timestamp,spot' per line
+        speed : None replays as fast as possible, otherwise replays at
+                speed x the timestamp spacing (1.0 = real time)
+        """
+        self.path = path
+        self.speed = speed
+
+    async def __aiter__(self):
+        prev_ts = None
+        with open(self.path) as f:
+            for line in f:
+                tick = parse_tick(line)
+                if tick is None:
+                    continue
+
+                ts, _ = tick
+                if self.speed and prev_ts is not None and ts > prev_ts:
+                    await asyncio.sleep((ts - prev_ts) / self.speed)
+                else:
+                    await asyncio.sleep(0)
+                prev_ts = ts
+
+                yield tick
+
+
+class SocketTickSource:
+    """
+    Reads newline-delimited spot ticks from a TCP socket.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9009):
+        self.host = host
+        self.port = port
+
+    async def __aiter__(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tick = parse_tick(line.decode())
+                if tick is not None:
+                    yield tick
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+
+async def serve_tick_replay(path, host="127.0.0.1", port=0, speed=None):
+    """
+    Start a local TCP server that replays a tick file to every client.
+    Stands in for a market data feed. Returns the asyncio server;
+    the bound port is server.sockets[0].getsockname()[1].
+    """
+
+    async def handle(reader, writer):
+        try:
+            async for ts, spot in FileTickSource(path, speed=speed):
+                writer.write(f"{ts},{spot}\n".encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+# =============================
+# Incremental Revaluation
+# =============================
+
+class StreamingRevaluer:
+    """
+    Incremental portfolio revaluation on spot ticks.
+
+    - Small moves: portfolio value and delta are rolled forward from the
+      last anchor with a delta/gamma Taylor step, O(1) per tick.
+    - Moves that GreekValidityDiagnostics would flag (spot move, gamma
+      dominance, short expiry) trigger a full repricing at the new spot,
+      which becomes the new anchor. Full repricing is vectorized and reuses
+      cached per-position vols and d1 components; the surface is only read
+      again when it is replaced via `set_surface`. American legs are
+      priced on the pricer's lattice, with delta and gamma from a spot
+      bump on the same lattice call.
+
+    Vols are sticky-strike, as in the rest of the engine.
+    """
+
+    def __init__(
+        self,
+        portfolio,
+        pricer,
+        surface,
+        rate=0.0,
+        spot_threshold=0.03,
+        gamma_threshold=0.5,
+        min_maturity=5 / 252,
+        gamma_floor=1.0,
+        latency_window=10_000
+    ):
+        """
+        spot_threshold : relative move from the anchor that forces a reprice
+        gamma_threshold : max |gamma PnL| / |delta + gamma PnL| for a Taylor step
+        min_maturity : any position closer to expiry disables Taylor steps
+        gamma_floor : gamma PnL below this (currency) never forces a reprice,
+                      so near gamma- and delta-neutral books keep Taylor steps
+        latency_window : number of most recent update latencies kept for summary()
+        """
+        if len(portfolio) == 0:
+            raise ValueError("Portfolio is empty")
+
+        self.portfolio = portfolio
+        self.pricer = pricer
+        self.rate = rate
+        self.spot_threshold = spot_threshold
+        self.gamma_threshold = gamma_threshold
+        self.gamma_floor = gamma_floor
+        self.arrays = position_arrays(portfolio)
+
+        # Positions too close to expiry for a Taylor step
+        self.force_full = bool(np.any(self.arrays.maturity < min_maturity))
+
+        self.stats = {"ticks": 0, "updates": 0, "coalesced": 0, "taylor": 0, "full": 0}
+        self.latencies = deque(maxlen=latency_window)
+
+        self.set_surface(surface)
+
+    # ---------- CACHE ---------- #
+
+    def set_surface(self, surface):
+        """
+        Cache per-position vols and d1 components from a (new) surface and
+        reprice at its spot.
+        """
+        a = self.arrays
+        self.surface = surface
+        self.vols = surface.get_vols(a.strike, a.maturity)
+
+        T = np.maximum(a.maturity, 1e-12)
+        self.sqrt_T = np.sqrt(T)
+        self.vol_sqrt_T = self.vols * self.sqrt_T
+        self.log_strike = np.log(a.strike)
+        self.drift = (self.rate + 0.5 * self.vols ** 2) * T
+        self.disc_strike = a.strike * np.exp(-self.rate * T)
+        self.sign = np.where(a.is_call, 1.0, -1.0)
+
+        self.reprice(surface.spot)
+
+    def reprice(self, spot):
+        """
+        Full vectorized revaluation at spot; resets the Taylor anchor.
+        """
+        a = self.arrays
+        spot = float(spot)
+
+        d1 = (np.log(spot) - self.log_strike + self.drift) / self.vol_sqrt_T
+        d2 = d1 - self.vol_sqrt_T
+        s = self.sign
+
+        prices = np.maximum(s * (spot * ndtr(s * d1) - self.disc_strike * ndtr(s * d2)), 1e-4)
+        pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2.0 * np.pi)
+
+        delta = np.where(a.is_call, ndtr(d1), ndtr(d1) - 1.0)
+        gamma = pdf_d1 / (spot * self.vol_sqrt_T)
+        vega = spot * pdf_d1 * self.sqrt_T
+        theta = -spot * pdf_d1 * self.vols / (2.0 * self.sqrt_T) - s * self.rate * self.disc_strike * ndtr(s * d2)
+
+        am = a.is_american
+        if am.any():
+            prices[am], delta[am], gamma[am] = self._american(spot)
+
+        self.anchor_spot = spot
+        self.anchor = {
+            "value": float(prices @ a.units),
+            "delta": float(delta @ a.units),
+            "gamma": float(gamma @ a.units),
+            "vega": float(vega @ a.units),
+            "theta": float(theta @ a.units),
+        }
+        self.stats["full"] += 1
+        self.state = dict(self.anchor, spot=spot, mode="full")
+        return self.state
+
+    def _american(self, spot, bump=0.01):
+        """
+        Lattice price, delta and gamma of the American legs, from one
+        call at spot * (1 - bump, 1, 1 + bump).
+        """
+        a = self.arrays
+        am = a.is_american
+        g = self.pricer.lattice_greeks(
+            spot, a.strike[am], a.maturity[am], self.vols[am], a.is_call[am], rate=self.rate, bump=bump
+        )
+        return g["price"], g["delta"], g["gamma"]
+
+    # ---------- UPDATE ---------- #
+
+    def _taylor_valid(self, dS, delta_pnl, gamma_pnl):
+        if self.force_full:
+            return False
+        if abs(dS) / self.anchor_spot > self.spot_threshold:
+            return False
+        if abs(gamma_pnl) <= self.gamma_floor:
+            return True
+
+        total = delta_pnl + gamma_pnl
+        gamma_ratio = abs(gamma_pnl) / abs(total) if abs(total) > 1e-6 else 0.0
+        return gamma_ratio <= self.gamma_threshold
+
+    def update(self, spot):
+        """
+        Revalue the book at a new spot. Returns the current state dict:
+        spot, value, delta, gamma, vega, theta and mode ('taylor'/'full').
+        Greeks are in the units of bs_greeks_vec, aggregated over units.
+        """
+        start = time.perf_counter()
+        spot = float(spot)
+        dS = spot - self.anchor_spot
+
+        delta_pnl = self.anchor["delta"] * dS
+        gamma_pnl = 0.5 * self.anchor["gamma"] * dS ** 2
+
+        if self._taylor_valid(dS, delta_pnl, gamma_pnl):
+            self.state = dict(
+                self.anchor,
+                spot=spot,
+                value=self.anchor["value"] + delta_pnl + gamma_pnl,
+                delta=self.anchor["delta"] + self.anchor["gamma"] * dS,
+                mode="taylor"
+            )
+            self.stats["taylor"] += 1
+        else:
+            self.reprice(spot)
+
+        self.stats["updates"] += 1
+        self.latencies.append(time.perf_counter() - start)
+        return self.state
+
+    async def run(self, source, on_update=None, max_ticks=None):
+        """
+        Consume an async tick source. Ticks arriving while an update is in
+        progress are coalesced: only the latest spot is revalued.
+
+        source : async iterable of (timestamp, spot)
+        on_update : optional callback(state); may be a coroutine function
+        max_ticks : stop after this many ticks have been received
+        """
+        latest = {"tick": None, "done": False}
+        ready = asyncio.Event()
+
+        async def produce():
+            try:
+                async for tick in source:
+                    if latest["tick"] is not None:
+                        self.stats["coalesced"] += 1
+                    latest["tick"] = tick
+                    self.stats["ticks"] += 1
+                    ready.set()
+                    if max_ticks is not None and self.stats["ticks"] >= max_ticks:
+                        break
+            finally:
+                latest["done"] = True
+                ready.set()
+
+        producer = asyncio.create_task(produce())
+
+        try:
+            while True:
+                if latest["tick"] is None:
+                    if latest["done"]:
+                        break
+                    await ready.wait()
+                    ready.clear()
+                    continue
+
+                tick, latest["tick"] = latest["tick"], None
+                ts, spot = tick
+                state = dict(self.update(spot), timestamp=ts)
+                if on_update is not None:
+                    result = on_update(state)
+                    if asyncio.iscoroutine(result):
+                        await result
+                # Let the producer run so bursts coalesce
+                await asyncio.sleep(0)
+        finally:
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+        return self.summary()
+
+    def summary(self):
+        """
+        Tick counters and update latency percentiles in microseconds,
+        over the last `latency_window` updates.
+        """
+        lat = np.fromiter(self.latencies, dtype=float, count=len(self.latencies)) * 1e6
+        out = dict(self.stats)
+        if len(lat):
+            out["latency_us_p50"] = float(np.percentile(lat, 50))
+            out["latency_us_p99"] = float(np.percentile(lat, 99))
+            out["latency_us_max"] = float(lat.max())
+        return out
@@ -0,0 +1,392 @@
+#Streaming tail-risk aggregation: mergeable quantile sketches, exact tail buffers, running moments
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from engine.instrumentation import PROFILER
+
+
+# =============================
+# Sketches
+# =============================
+
+class TDigest:
+    """
+    Merging t-digest over float samples (Dunning, k1 scale function).
+
+    Centroids are kept as sorted (mean, weight) arrays. New values are
+    buffered and folded in with one vectorized compression pass, so
+    updates cost O(chunk log chunk) regardless of how many values were
+    seen. Two digests merge by pooling their centroids and compressing,
+    which is associative up to the sketch accuracy (error is smallest in
+    the tails, where VaR lives).
+    """
+
+    def __init__(self, compression=500, buffer_size=None):
+        self.compression = compression
+        self.buffer_size = buffer_size or 20 * compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self._buffer.append(values)
+        self._buffered += len(values)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self._buffered >= self.buffer_size:
+            self._flush()
+        return self
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        values = np.concatenate(self._buffer)
+        self._buffer, self._buffered = [], 0
+        self._compress(
+            np.concatenate([self.means, values]),
+            np.concatenate([self.weights, np.ones(len(values))])
+        )
+
+    def _compress(self, means, weights):
+        order = np.argsort(means)
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        # Cluster index from the k1 scale function at each item's mid-rank;
+        # k is monotone, so clusters are contiguous runs of sorted items
+        q = (np.cumsum(weights) - 0.5 * weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(int)
+
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / w
+        self.weights = w
+
+    def merge(self, other):
+        """
+        Fold another digest into this one (in place) and return self.
+        """
+        self._flush()
+        other._flush()
+        if not len(other.weights):
+            return self
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights])
+        )
+        return self
+
+    def quantile(self, q):
+        """
+        Approximate quantile(s) by interpolating between centroid mid-ranks.
+        """
+        self._flush()
+        q = np.asarray(q, dtype=float)
+        if not len(self.weights):
+            return np.full(q.shape, np.nan)
+
+        total = self.weights.sum()
+        ranks = np.r_[0.0, np.cumsum(self.weights) - 0.5 * self.weights, total]
+        points = np.r_[self.min, self.means, self.max]
+        return np.interp(q * total, ranks, points)
+
+    def tail_mean(self, q, points=512):
+        """
+        Approximate mean of the values below the q-quantile (for expected
+        shortfall), integrating the quantile function over (0, q).
+        """
+        u = (np.arange(points) + 0.5) / points * q
+        return float(np.mean(self.quantile(u)))
+
+    def __len__(self):
+        return len(self.weights) + self._buffered
+
+
+class TailBuffer:
+    """
+    Exact `size` smallest values seen (the loss tail of a PnL stream).
+    Merging keeps the smallest `size` of both buffers, so it is exact and
+    associative. Once full, only values below the current threshold are
+    considered.
+    """
+
+    def __init__(self, size=100_000):
+        self.size = size
+        self.values = np.empty(0)
+        self.threshold = np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[values < self.threshold]          # also drops NaN
+        if not len(values):
+            return self
+        pool = np.concatenate([self.values, values])
+        if len(pool) > self.size:
+            pool = np.partition(pool, self.size - 1)[:self.size]
+            self.threshold = pool.max()
+        self.values = pool
+        return self
+
+    def merge(self, other):
+        return self.update(other.values)
+
+    def smallest(self, k):
+        """
+        The k smallest values, sorted; None if the buffer cannot cover k.
+        """
+        if k > len(self.values):
+            return None
+        return np.sort(np.partition(self.values, k - 1)[:k]) if k else np.empty(0)
+
+
+class RunningMoments:
+    """
+    Count, mean, central moments M2..M4 and extremes, mergeable with the
+    parallel update formulas of Chan et al. / Pebay.
+    """
+
+    def __init__(self):
+        self.n = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def of(cls, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        m = cls()
+        if len(values):
+            m.n, m.mean = float(len(values)), float(values.mean())
+            d = values - m.mean
+            d2 = d * d
+            m.m2, m.m3, m.m4 = float(d2.sum()), float(d2 @ d), float(d2 @ d2)
+            m.min, m.max = float(values.min()), float(values.max())
+        return m
+
+    def update(self, values):
+        return self.merge(RunningMoments.of(values))
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+
+        n_a, n_b = self.n, other.n
+        n = n_a + n_b
+        delta = other.mean - self.mean
+        d_n = delta / n
+
+        m2 = self.m2 + other.m2 + delta * d_n * n_a * n_b
+        m3 = (
+            self.m3 + other.m3
+            + delta * d_n ** 2 * n_a * n_b * (n_a - n_b)
+            + 3 * d_n * (n_a * other.m2 - n_b * self.m2)
+        )
+        m4 = (
+            self.m4 + other.m4
+            + delta * d_n ** 3 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2)
+            + 6 * d_n ** 2 * (n_a ** 2 * other.m2 + n_b ** 2 * self.m2)
+            + 4 * d_n * (n_a * other.m3 - n_b * self.m3)
+        )
+
+        self.n, self.mean = n, self.mean + d_n * n_b
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def summary(self):
+        var = self.m2 / self.n if self.n else np.nan
+        std = np.sqrt(var)
+        return {
+            "count": int(self.n),
+            "mean": self.mean if self.n else np.nan,
+            "std": np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan,
+            "skew": self.m3 / self.n / std ** 3 if self.n and std > 0 else np.nan,
+            "excess_kurtosis": self.m4 / self.n / var ** 2 - 3.0 if self.n and var > 0 else np.nan,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+# =============================
+# Per-series statistics
+# =============================
+
+class TailStats:
+    """
+    Moments + t-digest + exact loss-tail buffer for one PnL series.
+    """
+
+    def __init__(self, compression=500, tail_size=100_000):
+        self.moments = RunningMoments()
+        self.digest = TDigest(compression)
+        self.tail = TailBuffer(tail_size)
+
+    def update(self, pnl):
+        self.moments.update(pnl)
+        self.digest.update(pnl)
+        self.tail.update(pnl)
+        return self
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        self.tail.merge(other.tail)
+        return self
+
+    def var_es(self, level):
+        """
+        (VaR, ES, exact) at confidence `level`, reported as positive losses.
+        Exact from the tail buffer when it holds the whole tail, otherwise
+        from the digest.
+        """
+        n = int(self.moments.n)
+        if n == 0:
+            return np.nan, np.nan, False
+
+        k = max(int(np.ceil((1 - level) * n)), 1)
+        tail = self.tail.smallest(k)
+        if tail is not None:
+            return -float(tail[-1]), -float(tail.mean()), True
+
+        var = float(self.digest.quantile(1 - level))
+        return -var, -self.digest.tail_mean(1 - level), False
+
+
+# =============================
+# Book / hierarchy aggregation
+# =============================
+
+class RiskAggregator:
+    """
+    Streaming VaR / ES and moments per book and per hierarchy node.
+
+    Feed (n_scenarios, n_books) PnL chunks as they are produced; node PnL
+    is the sum of its books' PnL per scenario, formed chunk by chunk
+    before it enters the sketches. Memory is bounded by the sketch and
+    tail sizes, not by the number of scenarios, and aggregators built on
+    different workers merge associatively.
+    """
+
+    def __init__(self, books, hierarchy=None, compression=500, tail_size=100_000):
+        """
+        books : book names, in the column order of the PnL chunks
+        hierarchy : dict book -> path tuple, e.g. ("Firm", "Equity", "Desk A");
+                    every prefix of a path is a node. Default: one "Total" node.
+        """
+        self.books = list(books)
+        hierarchy = hierarchy or {b: ("Total",) for b in self.books}
+
+        nodes = []
+        for b in self.books:
+            path = tuple(hierarchy.get(b, ("Total",)))
+            for depth in range(1, len(path) + 1):
+                node = "/".join(path[:depth])
+                if node not in nodes:
+                    nodes.append(node)
+        self.nodes = nodes
+
+        # (books, nodes) membership: node PnL = book PnL @ membership
+        self.membership = np.zeros((len(self.books), len(nodes)))
+        for i, b in enumerate(self.books):
+            path = tuple(hierarchy.get(b, ("Total",)))
+            for depth in range(1, len(path) + 1):
+                self.membership[i, nodes.index("/".join(path[:depth]))] = 1.0
+
+        self.series = self.books + [n for n in nodes if n not in self.books]
+        self.stats = {s: TailStats(compression, tail_size) for s in self.series}
+
+    @PROFILER.timed("tail_risk_update")
+    def update(self, pnl):
+        """
+        pnl : (n_scenarios, n_books) array, or dict book -> (n_scenarios,) array
+        """
+        if isinstance(pnl, dict):
+            pnl = np.column_stack([pnl[b] for b in self.books])
+        pnl = np.asarray(pnl, dtype=float).reshape(-1, len(self.books))
+
+        for i, b in enumerate(self.books):
+            self.stats[b].update(pnl[:, i])
+        node_pnl = pnl @ self.membership
+        for j, node in enumerate(self.nodes):
+            if node not in self.books:
+                self.stats[node].update(node_pnl[:, j])
+        return self
+
+    def merge(self, other):
+        if other.series != self.series:
+            raise ValueError("Aggregators cover different books / hierarchies")
+        for s in self.series:
+            self.stats[s].merge(other.stats[s])
+        return self
+
+    def report(self, levels=(0.95, 0.99)):
+        """
+        One row per book and node: moments plus VaR / ES per level
+        (positive = loss) and whether each came from the exact tail buffer.
+        """
+        rows = {}
+        for s in self.series:
+            row = self.stats[s].moments.summary()
+            for level in levels:
+                var, es, exact = self.stats[s].var_es(level)
+                tag = f"{level * 100:g}"
+                row[f"VaR {tag}"] = var
+                row[f"ES {tag}"] = es
+                row[f"exact {tag}"] = exact
+            rows[s] = row
+        frame = pd.DataFrame.from_dict(rows, orient="index")
+        frame.index.name = "series"
+        return frame
+
+
+def _aggregate_chunks(producer, chunk_ids, books, hierarchy, compression, tail_size):
+    aggregator = RiskAggregator(books, hierarchy, compression, tail_size)
+    for chunk_id in chunk_ids:
+        aggregator.update(producer(chunk_id))
+    return aggregator
+
+
+def aggregate_pnl(producer, n_chunks, books, hierarchy=None, workers=1, compression=500, tail_size=100_000):
+    """
+    Run producer(chunk_id) -> (n, n_books) PnL for chunk_id in range(n_chunks)
+    and aggregate on the fly. With workers > 1 each process aggregates its
+    own chunks and only the aggregators (not PnL vectors) are shipped back
+    and merged. producer must be picklable for workers > 1.
+    """
+    chunk_ids = list(range(n_chunks))
+    if workers <= 1:
+        return _aggregate_chunks(producer, chunk_ids, books, hierarchy, compression, tail_size)
+
+    shares = [chunk_ids[w::workers] for w in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(
+            _aggregate_chunks,
+            [producer] * workers, shares, [books] * workers, [hierarchy] * workers,
+            [compression] * workers, [tail_size] * workers
+        ))
+
+    result = parts[0]
+    for part in parts[1:]:
+        result.merge(part)
+    return result
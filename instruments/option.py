@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import ClassVar
 
 @dataclass
 class EuropeanOption:
@@ -11,6 +12,16 @@ class EuropeanOption:
     quantity: float      # positive = long, negative = short
     contract_size: float = 100.0
 
+    exercise: ClassVar[str] = "european"
+
     def __post_init__(self):
         if self.option_type not in ("Call", "Put"):
             raise ValueError("option_type must be 'Call' or 'Put'")
+
+
+@dataclass
+class AmericanOption(EuropeanOption):
+    """
+    American option instrument (early exercise), priced on a lattice
+    """
+    exercise: ClassVar[str] = "american"
@@ -1,16 +1,297 @@
+from dataclasses import dataclass, replace
+import json
+import numpy as np
+import pandas as pd
+from instruments.option import AmericanOption, EuropeanOption
+
+
+@dataclass
+class PositionArrays:
+    """
+    Column view of a portfolio for vectorized pricing
+    """
+    strike: np.ndarray
+    maturity: np.ndarray
+    is_call: np.ndarray
+    units: np.ndarray    # quantity * contract_size
+    is_american: np.ndarray
+
+    def __len__(self):
+        return len(self.strike)
+
+
+def position_arrays(portfolio):
+    """
+    Build PositionArrays from an OptionPortfolio or any iterable of options.
+    """
+    positions = list(portfolio)
+    return PositionArrays(
+        strike=np.array([opt.strike for opt in positions], dtype=float),
+        maturity=np.array([opt.maturity for opt in positions], dtype=float),
+        is_call=np.array([opt.option_type == "Call" for opt in positions], dtype=bool),
+        units=np.array([opt.quantity * opt.contract_size for opt in positions], dtype=float),
+        is_american=np.array([opt.exercise == "american" for opt in positions], dtype=bool),
+    )
+
+
 class OptionPortfolio:
     """
     Container for option positions
+
+    Optionally attached to a market context, in which case it maintains
+    running aggregates (value, Greeks, per-scenario PnL) that are updated
+    per position on add/remove/resize. Portfolio PnL is linear in the
+    positions, so each edit only prices the one position it touches.
     """
 
+    GREEKS = ("delta", "gamma", "vega", "theta")
+
     def __init__(self):
         self.positions = []
+        self.aggregates = None
+        self._market = None
+        self._unit_metrics = []
 
     def add(self, option):
         self.positions.append(option)
+        if self._market is not None:
+            unit = self._position_metrics(option)
+            self._unit_metrics.append(unit)
+            self._accumulate(unit, option.quantity)
+
+    def remove(self, index):
+        """
+        Remove and return the position at index.
+        """
+        option = self.positions.pop(index)
+        if self._market is not None:
+            unit = self._unit_metrics.pop(index)
+            self._accumulate(unit, -option.quantity)
+        return option
+
+    def resize(self, index, quantity):
+        """
+        Change the quantity of the position at index.
+        """
+        option = self.positions[index]
+        if self._market is not None:
+            self._accumulate(self._unit_metrics[index], quantity - option.quantity)
+        option.quantity = quantity
+
+    def to_arrays(self):
+        return position_arrays(self.positions)
+
+    # ---------- MAINTAINED AGGREGATES ---------- #
+
+    def attach(self, context, scenarios=None):
+        """
+        Bind to a market context and scenario set and build aggregates.
+
+        context : dict from build_context (surface, pricer, rate)
+        scenarios : dict[name] = scenario spec, e.g. SCENARIOS
+
+        Each scenario's stressed surface is built once here and reused for
+        every later position edit.
+        """
+        from stress.scenario_engine import build_stressed_market
+
+        surface = context["surface"]
+        stressed = {
+            name: (
+                *build_stressed_market(
+                    surface,
+                    spec.get("spot_shift", 0.0),
+                    spec.get("vol_shocks", [])
+                ),
+                spec.get("smile_dynamics", "sticky_strike"),
+            )
+            for name, spec in (scenarios or {}).items()
+        }
+
+        self._market = {
+            "surface": surface,
+            "pricer": context["pricer"],
+            "rate": context["rate"],
+            "scenarios": stressed,
+        }
+        self.rebuild()
+
+    def detach(self):
+        self._market = None
+        self._unit_metrics = []
+        self.aggregates = None
+
+    def rebuild(self):
+        """
+        Recompute aggregates from scratch, e.g. after editing positions
+        in place or to clear accumulated rounding.
+        """
+        if self._market is None:
+            raise ValueError("Portfolio is not attached to a market context")
+
+        self.aggregates = {
+            "value": 0.0,
+            **{greek: 0.0 for greek in self.GREEKS},
+            "scenario_pnl": {name: 0.0 for name in self._market["scenarios"]},
+        }
+        self._unit_metrics = []
+        for option in self.positions:
+            unit = self._position_metrics(option)
+            self._unit_metrics.append(unit)
+            self._accumulate(unit, option.quantity)
+
+    def _position_metrics(self, option):
+        """
+        Value, Greeks and scenario PnL of one unit of quantity.
+        Theta is the one-day decay, as in GreeksEngine.theta.
+        """
+        from models.greeks import bs_greeks_vec
+
+        m = self._market
+        surface = m["surface"]
+        unit_option = replace(option, quantity=1.0)
+
+        value = m["pricer"].price([unit_option], surface.spot, surface)
+        greeks = bs_greeks_vec(
+            surface.spot,
+            option.strike,
+            option.maturity,
+            m["rate"],
+            surface.get_vol(option.strike, option.maturity),
+            option.option_type == "Call"
+        )
+
+        unit = {"value": value}
+        for greek in self.GREEKS:
+            unit[greek] = float(greeks[greek]) * option.contract_size
+        unit["theta"] /= 252
+
+        unit["scenario_pnl"] = {
+            name: m["pricer"].price([unit_option], shocked_spot, stressed_surface, dynamics) - value
+            for name, (shocked_spot, stressed_surface, dynamics) in m["scenarios"].items()
+        }
+        return unit
+
+    def _accumulate(self, unit, quantity):
+        agg = self.aggregates
+        agg["value"] += quantity * unit["value"]
+        for greek in self.GREEKS:
+            agg[greek] += quantity * unit[greek]
+        for name, pnl in unit["scenario_pnl"].items():
+            agg["scenario_pnl"][name] += quantity * pnl
+
+    # ---------- PRE-TRADE WHAT-IF ---------- #
+
+    def what_if(self, trades):
+        """
+        Impact of candidate legs on the attached aggregates, without
+        changing the portfolio.
+
+        Portfolio PnL is additive, so only the candidate legs are priced:
+        base market plus every cached stressed market in one vectorized
+        pass. Cost depends on the number of legs, not on book size.
+
+        trades : option or list of options (quantity = traded amount)
+
+        Returns dict with 'pre_trade', 'marginal' and 'post_trade', each
+        shaped like `aggregates`.
+        """
+        from models.greeks import bs_greeks_vec
+
+        if self._market is None:
+            raise ValueError("Portfolio is not attached to a market context")
+        if isinstance(trades, EuropeanOption):
+            trades = [trades]
+
+        m = self._market
+        surface, rate, pricer = m["surface"], m["rate"], m["pricer"]
+        a = position_arrays(trades)
+
+        # -------------------------
+        # 1. Candidate legs in base + all scenario markets
+        # -------------------------
+        names = list(m["scenarios"])
+        markets = [(surface.spot, surface, "sticky_strike")] + [m["scenarios"][name] for name in names]
+        spots = np.array([spot for spot, _, _ in markets])[:, None]
+        vols = np.vstack([
+            market.get_vols(a.strike, a.maturity, spot, dynamics) for spot, market, dynamics in markets
+        ])
+
+        prices = pricer.price_legs(spots, a.strike, a.maturity, vols, a.is_call, a.is_american, rate)
+        values = prices @ a.units
+
+        greeks = bs_greeks_vec(surface.spot, a.strike, a.maturity, rate, vols[0], a.is_call)
+
+        # -------------------------
+        # 2. Marginal and post-trade aggregates
+        # -------------------------
+        marginal = {"value": float(values[0])}
+        for greek in self.GREEKS:
+            marginal[greek] = float(greeks[greek] @ a.units)
+        marginal["theta"] /= 252
+        marginal["scenario_pnl"] = {
+            name: float(values[k + 1] - values[0]) for k, name in enumerate(names)
+        }
+
+        pre = self.aggregates
+        post = {key: pre[key] + marginal[key] for key in ("value", *self.GREEKS)}
+        post["scenario_pnl"] = {
+            name: pre["scenario_pnl"][name] + marginal["scenario_pnl"][name] for name in names
+        }
+        pre = {**pre, "scenario_pnl": dict(pre["scenario_pnl"])}
+
+        return {"pre_trade": pre, "marginal": marginal, "post_trade": post}
 
     def __iter__(self):
         return iter(self.positions)
 
     def __len__(self):
         return len(self.positions)
+
+
+def load_portfolio(path):
+    """
+    Load an OptionPortfolio from a CSV or JSON file.
+
+    One row / record per position with columns:
+        strike, maturity (years), option_type ('Call'/'Put', any case),
+        quantity, and optionally contract_size and exercise
+        ('european'/'american', default european).
+    JSON may be a list of records or {"positions": [...]}.
+    """
+    if path.endswith(".json"):
+        with open(path) as f:
+            records = json.load(f)
+        if isinstance(records, dict):
+            records = records["positions"]
+    else:
+        records = pd.read_csv(path).to_dict("records")
+    return portfolio_from_records(records)
+
+
+def portfolio_from_records(records):
+    """
+    Build an OptionPortfolio from position records (see `load_portfolio`).
+    """
+    portfolio = OptionPortfolio()
+    for rec in records:
+        exercise = rec.get("exercise")
+        if exercise is None or pd.isna(exercise) or not str(exercise).strip():
+            exercise = "european"
+        exercise = str(exercise).strip().lower()
+        if exercise not in ("european", "american"):
+            raise ValueError(f"Unknown exercise style: {exercise}")
+        cls = AmericanOption if exercise == "american" else EuropeanOption
+
+        kwargs = {}
+        if rec.get("contract_size") is not None and not pd.isna(rec["contract_size"]):
+            kwargs["contract_size"] = float(rec["contract_size"])
+
+        portfolio.add(cls(
+            strike=float(rec["strike"]),
+            maturity=float(rec["maturity"]),
+            option_type=str(rec["option_type"]).capitalize(),
+            quantity=float(rec["quantity"]),
+            **kwargs
+        ))
+    return portfolio
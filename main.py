@@ -6,7 +6,8 @@ from engine.pnl_explain import PnLExplain
 from stress.scenario_engine import ScenarioEngine
 from diagnostics.data_split import split_option_chains
 from diagnostics.greek_diagnostics import GreekValidityDiagnostics
-from plots.plots import plot_scenario_dashboard
+from plots.report import render_reports, report_payload
+from engine.result_store import ResultStore
 import copy
 
 # =============================
@@ -127,6 +128,10 @@ def main():
     # -----------------------------
     print("\n================ STRESS TEST RESULTS ================\n")
 
+    result_store = ResultStore("results")
+    writer = result_store.writer()
+    report_payloads = []
+
     for idx, scenario in enumerate(scenarios, 1):
 
         # --- Apply Scenario ---
@@ -153,6 +158,18 @@ def main():
         )
         diagnostics = validator.run()
 
+        # --- Persist results to the columnar store ---
+        writer.append_result(
+            book=underlying,
+            scenario=scenario["name"],
+            result={
+                "base_value": base_value,
+                "stressed_value": stressed_value,
+                "pnl": pnl,
+                "pnl_breakdown": pnl_breakdown
+            }
+        )
+
         # =============================
         # 8. Reporting Output (Firm-Grade)
         # =============================
@@ -171,16 +188,21 @@ def main():
         print("\nModel Validity Diagnostics:")
         for k, v in diagnostics.items():
             print(f"  {k:<25}: {v}")
-        
-        plot_scenario_dashboard(
-        scenario_name=f"Scenario {idx}",
-        base_spot=surface.spot,
-        shocked_spot=shocked_spot,
-        true_pnl=pnl,
-        pnl_breakdown=pnl_breakdown
-    )
+
+        report_payloads.append(report_payload(
+            f"Scenario {idx} {scenario['name']}",
+            surface.spot,
+            {"shocked_spot": shocked_spot, "pnl": pnl, "pnl_breakdown": pnl_breakdown}
+        ))
 
         print("==================================================\n")
 
+    writer.close()
+    print(f"Results stored in {result_store.root}/ (run {writer.run_id})")
+
+    # --- Dashboards rendered headlessly in a worker pool ---
+    paths = render_reports(report_payloads, out_dir="reports", formats=("png", "html"))
+    print(f"Dashboards written to reports/ ({len(paths)} scenarios)")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+#Save / load market snapshots (spot + vol surface) for offline runs
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+from market_data.vol_surface import ImpliedVolSurface, Smile
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path, spot, surface, rate=0.04, ticker=None, as_of=None):
+    """
+    Write a market snapshot to JSON.
+
+    Slices are stored by maturity in years with their log-moneyness nodes,
+    so a loaded surface is identical to the saved one regardless of the
+    date it is loaded on.
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "ticker": ticker,
+        "as_of": as_of or datetime.now().strftime("%Y-%m-%d"),
+        "spot": float(spot),
+        "rate": float(rate),
+        "surface": {
+            "spot": float(surface.spot),
+            "slices": [
+                {
+                    "maturity": float(T),
+                    "kind": getattr(smile, "kind", "linear"),
+                    "log_moneyness": np.asarray(smile.x, dtype=float).tolist(),
+                    "vols": np.asarray(smile.y, dtype=float).tolist(),
+                }
+                for T, smile in sorted(surface.surface.items())
+            ],
+        },
+    }
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def load_surface(data):
+    surface = ImpliedVolSurface(data["spot"])
+    for s in data["slices"]:
+        surface.surface[s["maturity"]] = Smile(s["log_moneyness"], s["vols"], kind=s["kind"])
+    return surface
+
+
+def load_snapshot(path):
+    """
+    Read a snapshot written by `save_snapshot` into a market context
+    (same keys as `build_context`, with no chain loader).
+    """
+    from engine.pricer import PortfolioPricer
+
+    with open(path) as f:
+        snapshot = json.load(f)
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snapshot.get('version')}")
+
+    rate = snapshot["rate"]
+    return {
+        "spot": snapshot["spot"],
+        "surface": load_surface(snapshot["surface"]),
+        "pricer": PortfolioPricer(rate=rate),
+        "rate": rate,
+        "chain_loader": None,
+        "ticker": snapshot["ticker"],
+        "as_of": snapshot["as_of"],
+    }
+
+
+def snapshot_context(context, path, ticker=None, as_of=None):
+    """
+    Save a live context (e.g. from `build_context`) as a snapshot.
+    """
+    save_snapshot(path, context["spot"], context["surface"], context["rate"], ticker=ticker, as_of=as_of)
+
+
+def snapshot_path(directory, ticker, as_of):
+    """
+    Conventional location of the snapshot for (ticker, as_of) in a directory.
+    """
+    return os.path.join(directory, f"{ticker.upper()}_{as_of}.json")
@@ -1,7 +1,9 @@
+import hashlib
 import numpy as np
 from scipy.interpolate import interp1d
 from datetime import datetime
 import copy
+from engine.instrumentation import PROFILER
 
 class Smile:
     """
@@ -13,6 +15,7 @@ class Smile:
         self.y = np.asarray(y)
         self.kind = kind
 
+        PROFILER.count("interp1d")
         self.fn = interp1d(
             self.x,
             self.y,
@@ -28,11 +31,26 @@ class ImpliedVolSurface:
     """
     Fast, realistic implied volatility surface built from market option chains.
     Interpolates in log-moneyness and maturity.
+
+    Lookups take an optional spot and smile dynamics, so a shocked spot can
+    move the smile without building a new surface:
+
+    - sticky_strike    : vol fixed per strike, moneyness against self.spot
+    - sticky_moneyness : smile moves with spot, moneyness against the shocked spot
+    - sticky_delta     : vol fixed per Black delta. With deltas at the option's
+                         own vol and a flat rate, constant delta means constant
+                         K / S at each maturity, so it is approximated by the
+                         sticky-moneyness lookup
     """
 
+    SMILE_DYNAMICS = ("sticky_strike", "sticky_moneyness", "sticky_delta")
+
     def __init__(self, spot: float):
         self.spot = float(spot)
         self.surface = {}  # maturity -> interpolator
+        self.version = 0
+        self.expiries = {}       # expiry -> maturity of its slice
+        self.quote_digests = {}  # expiry -> hash of the quotes it was built from
 
     @staticmethod
     def _time_to_maturity(expiry: str) -> float:
@@ -40,6 +58,7 @@ class ImpliedVolSurface:
         days = (expiry_dt - datetime.now()).days
         return max(days / 365.0, 0.0)
 
+    @PROFILER.timed("surface_build")
     def build_from_option_chains(self, option_chains: dict):
         """
         option_chains: dict[expiry] = DataFrame (calls OR puts)
@@ -50,49 +69,98 @@ class ImpliedVolSurface:
 
         for expiry, df in option_chains.items():
             maturity = self._time_to_maturity(expiry)
+            self.surface[maturity] = self._smile_from_chain(df)
+            self.expiries[expiry] = maturity
+            self.quote_digests[expiry] = self._chain_digest(df)
 
-            df = df.copy()
-            df = df[df["impliedVolatility"].notna()]
-            df = df[df["impliedVolatility"] > 0]
+    @staticmethod
+    def _clean_chain(df):
+        df = df[df["impliedVolatility"].notna()]
+        return df[df["impliedVolatility"] > 0]
 
-            strikes = df["strike"].astype(float).values
-            vols = df["impliedVolatility"].astype(float).values
+    @classmethod
+    def _chain_digest(cls, df):
+        df = cls._clean_chain(df)
+        h = hashlib.sha1(df["strike"].astype(float).values.tobytes())
+        h.update(df["impliedVolatility"].astype(float).values.tobytes())
+        return h.hexdigest()
 
-            log_moneyness = np.log(strikes / self.spot)
+    def _smile_from_chain(self, df):
+        df = self._clean_chain(df.copy())
 
-            # Sort for stable interpolation
-            order = np.argsort(log_moneyness)
-            log_moneyness = log_moneyness[order]
-            vols = vols[order]
+        strikes = df["strike"].astype(float).values
+        vols = df["impliedVolatility"].astype(float).values
 
-            # Linear interpolation in log-moneyness
+        log_moneyness = np.log(strikes / self.spot)
 
-            """
-            interp = interp1d(
-                log_moneyness,
-                vols,
-                kind="linear",
-                fill_value="extrapolate",
-                bounds_error=False
-            )
-            self.surface[maturity] = interp
-            """
-            self.surface[maturity] = Smile(
-            log_moneyness,
-            vols,
-            kind="linear"
-            )
-            
+        # Sort for stable interpolation
+        order = np.argsort(log_moneyness)
+
+        # Linear interpolation in log-moneyness
+        return Smile(log_moneyness[order], vols[order], kind="linear")
+
+    @PROFILER.timed("surface_refresh")
+    def refreshed(self, option_chains: dict, spot: float = None):
+        """
+        Incremental rebuild from a new chain snapshot.
+
+        Returns (surface, changed_expiries). Only expiries whose quotes (or
+        maturity) changed are rebuilt from the chain; unchanged smiles are
+        reused, re-anchored to the new spot by shifting their log-moneyness
+        nodes. Expiries missing from option_chains are dropped.
+
+        This surface is never modified: the result is a new object with
+        version + 1, so readers holding this one keep a consistent view.
+        If nothing changed, returns (self, []).
+        """
+        new = ImpliedVolSurface(self.spot if spot is None else spot)
+        new.version = self.version + 1
+        shift = np.log(self.spot / new.spot)
+
+        changed = []
+        for expiry, df in option_chains.items():
+            maturity = self._time_to_maturity(expiry)
+            digest = self._chain_digest(df)
+
+            if self.quote_digests.get(expiry) == digest and self.expiries.get(expiry) == maturity:
+                smile = self.surface[maturity]
+                if shift != 0.0:
+                    smile = Smile(smile.x + shift, smile.y, kind=smile.kind)
+            else:
+                smile = new._smile_from_chain(df)
+                changed.append(expiry)
+
+            new.surface[maturity] = smile
+            new.expiries[expiry] = maturity
+            new.quote_digests[expiry] = digest
+
+        if not changed and shift == 0.0 and new.expiries == self.expiries:
+            return self, []
+        return new, changed
 
-    def get_vol(self, strike: float, maturity: float) -> float:
+    def _log_moneyness(self, strikes, spot=None, dynamics="sticky_strike"):
         """
-        Interpolate implied volatility for any strike and maturity
+        Log-moneyness at which the base smiles are read for strikes at a
+        (possibly shocked) spot under the given smile dynamics.
         """
+        if dynamics not in self.SMILE_DYNAMICS:
+            raise ValueError(f"Unknown smile dynamics: {dynamics}")
+        if spot is None or dynamics == "sticky_strike":
+            return np.log(strikes / self.spot)
+        return np.log(strikes / spot)
+
+    @PROFILER.timed("surface_lookup")
+    def get_vol(self, strike: float, maturity: float, spot: float = None, dynamics: str = "sticky_strike") -> float:
+        """
+        Interpolate implied volatility for any strike and maturity.
+        spot / dynamics : shocked spot and smile dynamics (see class docstring)
+        """
+        PROFILER.count("get_vol")
 
         if not self.surface:
             raise ValueError("Vol surface has not been built")
 
-        log_m = np.log(float(strike) / self.spot)
+        log_m = float(self._log_moneyness(float(strike), spot, dynamics))
 
         maturities = np.array(sorted(self.surface.keys()))
 
@@ -116,13 +184,72 @@ class ImpliedVolSurface:
         w = (maturity - t1) / (t2 - t1)
         return float((1 - w) * vol1 + w * vol2)
 
-    
+    def slice_weights(self, maturities):
+        """
+        Bracketing maturity slices used by `get_vol`, vectorized.
+
+        Returns (slice_maturities, lo, hi, w) such that the vol of a
+        position is (1 - w) * smile[lo] + w * smile[hi], where lo/hi index
+        into the sorted slice_maturities. Maturities outside the surface
+        are flat-extrapolated exactly like `get_vol`.
+        """
+        if not self.surface:
+            raise ValueError("Vol surface has not been built")
+
+        slice_maturities = np.array(sorted(self.surface.keys()))
+        T = np.asarray(maturities, dtype=float)
+
+        if len(slice_maturities) == 1:
+            zeros = np.zeros(T.shape, dtype=int)
+            return slice_maturities, zeros, zeros, np.zeros(T.shape)
+
+        idx = np.clip(np.searchsorted(slice_maturities, T), 1, len(slice_maturities) - 1)
+        lo, hi = idx - 1, idx
+        t1, t2 = slice_maturities[lo], slice_maturities[hi]
+        w = np.clip((T - t1) / (t2 - t1), 0.0, 1.0)
+
+        return slice_maturities, lo, hi, w
+
+    @PROFILER.timed("surface_lookup")
+    def get_vols(self, strikes, maturities, spot=None, dynamics="sticky_strike"):
+        """
+        Vectorized `get_vol`: one smile evaluation per maturity slice
+        instead of one per position.
+
+        spot may be an array broadcasting against strikes, e.g. spots[:, None]
+        for a (n_spots, n_positions) grid; moneyness is recomputed per spot
+        in the same pass, so a spot grid costs one lookup under any dynamics.
+        """
+        PROFILER.count("get_vols")
+        if spot is not None and dynamics != "sticky_strike":
+            strikes, maturities, spot = np.broadcast_arrays(
+                np.asarray(strikes, dtype=float), np.asarray(maturities, dtype=float),
+                np.asarray(spot, dtype=float)
+            )
+        else:
+            strikes, maturities = np.broadcast_arrays(
+                np.asarray(strikes, dtype=float), np.asarray(maturities, dtype=float)
+            )
+        log_m = self._log_moneyness(strikes, spot, dynamics)
+        slice_maturities, lo, hi, w = self.slice_weights(maturities)
+
+        vols = np.zeros(log_m.shape)
+        for k, T in enumerate(slice_maturities):
+            weight = np.where(lo == k, 1.0 - w, 0.0) + np.where(hi == k, w, 0.0)
+            needed = weight != 0.0
+            if needed.any():
+                vols[needed] += weight[needed] * self.surface[T](log_m[needed])
+
+        return vols
+
     def bump_parallel(self, bump: float):
         """
         Parallel volatility bump (additive).
         Returns a NEW ImpliedVolSurface.
         """
         bumped = copy.deepcopy(self)
+        PROFILER.count("surface_deepcopy")
+        PROFILER.count("interp1d", len(bumped.surface))
 
         for T, f_interp in bumped.surface.items():
             x = f_interp.x                    # log-moneyness grid
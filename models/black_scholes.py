@@ -1,5 +1,7 @@
 import numpy as np
 from scipy.stats import norm
+from scipy.special import ndtr
+from engine.instrumentation import PROFILER
 
 
 def bs_price(spot: float, strike: float, maturity: float, rate: float, vol: float, option_type: str) -> float:
@@ -21,6 +23,7 @@ def bs_price(spot: float, strike: float, maturity: float, rate: float, vol: floa
     option_type : str
         'call' or 'put'
     """
+    PROFILER.count("bs_price")
 
     if maturity <= 0:
         if option_type == "call":
@@ -30,6 +33,9 @@ def bs_price(spot: float, strike: float, maturity: float, rate: float, vol: floa
         else:
             raise ValueError("option_type must be 'call' or 'put'")
 
+    # Stressed surfaces can go below zero; floor like the vectorized engines
+    vol = max(vol, 1e-4)
+
     d1 = (np.log(spot / strike)+ (rate + 0.5 * vol ** 2) * maturity) / (vol * np.sqrt(maturity))
     d2 = d1 - vol * np.sqrt(maturity)
 
@@ -43,4 +49,45 @@ def bs_price(spot: float, strike: float, maturity: float, rate: float, vol: floa
     return max(price, 1e-4)
 
 
+def bs_price_vec(spot, strike, maturity, rate, vol, is_call):
+    """
+    Vectorized Black-Scholes price for European options.
+
+    All array arguments broadcast against each other, so a (n_scenarios, 1)
+    spot column priced against (n_positions,) strikes returns a
+    (n_scenarios, n_positions) price matrix in one pass.
+
+    Parameters
+    ----------
+    spot, strike, maturity, vol : array_like
+        Same meaning as in `bs_price`
+    rate : float
+        Risk-free interest rate
+    is_call : array_like of bool
+        True for calls, False for puts
+
+    Follows `bs_price`: expired options return intrinsic value, vols and
+    live prices are floored at 1e-4.
+    """
+    spot = np.asarray(spot, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    maturity = np.asarray(maturity, dtype=float)
+    vol = np.maximum(np.asarray(vol, dtype=float), 1e-4)
+    is_call = np.asarray(is_call, dtype=bool)
+    PROFILER.count("bs_price_vec")
+
+    live = maturity > 0
+    T = np.where(live, maturity, 1.0)
+    sqrt_T = np.sqrt(T)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * vol ** 2) * T) / (vol * sqrt_T)
+    d2 = d1 - vol * sqrt_T
+    disc_strike = strike * np.exp(-rate * T)
+
+    call = spot * ndtr(d1) - disc_strike * ndtr(d2)
+    put = disc_strike * ndtr(-d2) - spot * ndtr(-d1)
+    price = np.maximum(np.where(is_call, call, put), 1e-4)
 
+    intrinsic = np.where(is_call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    return np.where(live, price, intrinsic)
@@ -1,6 +1,172 @@
 import copy
+from dataclasses import dataclass
 import numpy as np
+import pandas as pd
+from scipy.interpolate import interp1d
+from scipy.special import ndtr
 from engine.pricer import PortfolioPricer
+from instruments.portfolio import position_arrays
+from models.black_scholes import bs_price_vec
+from engine.instrumentation import PROFILER
+
+
+def bs_greeks_vec(spot, strike, maturity, rate, vol, is_call):
+    """
+    Analytic Black-Scholes Greeks per unit option, vectorized.
+
+    Arguments broadcast like `bs_price_vec`. Returns a dict of arrays:
+    - delta : dV/dS
+    - gamma : d2V/dS2
+    - vega  : dV/dvol per 1.00 of vol (same unit as GreeksEngine.vega)
+    - theta : dV/dt per year of calendar decay (negative for long options)
+    - vanna : d2V/dS dvol
+    - volga : d2V/dvol2
+    - charm : dDelta/dt per year of calendar decay
+
+    Expired options carry their intrinsic delta and zero for everything else.
+    """
+    spot = np.asarray(spot, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    maturity = np.asarray(maturity, dtype=float)
+    vol = np.asarray(vol, dtype=float)
+    is_call = np.asarray(is_call, dtype=bool)
+
+    live = maturity > 0
+    T = np.where(live, maturity, 1.0)
+    sqrt_T = np.sqrt(T)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * vol ** 2) * T) / (vol * sqrt_T)
+    d2 = d1 - vol * sqrt_T
+    pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2.0 * np.pi)
+    disc_strike = strike * np.exp(-rate * T)
+
+    delta = np.where(is_call, ndtr(d1), ndtr(d1) - 1.0)
+    gamma = pdf_d1 / (spot * vol * sqrt_T)
+    vega = spot * pdf_d1 * sqrt_T
+    theta = -spot * pdf_d1 * vol / (2.0 * sqrt_T) + np.where(
+        is_call,
+        -rate * disc_strike * ndtr(d2),
+        rate * disc_strike * ndtr(-d2),
+    )
+
+    vanna = -pdf_d1 * d2 / vol
+    volga = vega * d1 * d2 / vol
+    # Same for calls and puts without dividends
+    charm = -pdf_d1 * (2.0 * rate * T - d2 * vol * sqrt_T) / (2.0 * T * vol * sqrt_T)
+
+    itm = np.where(is_call, spot > strike, spot < strike)
+    expired_delta = np.where(is_call, 1.0, -1.0) * itm
+
+    return {
+        "delta": np.where(live, delta, expired_delta),
+        "gamma": np.where(live, gamma, 0.0),
+        "vega": np.where(live, vega, 0.0),
+        "theta": np.where(live, theta, 0.0),
+        "vanna": np.where(live, vanna, 0.0),
+        "volga": np.where(live, volga, 0.0),
+        "charm": np.where(live, charm, 0.0),
+    }
+
+
+DEFAULT_HORIZONS = {"Today": 0, "+1d": 1, "+1w": 5, "+1m": 21}   # trading days
+LADDER_GREEKS = ("value", "delta", "gamma", "vega", "theta")
+
+
+@dataclass
+class RiskLadder:
+    """
+    Portfolio value and Greeks on a spot x horizon grid.
+
+    values[i, j, g] is greek g (see `greeks`) at spot_levels[i] after
+    horizons[j] of time decay. Units follow GreeksEngine: vega per 1.00
+    of vol, theta as one-day PnL.
+    """
+    spot_shifts: np.ndarray
+    spot_levels: np.ndarray
+    horizons: list
+    horizon_years: np.ndarray
+    greeks: tuple
+    values: np.ndarray
+
+    def greek(self, name):
+        """
+        One Greek as a DataFrame (rows = spot level, columns = horizon).
+        """
+        return pd.DataFrame(
+            self.values[:, :, self.greeks.index(name)],
+            index=pd.Index(self.spot_levels, name="spot"),
+            columns=self.horizons
+        )
+
+    def frame(self):
+        """
+        Long format: one row per (spot level, horizon), one column per Greek.
+        """
+        index = pd.MultiIndex.from_product([self.spot_levels, self.horizons], names=["spot", "horizon"])
+        return pd.DataFrame(self.values.reshape(-1, len(self.greeks)), index=index, columns=list(self.greeks))
+
+
+@PROFILER.timed("risk_ladder")
+def risk_ladder(portfolio, surface, rate, spot_shifts=None, horizons=None, pricer=None):
+    """
+    Value and analytic Greeks over (spot shift x horizon) in one
+    broadcast evaluation of (spots, horizons, positions) arrays.
+
+    spot_shifts : relative spot moves, default -10%..+10% in 1% steps
+    horizons : dict label -> trading days of decay, default today/+1d/+1w/+1m
+    pricer : PortfolioPricer whose lattice settings value American legs
+             (default: PortfolioPricer(rate))
+
+    Maturities roll down and are floored at 1e-6 with sticky-strike vols,
+    exactly like `price_with_rolled_maturity`. American legs are valued
+    on the lattice, with Greeks from bumps of the same lattice
+    (`PortfolioPricer.lattice_greeks`), so value and delta agree.
+    """
+    pricer = PortfolioPricer(rate) if pricer is None else pricer
+    if spot_shifts is None:
+        spot_shifts = np.linspace(-0.10, 0.10, 21)
+    horizons = dict(DEFAULT_HORIZONS if horizons is None else horizons)
+
+    a = position_arrays(portfolio)
+    spot_shifts = np.asarray(spot_shifts, dtype=float)
+    spot_levels = surface.spot * (1 + spot_shifts)
+    horizon_years = np.array(list(horizons.values()), dtype=float) / 252
+
+    # (horizon, position) rolled maturities and vols: one surface lookup
+    T = np.maximum(a.maturity[None, :] - horizon_years[:, None], 1e-6)
+    vols = surface.get_vols(np.broadcast_to(a.strike, T.shape), T)
+
+    # (spot, horizon, position) grid
+    S = spot_levels[:, None, None]
+    prices = bs_price_vec(S, a.strike, T, rate, vols, a.is_call)
+    g = bs_greeks_vec(S, a.strike, T, rate, vols, a.is_call)
+    if a.is_american.any():
+        am = a.is_american
+        lattice = pricer.lattice_greeks(
+            S, a.strike[am], T[:, am], vols[:, am], a.is_call[am], rate=rate, vol_bump=0.01, dt=1 / 252
+        )
+        prices[..., am] = lattice["price"]
+        for greek in ("delta", "gamma", "vega", "theta"):
+            g[greek][..., am] = lattice[greek]
+
+    values = np.stack([
+        prices @ a.units,
+        g["delta"] @ a.units,
+        g["gamma"] @ a.units,
+        g["vega"] @ a.units,
+        (g["theta"] / 252) @ a.units,
+    ], axis=-1)
+
+    return RiskLadder(
+        spot_shifts=spot_shifts,
+        spot_levels=spot_levels,
+        horizons=list(horizons),
+        horizon_years=horizon_years,
+        greeks=LADDER_GREEKS,
+        values=values
+    )
+
 
 class GreeksEngine:
     """
@@ -64,6 +230,108 @@ class GreeksEngine:
         vega = (v_up - self.base_value) / vol_bump
         return vega
 
+    def bucketed_vega(self, expiry_edges=None, moneyness_edges=None, vol_bump=0.01):
+        """
+        Vega per (expiry bucket x moneyness bucket).
+
+        Each bucket bumps the smile nodes of the surface slices whose
+        maturity falls in the expiry bucket and whose strike/spot falls in
+        the moneyness bucket. A position's vol only depends on the two
+        slices bracketing it in `get_vol`, and re-interpolation is linear in
+        the node vols, so its vol change is the interpolated bump indicator
+        on those two slices. Only (bucket, position) pairs with a non-zero
+        vol change are repriced, all in one vectorized pass.
+
+        expiry_edges : maturity bucket edges in years
+        moneyness_edges : strike/spot bucket edges
+        vol_bump : absolute vol bump, 0.01 = +1 vol point
+
+        Returns
+        -------
+        DataFrame : rows = expiry buckets, columns = moneyness buckets,
+                    vega per 1.00 of vol (same unit as `vega`)
+        """
+        if expiry_edges is None:
+            expiry_edges = [0.0, 1 / 12, 2 / 12, 3 / 12, 6 / 12, 1.0, np.inf]
+        if moneyness_edges is None:
+            moneyness_edges = [0.0, 0.90, 0.95, 0.98, 1.02, 1.05, 1.10, np.inf]
+
+        expiry_edges = np.asarray(expiry_edges, dtype=float)
+        log_edges = np.log(np.maximum(np.asarray(moneyness_edges, dtype=float), 1e-300))
+        n_exp, n_mny = len(expiry_edges) - 1, len(log_edges) - 1
+
+        a = position_arrays(self.portfolio)
+        log_m = np.log(a.strike / self.base_spot)
+        slice_maturities, lo, hi, w = self.surface.slice_weights(a.maturity)
+        slice_bucket = np.searchsorted(expiry_edges, slice_maturities, side="right") - 1
+
+        # -------------------------
+        # 1. Sparse (bucket, position, dvol) triplets, slice by slice
+        # -------------------------
+        bucket_ids, pos_ids, dvols = [], [], []
+
+        for k, T in enumerate(slice_maturities):
+            e = slice_bucket[k]
+            if e < 0 or e >= n_exp:
+                continue
+
+            weight = np.where(lo == k, 1.0 - w, 0.0) + np.where(hi == k, w, 0.0)
+            positions = np.flatnonzero(weight != 0.0)
+            if len(positions) == 0:
+                continue
+
+            smile = self.surface.surface[T]
+            x = smile.x
+            node_bucket = np.searchsorted(log_edges, x, side="right") - 1
+            indicators = (node_bucket[:, None] == np.arange(n_mny)[None, :]).astype(float)
+
+            kind = getattr(smile, "kind", None) or getattr(smile, "_kind", "linear")
+            phi = interp1d(x, indicators, kind=kind, axis=0, fill_value="extrapolate")(log_m[positions])
+            dvol = weight[positions, None] * phi
+
+            pos_grid, mny_grid = np.nonzero(np.abs(dvol) > 1e-12)
+            bucket_ids.append(e * n_mny + mny_grid)
+            pos_ids.append(positions[pos_grid])
+            dvols.append(dvol[pos_grid, mny_grid])
+
+        vega = np.zeros(n_exp * n_mny)
+
+        if bucket_ids:
+            bucket_ids = np.concatenate(bucket_ids)
+            pos_ids = np.concatenate(pos_ids)
+            dvols = np.concatenate(dvols)
+
+            # Merge contributions of the two bracketing slices of the same bucket
+            key = bucket_ids * len(a) + pos_ids
+            key, inverse = np.unique(key, return_inverse=True)
+            dvols = np.bincount(inverse, weights=dvols)
+            bucket_ids, pos_ids = key // len(a), key % len(a)
+
+            # -------------------------
+            # 2. Reprice affected positions only, one vectorized pass
+            # -------------------------
+            vols = self.surface.get_vols(a.strike, a.maturity)
+            base = self._prices(a, np.arange(len(a)), vols)
+            bumped = self._prices(a, pos_ids, np.maximum(vols[pos_ids] + vol_bump * dvols, 1e-4))
+            dV = a.units[pos_ids] * (bumped - base[pos_ids])
+            vega = np.bincount(bucket_ids, weights=dV, minlength=n_exp * n_mny) / vol_bump
+
+        return pd.DataFrame(
+            vega.reshape(n_exp, n_mny),
+            index=_bucket_labels(expiry_edges, lambda t: f"{t * 12:g}M"),
+            columns=_bucket_labels(moneyness_edges, lambda m: f"{m:.0%}")
+        )
+
+    def _prices(self, a, positions, vols):
+        """
+        Base-spot prices of the given positions, American legs on the
+        pricer's lattice so buckets add up to `vega`.
+        """
+        return self.pricer.price_legs(
+            self.base_spot, a.strike[positions], a.maturity[positions], vols,
+            a.is_call[positions], a.is_american[positions], self.r
+        )
+
     # ---------- TIME GREEK ---------- #
 
     def theta(self, dt=1/252):
@@ -84,8 +352,17 @@ class GreeksEngine:
         return theta
 
 
+    # ---------- LADDER ---------- #
+
+    def risk_ladder(self, spot_shifts=None, horizons=None):
+        """
+        Spot x horizon grid of value and Greeks (see `risk_ladder`).
+        """
+        return risk_ladder(self.portfolio, self.surface, self.r, spot_shifts, horizons, self.pricer)
+
     # ---------- SUMMARY ---------- #
 
+    @PROFILER.timed("greeks")
     def compute_all(self):
         """
         Compute main Greeks in one call.
@@ -96,3 +373,15 @@ class GreeksEngine:
             "vega": self.vega(),
             "theta": self.theta()
         }
+
+
+def _bucket_labels(edges, fmt):
+    labels = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if np.isinf(hi):
+            labels.append(f">{fmt(lo)}")
+        elif lo <= 0:
+            labels.append(f"<{fmt(hi)}")
+        else:
+            labels.append(f"{fmt(lo)}-{fmt(hi)}")
+    return labels
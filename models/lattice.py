@@ -0,0 +1,117 @@
+import numpy as np
+from models.black_scholes import bs_price_vec
+from engine.instrumentation import PROFILER
+
+
+def _crr_batch(spot, strike, maturity, rate, vol, is_call, steps, american):
+    """
+    Backward induction on a CRR tree for a batch of options (one row each).
+    Returns (lattice price, European price on the same tree).
+    """
+    dt = maturity / steps
+    sigma_sqrt_dt = vol * np.sqrt(dt)
+    u = np.exp(sigma_sqrt_dt)
+    d = 1.0 / u
+    disc = np.exp(-rate * dt)
+    p = np.clip((np.exp(rate * dt) - d) / (u - d), 0.0, 1.0)
+
+    # Nodes along axis 0, batch along axis 1: each step slices contiguous rows
+    sign = np.where(is_call, 1.0, -1.0)
+    p_up = disc * p
+    p_dn = disc * (1 - p)
+
+    # Node j at step i has j up moves: S * u^(2j - i)
+    j = np.arange(steps + 1)[:, None]
+    node_spot = spot * np.exp(sigma_sqrt_dt * (2 * j - steps))
+
+    european = np.maximum(sign * (node_spot - strike), 0.0)
+    lattice = european.copy()
+
+    # Roll back in place: rows [0, i] hold step i after each iteration
+    up = np.empty_like(lattice)
+    exercise = np.empty_like(lattice)
+
+    for i in range(steps - 1, -1, -1):
+        for tree in (european, lattice):
+            np.multiply(tree[1:i + 2], p_up, out=up[:i + 1])
+            tree[:i + 1] *= p_dn
+            tree[:i + 1] += up[:i + 1]
+
+        if american:
+            # S u^(2j - i) = S u^(2j - (i + 1)) * u
+            node_spot[:i + 1] *= u
+            np.subtract(node_spot[:i + 1], strike, out=exercise[:i + 1])
+            exercise[:i + 1] *= sign
+            np.maximum(lattice[:i + 1], exercise[:i + 1], out=lattice[:i + 1])
+
+    return lattice[0], european[0]
+
+
+def american_price_vec(
+    spot,
+    strike,
+    maturity,
+    rate,
+    vol,
+    is_call,
+    steps=200,
+    correction="control_variate",
+    chunk_size=512
+):
+    """
+    Vectorized Cox-Ross-Rubinstein price for American options.
+
+    Arguments broadcast like `bs_price_vec`; every element is one row of a
+    batched tree, so a whole book (or a spot grid x book) is priced by a
+    single backward induction of `steps` array operations.
+
+    Parameters
+    ----------
+    steps : int
+        Tree steps
+    correction : str or None
+        'control_variate' : lattice + (Black-Scholes - European lattice)
+        'richardson' : 2 * P(steps) - P(steps / 2)
+        None : raw lattice price
+    chunk_size : int
+        Rows per batch; small chunks keep the tree in cache
+
+    Calls carry no early-exercise premium without dividends and are priced
+    with Black-Scholes directly. Vols and prices are floored at 1e-4 like
+    `bs_price`.
+    """
+    if correction not in ("control_variate", "richardson", None):
+        raise ValueError("correction must be 'control_variate', 'richardson' or None")
+
+    spot, strike, maturity, vol, is_call = np.broadcast_arrays(
+        np.asarray(spot, dtype=float),
+        np.asarray(strike, dtype=float),
+        np.asarray(maturity, dtype=float),
+        np.maximum(np.asarray(vol, dtype=float), 1e-4),
+        np.asarray(is_call, dtype=bool)
+    )
+    shape = spot.shape
+    spot, strike, maturity, vol, is_call = (x.ravel() for x in (spot, strike, maturity, vol, is_call))
+    PROFILER.count("american_price_vec")
+
+    prices = bs_price_vec(spot, strike, maturity, rate, vol, is_call)
+    rows = np.flatnonzero(~is_call & (maturity > 0))
+
+    for start in range(0, len(rows), chunk_size):
+        idx = rows[start:start + chunk_size]
+        args = (spot[idx], strike[idx], maturity[idx], rate, vol[idx], is_call[idx])
+
+        lattice, european = _crr_batch(*args, steps=steps, american=True)
+
+        if correction == "control_variate":
+            price = lattice + (prices[idx] - european)
+        elif correction == "richardson":
+            coarse, _ = _crr_batch(*args, steps=max(steps // 2, 1), american=True)
+            price = 2.0 * lattice - coarse
+        else:
+            price = lattice
+
+        intrinsic = np.maximum(strike[idx] - spot[idx], 0.0)
+        prices[idx] = np.maximum(np.maximum(price, intrinsic), 1e-4)
+
+    return prices.reshape(shape)
@@ -0,0 +1,294 @@
+#Chebyshev pricing proxies over spot x vol-shift boxes, aggregated to one portfolio polynomial
+
+from itertools import product
+from math import factorial
+import numpy as np
+import pandas as pd
+from numpy.polynomial import chebyshev as cheb
+from models.black_scholes import bs_price_vec
+from models.greeks import bs_greeks_vec
+from engine.instrumentation import PROFILER
+
+
+def _cheb_nodes(n):
+    """
+    Chebyshev points of the first kind on [-1, 1], ascending.
+    """
+    return np.cos(np.pi * (np.arange(n) + 0.5) / n)[::-1]
+
+
+def _cheb_to_power(degree):
+    """
+    (degree+1, degree+1) matrix M with power coefficients = cheb coefficients @ M.
+    """
+    return np.array([np.pad(cheb.cheb2poly(np.eye(degree + 1)[j]), (0, degree - j)) for j in range(degree + 1)])
+
+
+class PortfolioProxy:
+    """
+    Polynomial proxy of a netted portfolio's value over a box of
+    (spot_shift, vol factor shocks).
+
+    Each contract's vol is affine in the factor shocks,
+        vol_i = base_i + sum_f shock_f * L_f,i      (floored at 1e-4),
+    so each contract is fitted once as a 2-D Chebyshev tensor in
+    (spot shift, its own vol change) over the range the box can reach.
+    Re-expanding every fit in the factor shocks and summing with the
+    units gives ONE polynomial in (spot, factors) for the whole portfolio,
+    so a sweep point costs the same no matter how many positions there are.
+
+    Contracts whose fit error exceeds `tolerance` (short-dated, near the
+    1e-4 vol floor, ...) are priced exactly on every call, and scenarios
+    outside the box fall back to exact pricing of all contracts.
+    """
+
+    VOL_FLOOR = 1e-4
+
+    def __init__(
+        self,
+        strike,
+        maturity,
+        is_call,
+        units,
+        base_vols,
+        spot,
+        rate,
+        bounds,
+        vol_loadings=None,
+        degree=(32, 8),
+        tolerance=0.01
+    ):
+        """
+        strike, maturity, is_call, units, base_vols : per-contract arrays
+        spot : base spot; rate : risk-free rate
+        bounds : dict with "spot_shift" and one (low, high) per vol factor
+        vol_loadings : dict factor -> per-contract loading (default parallel = 1)
+        degree : (spot degree, vol degree) of each contract's tensor
+        tolerance : max per-unit price error for a contract to be proxied
+        """
+        self.strike = np.asarray(strike, dtype=float)
+        self.maturity = np.asarray(maturity, dtype=float)
+        self.is_call = np.asarray(is_call, dtype=bool)
+        self.units = np.asarray(units, dtype=float)
+        self.base_vols = np.asarray(base_vols, dtype=float)
+        self.spot = float(spot)
+        self.rate = rate
+        self.degree = degree
+        self.tolerance = tolerance
+
+        n = len(self.strike)
+        vol_loadings = vol_loadings or {"parallel": np.ones(n)}
+        self.factors = ["spot_shift"] + list(vol_loadings)
+        self.loadings = np.array([np.broadcast_to(vol_loadings[f], (n,)) for f in self.factors[1:]], dtype=float)
+        self.bounds = np.array([bounds[f] for f in self.factors], dtype=float)
+        self.base_value = float(self._exact(np.zeros((1, len(self.factors))))[0] @ self.units)
+
+        self._fit()
+        self._aggregate()
+
+    @classmethod
+    def from_portfolio(cls, portfolio, surface, rate, spot_range=(-0.2, 0.2), vol_range=(-0.1, 0.2), **kwargs):
+        """
+        Proxy for (spot_shift, parallel vol) sweeps on the base surface,
+        contracts netted across positions. American legs are not proxied
+        (priced as European, like the reverse-stress search).
+        """
+        from engine.multi_book import _unique_rows
+        from instruments.portfolio import position_arrays
+
+        a = position_arrays(portfolio)
+        first, inverse = _unique_rows(a.strike, a.maturity, a.is_call)
+        units = np.bincount(inverse, weights=a.units, minlength=len(first))
+        return cls(
+            a.strike[first], a.maturity[first], a.is_call[first], units,
+            surface.get_vols(a.strike[first], a.maturity[first]), surface.spot, rate,
+            bounds={"spot_shift": spot_range, "parallel": vol_range}, **kwargs
+        )
+
+    # ---------- EXACT PRICING ---------- #
+
+    def _vols(self, shocks, contracts=slice(None)):
+        vols = self.base_vols[contracts] + shocks[:, 1:] @ self.loadings[:, contracts]
+        return np.maximum(vols, self.VOL_FLOOR)
+
+    def _exact(self, shocks, contracts=slice(None)):
+        """
+        (n, contracts) exact per-unit prices for (n, factors) shocks.
+        """
+        spot = self.spot * (1 + shocks[:, :1])
+        return bs_price_vec(
+            spot, self.strike[contracts], self.maturity[contracts], self.rate,
+            self._vols(shocks, contracts), self.is_call[contracts]
+        )
+
+    # ---------- FIT ---------- #
+
+    @PROFILER.timed("proxy_fit")
+    def _fit(self):
+        ds, dv = self.degree
+        (s_lo, s_hi), factor_bounds = self.bounds[0], self.bounds[1:]
+
+        # Reachable vol change of each contract over the factor box
+        lo = np.minimum(factor_bounds[:, :1] * self.loadings, factor_bounds[:, 1:] * self.loadings).sum(axis=0)
+        hi = np.maximum(factor_bounds[:, :1] * self.loadings, factor_bounds[:, 1:] * self.loadings).sum(axis=0)
+        self.vol_center = 0.5 * (hi + lo)
+        self.vol_half = np.maximum(0.5 * (hi - lo), 1e-12)
+        self.spot_center, self.spot_half = 0.5 * (s_hi + s_lo), max(0.5 * (s_hi - s_lo), 1e-12)
+
+        def prices(x, y):
+            # (len(x), len(y), contracts) prices at scaled spot x / vol y nodes
+            spot = self.spot * (1 + self.spot_center + self.spot_half * x)[:, None, None]
+            vols = self.base_vols + self.vol_center + self.vol_half * y[:, None]
+            return bs_price_vec(spot, self.strike, self.maturity, self.rate,
+                                np.maximum(vols, self.VOL_FLOOR)[None], self.is_call)
+
+        # -------------------------
+        # 1. Interpolate at Chebyshev nodes: coef[i] = Vs^-1 Y_i Vv^-T
+        # -------------------------
+        xs, ys = _cheb_nodes(ds + 1), _cheb_nodes(dv + 1)
+        Y = prices(xs, ys)
+        inv_s = np.linalg.inv(cheb.chebvander(xs, ds))
+        inv_v = np.linalg.inv(cheb.chebvander(ys, dv))
+        self.coef = np.einsum("ka,abi,jb->ikj", inv_s, Y, inv_v, optimize=True)   # (contracts, ds+1, dv+1)
+
+        # -------------------------
+        # 2. Fit error off the nodes (evenly spaced, edges included)
+        # -------------------------
+        xc = np.linspace(-1, 1, ds + 2)
+        yc = np.linspace(-1, 1, dv + 2)
+        fitted = np.einsum(
+            "ak,ikj,bj->abi", cheb.chebvander(xc, ds), self.coef, cheb.chebvander(yc, dv), optimize=True
+        )
+        self.fit_error = np.abs(fitted - prices(xc, yc)).max(axis=(0, 1))
+        self.proxied = (self.fit_error <= self.tolerance) & (self.maturity > 0)
+        self.exact_contracts = np.flatnonzero(~self.proxied)
+
+    def _aggregate(self):
+        """
+        Sum the proxied contracts into one polynomial:
+        value = sum_{k, e} G[k, e] T_k(x) prod_f shock_f ** e_f.
+        """
+        ds, dv = self.degree
+        n_f = len(self.factors) - 1
+        self.exponents = np.array(
+            [e for e in product(range(dv + 1), repeat=n_f) if sum(e) <= dv], dtype=int
+        ).reshape(-1, n_f)
+        column = {tuple(e): m for m, e in enumerate(self.exponents)}
+
+        # y_i = a_i + sum_f b_fi * shock_f, coefficients in powers of y
+        w = self.units * self.proxied
+        a = -self.vol_center / self.vol_half
+        b = self.loadings / self.vol_half
+        power = self.coef @ _cheb_to_power(dv)                        # (contracts, ds+1, dv+1)
+
+        self.G = np.zeros((ds + 1, len(self.exponents)))
+        for j in range(dv + 1):
+            for e in self.exponents[self.exponents.sum(axis=1) <= j]:
+                rest = j - e.sum()
+                multinomial = factorial(j) / (factorial(rest) * np.prod([factorial(x) for x in e]))
+                weight = w * multinomial * a ** rest * np.prod(b ** e[:, None], axis=0)
+                self.G[:, column[tuple(e)]] += power[:, :, j].T @ weight
+
+    # ---------- EVALUATION ---------- #
+
+    def _as_shocks(self, shocks):
+        shocks = np.asarray(shocks, dtype=float)
+        return shocks.reshape(-1, len(self.factors))
+
+    def in_domain(self, shocks):
+        shocks = self._as_shocks(shocks)
+        return np.all((shocks >= self.bounds[:, 0]) & (shocks <= self.bounds[:, 1]), axis=1)
+
+    @PROFILER.timed("proxy_eval")
+    def values(self, shocks, with_gradient=False):
+        """
+        Portfolio value for (n, factors) shocks, columns ordered as
+        self.factors. Optionally also d value / d shock (n, factors).
+        """
+        shocks = self._as_shocks(shocks)
+        inside = self.in_domain(shocks)
+        value = np.zeros(len(shocks))
+        grad = np.zeros(shocks.shape)
+
+        # -------------------------
+        # 1. Polynomial part (inside the box, proxied contracts)
+        # -------------------------
+        if inside.any():
+            s = shocks[inside]
+            x = (s[:, 0] - self.spot_center) / self.spot_half
+            Ts = cheb.chebvander(x, self.degree[0])
+            M = np.prod(s[:, None, 1:] ** self.exponents[None], axis=2)
+            TG = Ts @ self.G
+            value[inside] = np.sum(TG * M, axis=1)
+
+            if with_gradient:
+                dTs = cheb.chebvander(x, self.degree[0] - 1) @ cheb.chebder(np.eye(self.degree[0] + 1))
+                grad[inside, 0] = np.sum((dTs @ self.G) * M, axis=1) / self.spot_half
+                for f in range(len(self.factors) - 1):
+                    e = self.exponents[:, f]
+                    lowered = self.exponents - np.eye(len(self.factors) - 1, dtype=int)[f] * (e > 0)[:, None]
+                    dM = e * np.prod(s[:, None, 1:] ** lowered[None], axis=2)
+                    grad[inside, 1 + f] = np.sum(TG * dM, axis=1)
+
+        # -------------------------
+        # 2. Exact part: unproxied contracts inside, everything outside
+        # -------------------------
+        for rows, contracts in ((inside, self.exact_contracts), (~inside, slice(None))):
+            if not rows.any() or (isinstance(contracts, np.ndarray) and not len(contracts)):
+                continue
+            s = shocks[rows]
+            units = self.units[contracts]
+            value[rows] += self._exact(s, contracts) @ units
+            if with_gradient:
+                spot = self.spot * (1 + s[:, :1])
+                vols = self._vols(s, contracts)
+                g = bs_greeks_vec(spot, self.strike[contracts], self.maturity[contracts], self.rate, vols,
+                                  self.is_call[contracts])
+                vega = g["vega"] * units * (vols > self.VOL_FLOOR)
+                grad[rows, 0] += self.spot * (g["delta"] @ units)
+                grad[rows, 1:] += vega @ self.loadings[:, contracts].T
+
+        return (value, grad) if with_gradient else value
+
+    def pnl(self, shocks):
+        return self.values(shocks) - self.base_value
+
+    def ladder(self, spot_shifts, vol_shifts):
+        """
+        PnL grid over spot shifts (rows) x parallel vol shifts (columns)
+        for a (spot_shift, parallel) proxy.
+        """
+        if self.factors != ["spot_shift", "parallel"]:
+            raise ValueError("ladder needs a (spot_shift, parallel) proxy")
+        S, V = np.meshgrid(spot_shifts, vol_shifts, indexing="ij")
+        pnl = self.pnl(np.column_stack([S.ravel(), V.ravel()])).reshape(S.shape)
+        return pd.DataFrame(
+            pnl, index=pd.Index(spot_shifts, name="spot_shift"), columns=pd.Index(vol_shifts, name="vol_shift")
+        )
+
+    # ---------- REPORTING ---------- #
+
+    def fit_report(self):
+        """
+        Fit quality: per-unit and position-weighted errors, contracts
+        proxied vs priced exactly, and a bound on the portfolio error.
+        """
+        weighted = self.fit_error * np.abs(self.units)
+        return {
+            "contracts": len(self.strike),
+            "proxied": int(self.proxied.sum()),
+            "exact": int((~self.proxied).sum()),
+            "max_unit_error": float(self.fit_error[self.proxied].max()) if self.proxied.any() else 0.0,
+            "portfolio_error_bound": float(weighted[self.proxied].sum()),
+            "polynomial_terms": int(self.G.size),
+        }
+
+    def contract_errors(self):
+        return pd.DataFrame({
+            "strike": self.strike,
+            "maturity": self.maturity,
+            "call": self.is_call,
+            "units": self.units,
+            "fit_error": self.fit_error,
+            "proxied": self.proxied,
+        })
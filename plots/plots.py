@@ -1,10 +1,14 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from engine.instrumentation import PROFILER
 
 sns.set_theme(style="whitegrid", context="talk")
 
+HIGHER_ORDER_COMPONENTS = ["Vanna Pnl", "Volga Pnl", "Charm Pnl"]
 
+
+@PROFILER.timed("plotting")
 def plot_scenario_dashboard(
     scenario_name,
     base_spot,
@@ -45,6 +49,7 @@ def plot_scenario_dashboard(
     ax = axes[0, 1]
 
     components = ["Delta Pnl", "Gamma Pnl", "Vega Pnl", "Theta Pnl"]
+    components += [c for c in HIGHER_ORDER_COMPONENTS if c in pnl_breakdown]
     values = [pnl_breakdown[c] for c in components]
 
     sns.barplot(
@@ -64,12 +69,7 @@ def plot_scenario_dashboard(
     # ===============================
     ax = axes[1, 0]
 
-    explained_pnl = (
-        pnl_breakdown["Delta Pnl"]
-        + pnl_breakdown["Gamma Pnl"]
-        + pnl_breakdown["Vega Pnl"]
-        + pnl_breakdown["Theta Pnl"]
-    )
+    explained_pnl = sum(pnl_breakdown[c] for c in components)
 
     pnl_values = [explained_pnl, true_pnl]
     labels = ["Explained PnL", "True PnL"]
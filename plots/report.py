@@ -0,0 +1,266 @@
+#Headless scenario reports: Agg rendering, reusable figure templates, worker pool
+
+import hashlib
+import html
+import io
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from plots.plots import HIGHER_ORDER_COMPONENTS
+from engine.instrumentation import PROFILER
+
+BASE_COMPONENTS = ["Delta Pnl", "Gamma Pnl", "Vega Pnl", "Theta Pnl"]
+FLAG_LABELS = ["Large Spot Move", "Gamma Dominant", "Large Residual"]
+FORMATS = ("png", "svg", "html")
+
+_TEMPLATES = {}   # per-process template cache, keyed by component list
+
+
+class DashboardTemplate:
+    """
+    The 2x2 scenario dashboard of `plot_scenario_dashboard`, built once on
+    an Agg canvas (no pyplot state) and updated in place for each scenario
+    by setting artist data instead of re-plotting.
+    """
+
+    def __init__(self, components, figsize=(12, 7), convexity_threshold=0.03):
+        self.components = list(components)
+        self.convexity_threshold = convexity_threshold
+
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.title = self.fig.suptitle("Stress & PnL Explain", fontsize=18, weight="bold")
+        axes = self.fig.subplots(2, 2)
+
+        # ===============================
+        # 1 Spot move
+        # ===============================
+        ax = axes[0, 0]
+        (self.spot_line,) = ax.plot([0, 1], [1.0, 1.0], marker="o", color="tab:blue")
+        self.base_hline = ax.axhline(1.0, linestyle="--", alpha=0.6)
+        self.shock_hline = ax.axhline(1.0, linestyle="--", alpha=0.6)
+        ax.set_title("Spot Shock")
+        ax.set_xticks([0, 1])
+        ax.set_xticklabels(["Base", "Shocked"])
+        ax.set_ylabel("Spot Level")
+        self.spot_ax = ax
+
+        # ===============================
+        # 2 PnL attribution
+        # ===============================
+        ax = axes[0, 1]
+        self.attr_bars = ax.bar(
+            self.components, [0.0] * len(self.components),
+            color=sns.color_palette("Set2", len(self.components))
+        )
+        ax.axhline(0, color="black", linewidth=1)
+        ax.set_title("PnL Attribution (Greeks)")
+        ax.set_ylabel("PnL")
+        ax.tick_params(axis="x", rotation=20)
+        self.attr_ax = ax
+
+        # ===============================
+        # 3 Explain vs true PnL
+        # ===============================
+        ax = axes[1, 0]
+        self.explain_bars = ax.bar(["Explained PnL", "True PnL"], [0.0, 0.0], color=["tab:green", "tab:red"])
+        (self.error_line,) = ax.plot([0, 0], [0.0, 0.0], color="black", label="Residual Error")
+        (self.error_caps,) = ax.plot([0, 0], [0.0, 0.0], color="black", linestyle="none", marker="_", markersize=12)
+        ax.set_title("PnL Explain vs Full Revaluation")
+        ax.set_ylabel("PnL")
+        ax.legend()
+        self.explain_ax = ax
+
+        # ===============================
+        # 4 Validity flags
+        # ===============================
+        ax = axes[1, 1]
+        self.flag_bars = ax.bar(FLAG_LABELS, [0.0] * len(FLAG_LABELS))
+        ax.set_ylim(0, 1.2)
+        ax.set_yticks([0, 1])
+        ax.set_yticklabels(["OK", "FLAG"])
+        ax.set_title("Model Validity & Convexity Flags")
+        ax.tick_params(axis="x", rotation=15)
+
+        self.fig.tight_layout(rect=[0, 0, 1, 0.96])
+
+    @staticmethod
+    def _rescale(ax):
+        ax.relim()
+        ax.autoscale_view()
+
+    def update(self, scenario_name, base_spot, shocked_spot, true_pnl, pnl_breakdown):
+        """
+        Load one scenario's numbers into the existing artists.
+        """
+        self.title.set_text(f"Stress & PnL Explain: {scenario_name}")
+
+        self.spot_line.set_ydata([base_spot, shocked_spot])
+        self.base_hline.set_ydata([base_spot, base_spot])
+        self.shock_hline.set_ydata([shocked_spot, shocked_spot])
+        self._rescale(self.spot_ax)
+
+        values = [pnl_breakdown[c] for c in self.components]
+        for bar, value in zip(self.attr_bars, values):
+            bar.set_height(value)
+        self._rescale(self.attr_ax)
+
+        explained = sum(values)
+        error = abs(true_pnl - explained)
+        self.explain_bars[0].set_height(explained)
+        self.explain_bars[1].set_height(true_pnl)
+        self.error_line.set_ydata([explained - error, explained + error])
+        self.error_caps.set_ydata([explained - error, explained + error])
+        self._rescale(self.explain_ax)
+
+        gamma_ratio = abs(pnl_breakdown["Gamma Pnl"]) / max(abs(pnl_breakdown["Delta Pnl"]), 1e-6)
+        flags = [
+            abs(shocked_spot / base_spot - 1.0) > self.convexity_threshold,
+            gamma_ratio > 1.0,
+            abs(pnl_breakdown["Residual"]) > 0.2 * abs(true_pnl),
+        ]
+        for bar, flag in zip(self.flag_bars, flags):
+            bar.set_height(1 if flag else 0)
+            bar.set_color("tab:red" if flag else "tab:green")
+
+        return self.fig
+
+    def save(self, target, fmt):
+        self.fig.savefig(target, format=fmt)
+
+    def close(self):
+        # Figures built without pyplot hold no global references
+        self.fig.clf()
+
+
+def template_for(pnl_breakdown):
+    """
+    This process's template for the components present in a breakdown.
+    """
+    components = BASE_COMPONENTS + [c for c in HIGHER_ORDER_COMPONENTS if c in pnl_breakdown]
+    key = tuple(components)
+    if key not in _TEMPLATES:
+        _TEMPLATES[key] = DashboardTemplate(components)
+    return _TEMPLATES[key]
+
+
+def close_templates():
+    for template in _TEMPLATES.values():
+        template.close()
+    _TEMPLATES.clear()
+
+
+def report_payload(scenario_name, base_spot, result):
+    """
+    Picklable plotting inputs from a `run_scenario`-style result.
+    """
+    return {
+        "scenario_name": scenario_name,
+        "base_spot": base_spot,
+        "shocked_spot": result["shocked_spot"],
+        "true_pnl": result["pnl"],
+        "pnl_breakdown": dict(result["pnl_breakdown"]),
+    }
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "scenario"
+
+
+def _stems(names):
+    """
+    One file stem per scenario name. Names whose slugs collide (e.g.
+    "Vol +10%" and "Vol 10%") get a short hash of the name; repeated
+    names get their position as well.
+    """
+    slugs = [_slug(name) for name in names]
+    shared = Counter(slugs)
+    stems, seen = [], set()
+    for i, (name, slug) in enumerate(zip(names, slugs)):
+        stem = slug
+        if shared[slug] > 1:
+            stem = f"{slug}_{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+        if stem in seen:
+            stem = f"{stem}_{i}"
+        seen.add(stem)
+        stems.append(stem)
+    return stems
+
+
+def _html_page(payload, svg):
+    rows = "".join(
+        f"<tr><td>{html.escape(k)}</td><td style='text-align:right'>{v:,.2f}</td></tr>"
+        for k, v in payload["pnl_breakdown"].items()
+    )
+    name = html.escape(payload["scenario_name"])
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{name}</title></head><body>"
+        f"<h2>{name}</h2>{svg}<table>{rows}</table></body></html>"
+    )
+
+
+@PROFILER.timed("report_render")
+def render_dashboard(payload, out_dir, formats=("png",), stem=None):
+    """
+    Render one dashboard to disk with this process's template.
+    stem : file name without extension (default: slug of the scenario name)
+    Returns the written paths.
+    """
+    template = template_for(payload["pnl_breakdown"])
+    template.update(**payload)
+
+    stem = os.path.join(out_dir, stem or _slug(payload["scenario_name"]))
+    paths = []
+    svg = None
+    for fmt in formats:
+        path = f"{stem}.{fmt}"
+        if fmt == "png":
+            template.save(path, fmt)
+        else:
+            # SVG is rendered once and shared by the .svg and .html outputs
+            if svg is None:
+                buffer = io.StringIO()
+                template.save(buffer, "svg")
+                svg = buffer.getvalue()
+            with open(path, "w") as f:
+                f.write(svg if fmt == "svg" else _html_page(payload, svg[svg.index("<svg"):]))
+        paths.append(path)
+    return paths
+
+
+def render_reports(payloads, out_dir="reports", formats=("png",), workers=None):
+    """
+    Render many dashboards headlessly.
+
+    payloads : list of dicts from `report_payload`
+    formats : any of 'png', 'svg', 'html'
+    workers : process count (default: CPU count); 0 or 1 renders in
+              this process
+
+    Each worker keeps its own templates, so a pool of N processes builds
+    at most N figures per layout however many scenarios are rendered.
+    Scenario names that slug to the same file name are disambiguated
+    (see `_stems`), so no report overwrites another.
+    Returns the written paths in payload order.
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unsupported report formats: {sorted(unknown)}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    workers = min(workers if workers is not None else os.cpu_count() or 1, len(payloads))
+    stems = _stems([p["scenario_name"] for p in payloads])
+
+    if workers <= 1:
+        try:
+            return [render_dashboard(p, out_dir, formats, s) for p, s in zip(payloads, stems)]
+        finally:
+            close_templates()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_dashboard, p, out_dir, formats, s) for p, s in zip(payloads, stems)]
+        return [f.result() for f in futures]
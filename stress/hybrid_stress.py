@@ -0,0 +1,205 @@
+import numpy as np
+from instruments.portfolio import position_arrays
+from models.greeks import bs_greeks_vec
+from stress.vol_stress import SurfaceStressEngine
+from engine.instrumentation import PROFILER
+
+VOL_FACTORS = ("parallel", "skew", "curvature")
+
+
+def _third_order(spot, strike, maturity, rate, vol):
+    """
+    Third-order Black-Scholes sensitivities used to bound the Taylor error:
+    speed (d3V/dS3), zomma (d3V/dS2 dvol), d3V/dS dvol2 and ultima (d3V/dvol3).
+    """
+    sqrt_T = np.sqrt(maturity)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol ** 2) * maturity) / (vol * sqrt_T)
+    d2 = d1 - vol * sqrt_T
+    pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2.0 * np.pi)
+
+    gamma = pdf_d1 / (spot * vol * sqrt_T)
+    vega = spot * pdf_d1 * sqrt_T
+
+    return {
+        "speed": -gamma / spot * (d1 / (vol * sqrt_T) + 1.0),
+        "zomma": gamma * (d1 * d2 - 1.0) / vol,
+        "vanna_vol": -pdf_d1 * (d1 * d2 ** 2 - d1 - d2) / vol ** 2,
+        "ultima": -vega / vol ** 2 * (d1 * d2 * (1.0 - d1 * d2) + d1 ** 2 + d2 ** 2),
+    }
+
+
+class HybridStressEngine:
+    """
+    Large scenario sets priced by Taylor expansion where it can be trusted
+    and by full revaluation where it cannot.
+
+    Each (scenario, position) PnL starts as a second-order expansion in
+    spot and vol (delta, gamma, vega, volga, vanna). A pair is routed to
+    full Black-Scholes revaluation when
+    - the scenario moves spot more than max_spot_move (GreekValidityDiagnostics),
+    - the position's vol moves more than max_vol_move (absolute),
+    - the position expires within min_maturity (GreekValidityDiagnostics),
+    - the position is American (lattice priced), or
+    - it does not fit in the scenario's error budget: pairs are admitted
+      smallest estimated Taylor error (third-order terms) first until
+      the admitted errors sum to `tolerance`.
+
+    Vol shocks are global parallel / skew / curvature factors, applied to
+    one surface copy via SurfaceStressEngine.shock_loadings.
+    """
+
+    def __init__(
+        self,
+        portfolio,
+        pricer,
+        surface,
+        rate=0.0,
+        tolerance=100.0,
+        max_spot_move=0.03,
+        max_vol_move=0.05,
+        min_maturity=5 / 252
+    ):
+        self.portfolio = portfolio
+        self.pricer = pricer
+        self.surface = surface
+        self.rate = rate
+        self.tolerance = tolerance
+        self.max_spot_move = max_spot_move
+        self.max_vol_move = max_vol_move
+        self.min_maturity = min_maturity
+        self.base_spot = surface.spot
+
+        # -------------------------
+        # Cached base state (per unit)
+        # -------------------------
+        a = self.arrays = position_arrays(portfolio)
+        self.loadings = SurfaceStressEngine(surface).shock_loadings(a.strike, a.maturity)
+        self.base_vols = surface.get_vols(a.strike, a.maturity)
+        self.base_prices = self._full_prices(
+            np.full(len(a), self.base_spot), np.arange(len(a)), self.base_vols
+        )
+        self.base_value = float(self.base_prices @ a.units)
+
+        live = a.maturity > 0
+        T = np.where(live, a.maturity, 1.0)
+        self.greeks = bs_greeks_vec(self.base_spot, a.strike, a.maturity, rate, self.base_vols, a.is_call)
+        third = _third_order(self.base_spot, a.strike, T, rate, self.base_vols)
+        self.third = {k: np.where(live, v, 0.0) for k, v in third.items()}
+
+        # Positions the expansion may be used for at all
+        self.eligible = (a.maturity >= min_maturity) & ~a.is_american
+
+    def _full_prices(self, spots, positions, vols):
+        """
+        Exact prices for (spot, position, vol) triplets.
+        """
+        a = self.arrays
+        return self.pricer.price_legs(
+            spots, a.strike[positions], a.maturity[positions], vols,
+            a.is_call[positions], a.is_american[positions], self.rate
+        )
+
+    @staticmethod
+    def scenario_factors(scenarios):
+        """
+        (spot_shift, parallel, skew, curvature) arrays from scenario dicts.
+        """
+        factors = np.zeros((len(scenarios), 4))
+        for i, scenario in enumerate(scenarios):
+            factors[i, 0] = scenario.get("spot_shift", 0.0)
+            if scenario.get("smile_dynamics", "sticky_strike") != "sticky_strike":
+                raise ValueError("Hybrid engine supports sticky-strike scenarios only")
+            for shock in scenario.get("vol_shocks", []):
+                if SurfaceStressEngine.is_localized(shock):
+                    raise ValueError("Hybrid engine supports global parallel/skew/curvature shocks only")
+                factors[i, 1 + VOL_FACTORS.index(shock["type"])] += shock["value"]
+        return factors.T
+
+    def run_scenarios(self, scenarios, **kwargs):
+        return self.run(*self.scenario_factors(scenarios), **kwargs)
+
+    @PROFILER.timed("hybrid_stress")
+    def run(self, spot_shifts, parallel=0.0, skew=0.0, curvature=0.0, tolerance=None, chunk_size=2048):
+        """
+        PnL for N scenarios given as factor arrays (broadcast to N).
+
+        Returns dict with
+        - pnl : (N,) portfolio PnL
+        - estimated_error : (N,) summed error estimate of the Taylor pairs
+        - full_pairs / taylor_pairs : pair counts by route
+        - full_share : fraction of pairs fully revalued
+        """
+        tolerance = self.tolerance if tolerance is None else tolerance
+        spot_shifts, parallel, skew, curvature = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(x, dtype=float)) for x in (spot_shifts, parallel, skew, curvature))
+        )
+        n = len(spot_shifts)
+        a, L, g, t3 = self.arrays, self.loadings, self.greeks, self.third
+        units = a.units
+        abs_units = np.abs(units)
+
+        pnl = np.zeros(n)
+        est_error = np.zeros(n)
+        full_pairs = 0
+
+        for start in range(0, n, chunk_size):
+            sl = slice(start, min(start + chunk_size, n))
+            shift = spot_shifts[sl][:, None]
+            dS = self.base_spot * shift
+
+            # -------------------------
+            # 1. Exact stressed vols from the factor loadings, continuous
+            #    in the shocks (zero shock = base vols)
+            # -------------------------
+            stressed = (
+                self.base_vols + parallel[sl][:, None] + skew[sl][:, None] * L["skew"]
+                + curvature[sl][:, None] * L["curvature"]
+            )
+            stressed = np.maximum(stressed, 1e-4)
+            d_vol = stressed - self.base_vols
+
+            # -------------------------
+            # 2. Taylor PnL and its error estimate (per unit)
+            # -------------------------
+            taylor = (
+                g["delta"] * dS + 0.5 * g["gamma"] * dS ** 2
+                + g["vega"] * d_vol + 0.5 * g["volga"] * d_vol ** 2
+                + g["vanna"] * dS * d_vol
+            )
+            error = (
+                np.abs(t3["speed"] * dS ** 3) / 6
+                + np.abs(t3["zomma"] * dS ** 2 * d_vol) / 2
+                + np.abs(t3["vanna_vol"] * dS * d_vol ** 2) / 2
+                + np.abs(t3["ultima"] * d_vol ** 3) / 6
+            ) * abs_units
+
+            # -------------------------
+            # 3. Route failing pairs to full revaluation
+            # -------------------------
+            full = (
+                ~self.eligible[None, :]
+                | (np.abs(shift) > self.max_spot_move)
+                | (np.abs(d_vol) > self.max_vol_move)
+            )
+            candidate = np.where(full, np.inf, error)
+            order = np.argsort(candidate, axis=1)
+            admitted = np.cumsum(np.take_along_axis(candidate, order, axis=1), axis=1) <= tolerance
+            np.put_along_axis(full, order, ~admitted, axis=1)
+            rows, cols = np.nonzero(full)
+            if len(rows):
+                spots = self.base_spot * (1 + spot_shifts[sl][rows])
+                exact = self._full_prices(spots, cols, stressed[rows, cols])
+                taylor[rows, cols] = exact - self.base_prices[cols]
+                full_pairs += len(rows)
+
+            pnl[sl] = taylor @ units
+            est_error[sl] = np.where(full, 0.0, error).sum(axis=1)
+
+        total_pairs = n * len(a)
+        return {
+            "pnl": pnl,
+            "estimated_error": est_error,
+            "full_pairs": full_pairs,
+            "taylor_pairs": total_pairs - full_pairs,
+            "full_share": full_pairs / total_pairs if total_pairs else 0.0,
+        }
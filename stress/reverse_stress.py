@@ -0,0 +1,305 @@
+import numpy as np
+from instruments.portfolio import position_arrays
+from models.greeks import bs_greeks_vec
+from stress.vol_stress import SurfaceStressEngine
+
+
+class ReverseStressEngine:
+    """
+    Reverse stress testing: search the (spot shift, parallel, skew, curvature)
+    shock space for the scenario that maximizes portfolio loss.
+
+    Candidates are evaluated in batches as one (n_candidates, n_positions)
+    Black-Scholes pass. Vol shocks enter through the linear loadings of
+    `SurfaceStressEngine.shock_loadings`, so no surface is ever copied.
+    Search directions come from analytic delta and vega, and a projected
+    gradient descent runs from several starts at once.
+
+    Candidates price American legs on the lattice, like PortfolioPricer,
+    and the base value comes from the same loadings, so a zero shock is a
+    zero PnL. The worst case is also re-priced through the run_scenario
+    path (build_stressed_market + pricer) as 'repriced_pnl'.
+
+    With proxy=True the search runs on a PortfolioProxy fitted over the
+    bounds (one polynomial for the European legs, exact pricing for
+    American legs and contracts it cannot fit); the reported worst case
+    and breach are re-priced exactly.
+    """
+
+    FACTORS = ("spot_shift", "parallel", "skew", "curvature")
+
+    DEFAULT_BOUNDS = {
+        "spot_shift": (-0.20, 0.20),
+        "parallel": (-0.05, 0.20),
+        "skew": (-0.05, 0.05),
+        "curvature": (-0.05, 0.05),
+    }
+
+    def __init__(self, portfolio, pricer, surface, rate=0.0, bounds=None, proxy=False):
+        """
+        Parameters
+        ----------
+        portfolio : OptionPortfolio or list of EuropeanOption
+        pricer : PortfolioPricer instance
+        surface : ImpliedVolSurface instance (base surface)
+        rate : risk-free rate
+        bounds : dict[factor] = (low, high), overrides DEFAULT_BOUNDS
+        proxy : search on a Chebyshev proxy (see models.proxy)
+        """
+        if len(portfolio) == 0:
+            raise ValueError("Portfolio is empty")
+
+        self.portfolio = portfolio
+        self.pricer = pricer
+        self.surface = surface
+        self.rate = rate
+        self.base_spot = surface.spot
+
+        merged = dict(self.DEFAULT_BOUNDS)
+        merged.update(bounds or {})
+        self.bounds = np.array([merged[f] for f in self.FACTORS], dtype=float)
+        if np.any(self.bounds[:, 0] > self.bounds[:, 1]):
+            raise ValueError("Each bound must satisfy low <= high")
+
+        self.arrays = position_arrays(portfolio)
+        self.loadings = SurfaceStressEngine(surface).shock_loadings(
+            self.arrays.strike, self.arrays.maturity
+        )
+        self.n_evaluations = 0
+
+        all_legs = np.ones(len(self.arrays.strike), dtype=bool)
+        self.base_value = float(self._exact(np.zeros((1, len(self.FACTORS))), all_legs)[0])
+
+        self.proxy = None
+        european = ~self.arrays.is_american
+        if proxy and european.any():
+            from models.proxy import PortfolioProxy
+            a = self.arrays
+            self.proxy = PortfolioProxy(
+                a.strike[european], a.maturity[european], a.is_call[european], a.units[european],
+                self.loadings["base"][european], self.base_spot, rate,
+                bounds=dict(zip(self.FACTORS, self.bounds)),
+                vol_loadings={f: self.loadings[f][european] for f in self.FACTORS[1:]}
+            )
+
+    # ---------- EVALUATION ---------- #
+
+    def _vols(self, shocks):
+        vols = (
+            self.loadings["base"]
+            + shocks[:, 1:2] * self.loadings["parallel"]
+            + shocks[:, 2:3] * self.loadings["skew"]
+            + shocks[:, 3:4] * self.loadings["curvature"]
+        )
+        return np.maximum(vols, 1e-4)
+
+    def _exact(self, shocks, legs, with_gradient=False):
+        """
+        Value of the legs selected by a boolean mask for a batch of shocks,
+        with American legs on the lattice. The gradient comes from analytic
+        Black-Scholes delta and vega.
+        """
+        a = self.arrays
+        spot = self.base_spot * (1 + shocks[:, 0:1])
+        vols = self._vols(shocks)[:, legs]
+        strike, maturity, is_call, units = a.strike[legs], a.maturity[legs], a.is_call[legs], a.units[legs]
+
+        prices = self.pricer.price_legs(spot, strike, maturity, vols, is_call, a.is_american[legs], self.rate)
+        value = prices @ units
+
+        if not with_gradient:
+            return value
+
+        greeks = bs_greeks_vec(spot, strike, maturity, self.rate, vols, is_call)
+        vega_units = greeks["vega"] * units * (vols > 1e-4)
+
+        grad = np.column_stack([
+            self.base_spot * (greeks["delta"] @ units),
+            vega_units @ self.loadings["parallel"][legs],
+            vega_units @ self.loadings["skew"][legs],
+            vega_units @ self.loadings["curvature"][legs],
+        ])
+        return value, grad
+
+    def evaluate(self, shocks, with_gradient=False, exact=False):
+        """
+        PnL for a batch of candidate scenarios (on the proxy if one was
+        fitted, unless exact=True).
+
+        Parameters
+        ----------
+        shocks : array (n_candidates, 4)
+            Columns ordered as FACTORS
+        with_gradient : bool
+            Also return dPnL/dshock from analytic delta and vega
+        exact : bool
+            Bypass the proxy
+
+        Returns
+        -------
+        pnl : array (n_candidates,)
+        grad : array (n_candidates, 4), only if with_gradient
+        """
+        shocks = np.atleast_2d(np.asarray(shocks, dtype=float))
+        self.n_evaluations += len(shocks)
+
+        if self.proxy is None or exact:
+            legs = np.ones(len(self.arrays.strike), dtype=bool)
+            out = self._exact(shocks, legs, with_gradient)
+        else:
+            out = self.proxy.values(shocks, with_gradient=with_gradient)
+            am = self.arrays.is_american
+            if am.any():
+                rest = self._exact(shocks, am, with_gradient)
+                out = (out[0] + rest[0], out[1] + rest[1]) if with_gradient else out + rest
+
+        if not with_gradient:
+            return out - self.base_value
+        return out[0] - self.base_value, out[1]
+
+    def reprice(self, shocks):
+        """
+        PnL of one shock vector through the run_scenario path: stressed
+        surface from build_stressed_market, priced by the pricer.
+        """
+        from stress.scenario_engine import build_stressed_market
+
+        scenario = self.to_scenario(shocks)
+        spot, stressed = build_stressed_market(self.surface, scenario["spot_shift"], scenario["vol_shocks"])
+        base = self.pricer.price(self.portfolio, self.base_spot, self.surface)
+        return self.pricer.price(self.portfolio, spot, stressed) - base
+
+    # ---------- SEARCH ---------- #
+
+    def _corners(self):
+        grid = np.array(np.meshgrid(*[[0.0, 1.0]] * len(self.FACTORS))).reshape(len(self.FACTORS), -1).T
+        return np.vstack([grid, np.full(len(self.FACTORS), 0.5)])
+
+    def search(self, loss_threshold=None, n_starts=8, max_iter=60, tol=1e-5, seed=0):
+        """
+        Find the worst-case scenario within bounds.
+
+        Parameters
+        ----------
+        loss_threshold : float, optional
+            Positive loss level. If given, also locate the mildest scenario
+            on the path to the worst case that still breaches it.
+        n_starts : int
+            Number of descent paths run together
+        max_iter : int
+            Maximum projected-gradient iterations
+        tol : float
+            Stop once every step is below tol (in units of bound width)
+        seed : int
+            Seed for the random starting points
+
+        Returns
+        -------
+        dict : worst scenario, its PnL and breach information
+        """
+        lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+        width = np.where(hi > lo, hi - lo, 1.0)
+
+        # -------------------------
+        # 1. Seed with box corners + random starts, keep the worst
+        # -------------------------
+        rng = np.random.default_rng(seed)
+        seeds = np.vstack([self._corners(), rng.random((4 * n_starts, len(self.FACTORS)))])
+        seed_pnl = self.evaluate(lo + seeds * width)
+        u = seeds[np.argsort(seed_pnl)[:n_starts]]
+
+        # -------------------------
+        # 2. Batched projected gradient descent on PnL
+        # -------------------------
+        pnl, grad = self.evaluate(lo + u * width, with_gradient=True)
+        step = np.full(len(u), 0.25)
+
+        for _ in range(max_iter):
+            g = grad * width
+            norm = np.linalg.norm(g, axis=1, keepdims=True)
+            direction = np.where(norm > 0, g / np.where(norm > 0, norm, 1.0), 0.0)
+
+            u_new = np.clip(u - step[:, None] * direction, 0.0, 1.0)
+            pnl_new, grad_new = self.evaluate(lo + u_new * width, with_gradient=True)
+
+            improved = pnl_new < pnl
+            u[improved] = u_new[improved]
+            pnl[improved] = pnl_new[improved]
+            grad[improved] = grad_new[improved]
+            step = np.where(improved, step * 1.2, step * 0.5)
+
+            if np.all(step < tol):
+                break
+
+        best = int(np.argmin(pnl))
+        worst = lo + u[best] * width
+        worst_pnl = float(pnl[best]) if self.proxy is None else float(self.evaluate(worst, exact=True)[0])
+
+        result = {
+            "scenario": self.to_scenario(worst, name="Reverse Stress: Worst Case"),
+            "shocks": dict(zip(self.FACTORS, worst)),
+            "pnl": worst_pnl,
+            "repriced_pnl": self.reprice(worst),
+            "stressed_value": self.base_value + worst_pnl,
+            "base_value": self.base_value,
+            "breach": None,
+            "breach_scenario": None,
+            "breach_pnl": None,
+            "n_evaluations": self.n_evaluations,
+            "proxy": None if self.proxy is None else self.proxy.fit_report(),
+        }
+
+        if loss_threshold is not None:
+            result.update(self._locate_breach(worst, worst_pnl, loss_threshold))
+            result["n_evaluations"] = self.n_evaluations
+
+        return result
+
+    def _locate_breach(self, worst, worst_pnl, loss_threshold, n_points=33, n_bisect=20):
+        """
+        Scan the ray from the unshocked state to the worst case and return
+        the first point whose loss reaches loss_threshold.
+        """
+        if -worst_pnl < loss_threshold:
+            return {"breach": False}
+
+        origin = np.clip(np.zeros(len(self.FACTORS)), self.bounds[:, 0], self.bounds[:, 1])
+        ts = np.linspace(0.0, 1.0, n_points)
+        losses = -self.evaluate(origin + ts[:, None] * (worst - origin))
+
+        k = int(np.argmax(losses >= loss_threshold))
+        t_lo, t_hi = (ts[k - 1], ts[k]) if k > 0 else (0.0, 0.0)
+
+        for _ in range(n_bisect if k > 0 else 0):
+            t_mid = 0.5 * (t_lo + t_hi)
+            if -self.evaluate(origin + t_mid * (worst - origin))[0] >= loss_threshold:
+                t_hi = t_mid
+            else:
+                t_lo = t_mid
+
+        breach = origin + t_hi * (worst - origin)
+        return {
+            "breach": True,
+            "breach_scenario": self.to_scenario(breach, name="Reverse Stress: Threshold Breach"),
+            "breach_pnl": float(self.evaluate(breach, exact=True)[0]),
+        }
+
+    def to_scenario(self, shocks, name="Reverse Stress"):
+        """
+        Express a shock vector in the SCENARIOS dict format.
+        Vol shocks are meant to be applied together to one surface copy.
+        """
+        spot_shift, parallel, skew, curvature = (float(v) for v in shocks)
+        return {
+            "name": name,
+            "spot_shift": spot_shift,
+            "vol_shocks": [
+                {"type": "parallel", "value": parallel},
+                {"type": "skew", "value": skew},
+                {"type": "curvature", "value": curvature},
+            ],
+            "description": (
+                f"{spot_shift * 100:+.1f}% spot move with parallel {parallel * 100:+.1f}, "
+                f"skew {skew * 100:+.1f} and curvature {curvature * 100:+.1f} vol points"
+            ),
+        }
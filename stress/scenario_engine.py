@@ -1,6 +1,18 @@
 from stress.spot_stress import SpotStressEngine
 from stress.vol_stress import SurfaceStressEngine
-import copy
+
+
+def build_stressed_market(surface, spot_shift=0.0, vol_shocks=None):
+    """
+    Shocked spot and stressed surface for a scenario, without pricing.
+    spot_shift: percentage, e.g. 0.01 = +1%
+    vol_shocks: list of vol shock dicts, applied together to one surface
+                copy (SurfaceStressEngine.apply_shocks)
+    """
+    shocked_spot = surface.spot * (1 + spot_shift)
+    stressed_surface = SurfaceStressEngine(surface).apply_shocks(vol_shocks or [])
+    return shocked_spot, stressed_surface
+
 
 class ScenarioEngine:
     """
@@ -17,23 +29,19 @@ class ScenarioEngine:
         self.spot_engine = SpotStressEngine(portfolio, pricer, surface, r=rate)
         self.vol_engine = SurfaceStressEngine(surface)
 
-    def apply_scenario(self, spot_shift=0.0, vol_shocks=None):
+    def apply_scenario(self, spot_shift=0.0, vol_shocks=None, dynamics="sticky_strike"):
         """
         Apply spot and vol shocks together.
         spot_shift: percentage, e.g. 0.01 = +1%
         vol_shocks: list of vol shock dicts
+        dynamics: smile dynamics under the spot move, e.g. "sticky_moneyness"
         """
         # 1️⃣ Spot move
-        shocked_spot = self.base_spot * (1 + spot_shift)
-
-        # 2️⃣ Copy surface and apply vol shocks sequentially
-        stressed_surface = copy.deepcopy(self.surface)
-        if vol_shocks:
-            for shock in vol_shocks:
-                stressed_surface = self.vol_engine.apply_shock(shock)
+        # 2️⃣ Copy surface and apply vol shocks together
+        shocked_spot, stressed_surface = build_stressed_market(self.surface, spot_shift, vol_shocks)
 
         # 3️⃣ Price portfolio at shocked spot and stressed vol
-        total_value = self.pricer.price(self.portfolio, shocked_spot, stressed_surface)
+        total_value = self.pricer.price(self.portfolio, shocked_spot, stressed_surface, dynamics)
         pnl = total_value - self.base_value
 
         return total_value, pnl, shocked_spot, stressed_surface
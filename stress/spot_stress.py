@@ -22,7 +22,7 @@ class SpotStressEngine:
         self.base_spot = surface.spot
         self.base_value = pricer.price(portfolio, self.base_spot, surface)
 
-    def apply_parallel_shocks(self, shock_list):
+    def apply_parallel_shocks(self, shock_list, cache=None, dynamics="sticky_strike"):
         """
         Apply multiple parallel spot shocks and compute PnL.
 
@@ -30,22 +30,34 @@ class SpotStressEngine:
         -----------
         shock_list : list of floats
             Each float is a percentage move, e.g., 0.01 = +1%, -0.05 = -5%
+        cache : ScenarioResultCache, optional
+            Reuse a stored grid for the same portfolio, surface and shocks
+        dynamics : str
+            Smile dynamics under the spot move (see ImpliedVolSurface);
+            the base surface is reused for every shock
 
         Returns:
         --------
         dict : {shock_pct: pnl}
         """
+        if cache is not None:
+            key = cache.key(
+                "spot_grid", self.portfolio, self.surface, {"spot_shifts": list(shock_list)},
+                pricer=self.pricer, r=self.r, dynamics=dynamics
+            )
+            return cache.get_or_compute(key, lambda: self.apply_parallel_shocks(shock_list, dynamics=dynamics))
+
         pnl_results = {}
 
         for shock in shock_list:
             shocked_spot = self.base_spot * (1 + shock)
-            shocked_value = self.pricer.price(self.portfolio, shocked_spot, self.surface)
+            shocked_value = self.pricer.price(self.portfolio, shocked_spot, self.surface, dynamics)
             pnl = shocked_value - self.base_value
             pnl_results[shock] = pnl
 
         return pnl_results
 
-    def apply_custom_shock(self, shocked_spot):
+    def apply_custom_shock(self, shocked_spot, dynamics="sticky_strike"):
         """
         Apply a single custom spot level and compute PnL.
 
@@ -53,6 +65,6 @@ class SpotStressEngine:
         --------
         float : pnl impact
         """
-        shocked_value = self.pricer.price(self.portfolio, shocked_spot, self.surface)
+        shocked_value = self.pricer.price(self.portfolio, shocked_spot, self.surface, dynamics)
         pnl = shocked_value - self.base_value
         return pnl
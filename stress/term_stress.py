@@ -0,0 +1,110 @@
+import numpy as np
+from instruments.portfolio import position_arrays
+from stress.vol_stress import SurfaceStressEngine
+from stress.scenario_engine import build_stressed_market
+
+
+class TermStructureStressEngine:
+    """
+    Scenario engine for shocks that target part of the term structure.
+
+    Keeps an index from each maturity slice of the surface to the
+    positions whose vol depends on it (the two slices bracketing them in
+    `get_vol`). A vol-only shock that touches a few slices reprices just
+    those positions and reuses cached base prices for everything else.
+    Stressed surfaces come from build_stressed_market and American legs
+    go through the lattice, so results match ScenarioEngine.
+    """
+
+    def __init__(self, portfolio, pricer, surface, rate=0.0):
+        self.portfolio = portfolio
+        self.pricer = pricer
+        self.surface = surface
+        self.rate = rate
+        self.base_spot = surface.spot
+        self.vol_engine = SurfaceStressEngine(surface)
+
+        # -------------------------
+        # Cached base state (vectorized)
+        # -------------------------
+        self.arrays = position_arrays(portfolio)
+        a = self.arrays
+        self.base_vols = surface.get_vols(a.strike, a.maturity)
+        self.base_prices = self._prices(self.base_spot, np.arange(len(a)), self.base_vols)
+        self.base_value = float(self.base_prices @ a.units)
+
+        # -------------------------
+        # Slice -> dependent positions index
+        # -------------------------
+        self.slice_maturities, lo, hi, w = surface.slice_weights(a.maturity)
+        self.slice_index = {}
+        for k in range(len(self.slice_maturities)):
+            depends = ((lo == k) & (w < 1.0)) | ((hi == k) & (w > 0.0))
+            self.slice_index[k] = np.flatnonzero(depends)
+
+        self.last_repriced = 0
+
+    def _prices(self, spot, positions, vols):
+        """
+        Prices of the given positions, American legs on the lattice like
+        PortfolioPricer.
+        """
+        a = self.arrays
+        return self.pricer.price_legs(
+            spot, a.strike[positions], a.maturity[positions], vols,
+            a.is_call[positions], a.is_american[positions], self.rate
+        )
+
+    def touched_slices(self, vol_shocks):
+        """
+        Indices of slices hit by at least one shock.
+        """
+        return [
+            k for k, T in enumerate(self.slice_maturities)
+            if any(self.vol_engine.term_scale(shock, T) != 0.0 for shock in vol_shocks)
+        ]
+
+    def affected_positions(self, vol_shocks):
+        """
+        Positions whose vol changes under the given shocks.
+        """
+        touched = self.touched_slices(vol_shocks or [])
+        if not touched:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate([self.slice_index[k] for k in touched]))
+
+    def apply_scenario(self, spot_shift=0.0, vol_shocks=None, dynamics="sticky_strike"):
+        """
+        Apply spot and vol shocks together.
+        spot_shift: percentage, e.g. 0.01 = +1%
+        vol_shocks: list of vol shock dicts, applied together as in
+                    build_stressed_market
+        dynamics: only "sticky_strike" is supported (cached vols are per strike)
+
+        Returns (total_value, pnl, shocked_spot, stressed_surface), like
+        ScenarioEngine.apply_scenario.
+        """
+        if dynamics != "sticky_strike":
+            raise ValueError("Term-structure engine supports sticky-strike scenarios only")
+
+        a = self.arrays
+        vol_shocks = vol_shocks or []
+        shocked_spot, stressed_surface = build_stressed_market(self.surface, spot_shift, vol_shocks)
+        affected = self.affected_positions(vol_shocks)
+
+        vols = self.base_vols
+        if len(affected):
+            vols = self.base_vols.copy()
+            vols[affected] = stressed_surface.get_vols(a.strike[affected], a.maturity[affected])
+
+        # A spot move reprices everything; a vol-only shock just the affected subset
+        reprice = np.arange(len(a)) if spot_shift != 0.0 else affected
+        self.last_repriced = len(reprice)
+
+        prices = self.base_prices.copy()
+        if len(reprice):
+            prices[reprice] = self._prices(shocked_spot, reprice, vols[reprice])
+
+        pnl = float((prices[reprice] - self.base_prices[reprice]) @ a.units[reprice])
+        total_value = self.base_value + pnl
+        return total_value, pnl, shocked_spot, stressed_surface
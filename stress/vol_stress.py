@@ -2,6 +2,8 @@ import copy
 import numpy as np
 from scipy.interpolate import interp1d
 from models.black_scholes import bs_price
+from engine.instrumentation import PROFILER
+from market_data.vol_surface import Smile
 
 class SurfaceStressEngine:
     def __init__(self, surface):
@@ -10,47 +12,173 @@ class SurfaceStressEngine:
         """
         self.surface = surface
 
-    def _shock_interpolator(self, f_interp, strikes, shock):
+    @staticmethod
+    def term_scale(shock, T):
+        """
+        Weight of a shock on the smile with maturity T (0 = untouched).
+        Any shock may carry 'min_maturity' / 'max_maturity' (years,
+        inclusive) to target part of the term structure; 'term_decay'
+        shocks fade as exp(-T / decay).
+        """
+        if T < shock.get('min_maturity', 0.0) or T > shock.get('max_maturity', np.inf):
+            return 0.0
+        if shock['type'] == 'term_decay':
+            return float(np.exp(-T / shock.get('decay', 0.25)))
+        return 1.0
+
+    @staticmethod
+    def is_localized(shock):
+        """
+        True if the shock does not hit every maturity uniformly.
+        """
+        return (
+            shock['type'] == 'term_decay'
+            or 'min_maturity' in shock
+            or 'max_maturity' in shock
+        )
+
+    def _shock_interpolator(self, f_interp, strikes, shock, T=None):
         """
         Apply additive shock to interpolator output
         f_interp: interp1d object
         strikes: array of strikes
         shock: dict with keys 'type' and 'value'
-            type: 'parallel', 'skew', 'curvature'
+            type: 'parallel', 'skew', 'curvature', 'term_decay'
+            optional: 'min_maturity', 'max_maturity', 'decay' (term_decay)
+        T: maturity of the smile, for term-structure shocks
         """
-        vols = f_interp(strikes)
+        return f_interp(strikes) + self._shock_increment(strikes, shock, T)
+
+    def _shock_increment(self, strikes, shock, T=None):
+        scale = self.term_scale(shock, T) if T is not None else 1.0
 
-        if shock['type'] == 'parallel':
-            vols_stressed = vols + shock['value']
+        if shock['type'] in ('parallel', 'term_decay'):
+            return np.full(np.shape(strikes), scale * shock['value'])
         elif shock['type'] == 'skew':
             # linear slope across strikes
             mid = np.mean(strikes)
-            vols_stressed = vols + shock['value'] * (strikes - mid)/mid
+            return scale * shock['value'] * (strikes - mid)/mid
         elif shock['type'] == 'curvature':
             mid = np.mean(strikes)
-            vols_stressed = vols + shock['value'] * ((strikes - mid)/mid)**2
+            return scale * shock['value'] * ((strikes - mid)/mid)**2
         else:
             raise ValueError("Unknown shock type")
 
-        return vols_stressed
+    @staticmethod
+    def _smile_kind(f_interp):
+        # Smile carries its kind; bare interp1d smiles (bump_parallel) are linear
+        return getattr(f_interp, "kind", "linear")
 
     def apply_shock(self, shock):
         """
         Returns a new stressed surface instance
         shock: dict as above
+        Smiles outside a term-structure shock's range are left untouched.
         """
-        stressed_surface = copy.deepcopy(self.surface)
-        for T, f_interp in stressed_surface.surface.items():
-            strikes = f_interp.x  # interp1d stores input points in .x
-            vols_stressed = self._shock_interpolator(f_interp, strikes, shock)
-            stressed_surface.surface[T] = interp1d(
-                strikes,
-                vols_stressed,
-                kind='cubic',
-                fill_value='extrapolate'
-            )
+        return self.apply_shocks([shock])
+
+    @PROFILER.timed("shock_application")
+    def apply_shocks(self, shocks):
+        """
+        Apply a list of shocks together to one new surface.
+
+        Shock increments are added to each smile's nodes and the smile is
+        re-fitted with its own interpolation kind, so zero shocks give back
+        the base vols exactly. Only smiles hit by at least one shock are
+        re-fitted; the others are shared with the base surface rather than
+        copied.
+        """
+        stressed_surface = copy.copy(self.surface)
+        stressed_surface.surface = dict(self.surface.surface)
+
+        for T, f_interp in self.surface.surface.items():
+            active = [shock for shock in shocks if self.term_scale(shock, T) != 0.0]
+            if not active:
+                continue
+
+            strikes = f_interp.x
+            vols_stressed = f_interp(strikes)
+            for shock in active:
+                vols_stressed = vols_stressed + self._shock_increment(strikes, shock, T)
+
+            stressed_surface.surface[T] = Smile(strikes, vols_stressed, kind=self._smile_kind(f_interp))
         return stressed_surface
-    
+
+    def shock_loadings(self, strikes, maturities):
+        """
+        Linear decomposition of `apply_shocks` at given positions.
+
+        `apply_shocks` adds value * g(x) to each smile's nodes and re-fits
+        the smile with its own kind. Linear and spline interpolation are
+        both linear in the node values, so the stressed vol of every
+        position is exactly
+
+            base + parallel * 1 + skew * L_skew + curvature * L_curv
+
+        where base = get_vols and L_* interpolates g_* between the nodes.
+
+        Returns a dict of arrays keyed by 'base', 'parallel', 'skew',
+        'curvature' with the shape of the broadcast inputs. Shocks given
+        together act as if applied to a single copy of the surface.
+        """
+        strikes, maturities = np.broadcast_arrays(
+            np.asarray(strikes, dtype=float), np.asarray(maturities, dtype=float)
+        )
+        log_m = np.log(strikes / self.surface.spot)
+        slice_maturities, lo, hi, w = self.surface.slice_weights(maturities)
+
+        loadings = {
+            "base": np.zeros(log_m.shape),
+            "parallel": np.ones(log_m.shape),
+            "skew": np.zeros(log_m.shape),
+            "curvature": np.zeros(log_m.shape),
+        }
+
+        for k, T in enumerate(slice_maturities):
+            weight = np.where(lo == k, 1.0 - w, 0.0) + np.where(hi == k, w, 0.0)
+            needed = weight != 0.0
+            if not needed.any():
+                continue
+
+            f_interp = self.surface.surface[T]
+            x = f_interp.x
+            mid = np.mean(x)
+            z = (x - mid) / mid
+            kind = self._smile_kind(f_interp)
+            PROFILER.count("interp1d", 2)
+            skew = interp1d(x, z, kind=kind, fill_value='extrapolate')
+            curvature = interp1d(x, z ** 2, kind=kind, fill_value='extrapolate')
+
+            xq = log_m[needed]
+            loadings["base"][needed] += weight[needed] * f_interp(xq)
+            loadings["skew"][needed] += weight[needed] * skew(xq)
+            loadings["curvature"][needed] += weight[needed] * curvature(xq)
+
+        return loadings
+
+    def stressed_vols(self, strikes, maturities, vol_shocks=None, loadings=None):
+        """
+        Vectorized vols after applying a list of shocks, without copying
+        the surface. Pass precomputed `loadings` to reuse them across calls.
+        """
+        if not vol_shocks:
+            return self.surface.get_vols(strikes, maturities)
+
+        # Loadings assume every smile is hit; localized shocks re-fit a subset
+        if any(self.is_localized(shock) for shock in vol_shocks):
+            return self.apply_shocks(vol_shocks).get_vols(strikes, maturities)
+
+        if loadings is None:
+            loadings = self.shock_loadings(strikes, maturities)
+
+        vols = loadings["base"].copy()
+        for shock in vol_shocks:
+            if shock['type'] not in ('parallel', 'skew', 'curvature'):
+                raise ValueError("Unknown shock type")
+            vols += shock['value'] * loadings[shock['type']]
+
+        return vols
+
 
     def vol_stress_pnl(portfolio, surface, stress_engine, shock, r=0.0):
         """